@@ -182,3 +182,93 @@ CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://redis:6
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+
+# Invoice OCR
+# Threads de OCR por worker (teto de páginas em OCR simultâneo no processo)
+INVOICE_OCR_WORKERS = int(os.environ.get('INVOICE_OCR_WORKERS', min(4, os.cpu_count() or 1)))
+# Páginas rasterizadas por fatura escaneada (cabeçalho e resumo ficam nas primeiras)
+INVOICE_OCR_MAX_PAGES = int(os.environ.get('INVOICE_OCR_MAX_PAGES', 2))
+# Confiança mínima (0-100) do OCR por regiões; abaixo disso a página inteira é processada
+INVOICE_OCR_REGION_MIN_CONFIDENCE = int(os.environ.get('INVOICE_OCR_REGION_MIN_CONFIDENCE', 70))
+# Níveis de DPI do OCR (escala de cinza), do mais barato ao mais caro
+INVOICE_OCR_DPI_TIERS = [int(dpi) for dpi in os.environ.get('INVOICE_OCR_DPI_TIERS', '150,300').split(',')]
+# Confiança mínima do parser sobre o texto OCR para não escalar o DPI
+INVOICE_OCR_MIN_CONFIDENCE = int(os.environ.get('INVOICE_OCR_MIN_CONFIDENCE', 80))
+# Pré-processamento (NumPy) das páginas antes do OCR: binarização, inclinação, bordas
+INVOICE_OCR_PREPROCESS = os.environ.get('INVOICE_OCR_PREPROCESS', 'True') == 'True'
+# Maior lado (px) da página enviada ao tesseract; acima disso a imagem é reduzida
+INVOICE_OCR_MAX_SIDE = int(os.environ.get('INVOICE_OCR_MAX_SIDE', 3600))
+# Motor de OCR: 'tesserocr' (instâncias do tesseract aquecidas por processo, uma por thread
+# de OCR) ou 'pytesseract' (um processo por página). Sem o tesserocr instalado, usa o pytesseract.
+INVOICE_OCR_ENGINE = os.environ.get('INVOICE_OCR_ENGINE', 'tesserocr')
+# Orçamento de OCR por fatura (s), somando regiões, níveis de DPI e páginas; ao estourar,
+# pdftoppm/tesseract são encerrados e a fatura vai para revisão (OCR_TIMEOUT)
+INVOICE_OCR_BUDGET_SECONDS = int(os.environ.get('INVOICE_OCR_BUDGET_SECONDS', 120))
+# Teto de memória residente (MB) do worker durante o OCR: acima dele as páginas restantes
+# não são rasterizadas e a fatura vai para revisão (OCR_MEMORY_LIMIT)
+INVOICE_OCR_MAX_RSS_MB = int(os.environ.get('INVOICE_OCR_MAX_RSS_MB', 1024))
+# Limites da task de importação (s): soft manda a fatura para revisão, hard mata o processo.
+# Abaixo dos 5 minutos do resgate de tarefas paradas da caixa de entrada.
+INVOICE_TASK_SOFT_TIME_LIMIT = int(os.environ.get('INVOICE_TASK_SOFT_TIME_LIMIT', 240))
+INVOICE_TASK_TIME_LIMIT = int(os.environ.get('INVOICE_TASK_TIME_LIMIT', 270))
+
+# Backends da camada de texto, em ordem de tentativa (os não instalados são ignorados).
+# pdfplumber primeiro: as regras foram ajustadas sobre ele; o pdftotext (mais rápido) só passa
+# à frente depois que `manage.py benchmark_text_backends` mostrar paridade de campos
+INVOICE_TEXT_BACKENDS = os.environ.get('INVOICE_TEXT_BACKENDS', 'pdfplumber,pdftotext').split(',')
+
+# Filas das importações: PDFs digitais e escaneados (OCR) em workers separados
+INVOICE_TEXT_QUEUE = 'text'
+INVOICE_OCR_QUEUE = 'ocr'
+# Prioridade no broker (Redis: 0 é a maior): upload manual na frente da varredura de pastas
+INVOICE_MANUAL_PRIORITY = 0
+INVOICE_BULK_PRIORITY = 6
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+}
+# Sem prefetch de vários jobs por processo: um OCR longo não segura tarefas prioritárias
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Processo do worker que terminar uma tarefa acima disso (KB) é substituído: a memória
+# fragmentada por páginas grandes não se acumula entre importações
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = int(os.environ.get('CELERY_WORKER_MAX_MEMORY_PER_CHILD', INVOICE_OCR_MAX_RSS_MB * 1024))
+
+# Cache (fingerprint da operadora por file_hash). Redis quando CACHE_URL é informado.
+CACHE_URL = os.environ.get('CACHE_URL')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+# Validade do fingerprint da operadora (o conteúdo de um file_hash não muda)
+INVOICE_FINGERPRINT_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Orçamento das regras de extração (lixo de OCR não pode prender o worker): tamanho máximo
+# do texto avaliado e, por regra e por texto, tentativas de match. Leituras que estouram o
+# orçamento não são memorizadas e contam em ParserRuleStat.exhausted
+INVOICE_RULES_MAX_TEXT = int(os.environ.get('INVOICE_RULES_MAX_TEXT', 1_000_000))
+INVOICE_RULE_MAX_ATTEMPTS = int(os.environ.get('INVOICE_RULE_MAX_ATTEMPTS', 10_000))
+# Contadores por regra de parser (casou/venceu/tempo), somados em ParserRuleStat após cada importação
+INVOICE_RULE_METRICS = os.environ.get('INVOICE_RULE_METRICS', 'True') == 'True'
+
+# Itens do detalhamento (InvoiceLineItem) extraídos em uma task separada após a importação,
+# gravados em lotes de INVOICE_LINE_ITEMS_BATCH_SIZE linhas
+INVOICE_LINE_ITEMS = os.environ.get('INVOICE_LINE_ITEMS', 'True') == 'True'
+INVOICE_LINE_ITEMS_BATCH_SIZE = int(os.environ.get('INVOICE_LINE_ITEMS_BATCH_SIZE', 1000))
+
+# PDFs com várias faturas (lotes): cabeçalhos procurados na leitura das páginas feita após a
+# importação (itens do detalhamento); divididos em uma importação e uma task por fatura.
+# PDFs com menos de INVOICE_SPLIT_MIN_PAGES páginas não são divididos
+INVOICE_SPLIT_BUNDLES = os.environ.get('INVOICE_SPLIT_BUNDLES', 'True') == 'True'
+INVOICE_SPLIT_MIN_PAGES = int(os.environ.get('INVOICE_SPLIT_MIN_PAGES', 2))
+
+# Leitura por modelo de layout (campos por recorte da página 1) e aprendizado de layouts novos
+INVOICE_LAYOUT_TEMPLATES = os.environ.get('INVOICE_LAYOUT_TEMPLATES', 'True') == 'True'
@@ -1,9 +1,42 @@
 from django.contrib import admin
-from .models import InvoiceImport
+from .models import InvoiceImport, InvoiceLineItem, ExtractedText, LayoutTemplate, ParseResult, ParserRuleStat
 
 @admin.register(InvoiceImport)
 class InvoiceImportAdmin(admin.ModelAdmin):
     list_display = ('carrier', 'city', 'month', 'year', 'due_date', 'total_value', 'status', 'created_at')
     list_filter = ('carrier', 'status', 'year')
     search_fields = ('carrier', 'city', 'invoice_number')
+    readonly_fields = ('file_hash', 'parent', 'page_start', 'page_end', 'created_at', 'updated_at')
+
+@admin.register(ExtractedText)
+class ExtractedTextAdmin(admin.ModelAdmin):
+    list_display = ('file_hash', 'method', 'engine_version', 'page_count', 'text_length', 'created_at')
+    list_filter = ('method',)
+    search_fields = ('file_hash',)
     readonly_fields = ('file_hash', 'created_at', 'updated_at')
+    exclude = ('content',)
+
+@admin.register(LayoutTemplate)
+class LayoutTemplateAdmin(admin.ModelAdmin):
+    list_display = ('carrier', 'page_width', 'page_height', 'confidence', 'hits', 'is_active', 'updated_at')
+    list_filter = ('carrier', 'is_active')
+    readonly_fields = ('signature', 'hits', 'created_at', 'updated_at')
+
+@admin.register(ParseResult)
+class ParseResultAdmin(admin.ModelAdmin):
+    list_display = ('file_hash', 'parser', 'rules_version', 'method', 'hits', 'created_at')
+    list_filter = ('parser', 'rules_version')
+    search_fields = ('file_hash',)
+    readonly_fields = ('file_hash', 'parser', 'rules_version', 'data', 'hits', 'created_at')
+
+@admin.register(ParserRuleStat)
+class ParserRuleStatAdmin(admin.ModelAdmin):
+    list_display = ('carrier', 'rule', 'field', 'stage', 'evaluations', 'matched', 'won', 'exhausted', 'updated_at')
+    list_filter = ('carrier', 'stage', 'field')
+    readonly_fields = ('evaluations', 'matched', 'won', 'exhausted', 'total_ms', 'time_histogram', 'updated_at')
+
+@admin.register(InvoiceLineItem)
+class InvoiceLineItemAdmin(admin.ModelAdmin):
+    list_display = ('invoice', 'page', 'position', 'access', 'description', 'duration_seconds', 'amount')
+    search_fields = ('access', 'description')
+    raw_id_fields = ('invoice',)
@@ -0,0 +1,4 @@
+"""
+Benchmarks do pipeline de importação de faturas.
+Executados via management commands (ex: `python manage.py benchmark_parser_rules`).
+"""
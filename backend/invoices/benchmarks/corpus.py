@@ -0,0 +1,173 @@
+"""
+Gerador de faturas sintéticas em PDF (VIVO e Claro) para benchmarks e testes de regressão.
+
+Sem dependências externas: o PDF é montado à mão (fonte Helvetica padrão, páginas
+escaneadas como imagens em tons de cinza com FlateDecode), então roda offline.
+Cada documento tem a página 1 com os campos da fatura e páginas de detalhamento.
+"""
+import random
+import zlib
+from datetime import date
+from decimal import Decimal
+from PIL import Image, ImageDraw, ImageFont
+
+CARRIERS = ('VIVO', 'CLARO')
+# digital: camada de texto em todas as páginas; scanned: só imagens;
+# mixed: capa escaneada e detalhamento digital
+KINDS = ('digital', 'scanned', 'mixed')
+
+PAGE_SIZE = (595, 842)  # A4 em pontos
+SCAN_DPI = 150
+DETAIL_LINES = 40
+
+
+def format_currency(value):
+    return f"{value:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def invoice_fields(carrier, seed):
+    """Campos esperados da fatura `seed` (a Claro não tem número da fatura nas regras)."""
+    rng = random.Random(f"{carrier}-{seed}")
+    # A regra de total da Claro não aceita separador de milhar
+    max_total = 9999 if carrier == 'VIVO' else 999
+    return {
+        'invoice_number': str(rng.randint(10 ** 8, 10 ** 9 - 1)) if carrier == 'VIVO' else None,
+        'due_date': date(2026, rng.randint(1, 12), rng.randint(1, 28)),
+        'total_value': Decimal(f"{rng.randint(50, max_total)}.{rng.randint(0, 99):02d}"),
+    }
+
+
+def cover_lines(carrier, expected):
+    total = format_currency(expected['total_value'])
+    due = expected['due_date'].strftime('%d/%m/%Y')
+    if carrier == 'VIVO':
+        return [
+            "VIVO EMPRESAS - TELEFONICA BRASIL S.A.",
+            f"Conta No. {expected['invoice_number']}",
+            f"Vencimento {due}",
+            f"Total a pagar R$ {total}",
+        ]
+    return [
+        "CLARO S.A. - EMBRATEL",
+        f"TOTAL A PAGAR R$ {total}",
+        f"VENCIMENTO {due}",
+    ]
+
+
+def detail_lines(rng, count=DETAIL_LINES):
+    return [
+        f"11 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}  00:0{rng.randint(1, 9)}:{rng.randint(10, 59)}"
+        f"  R$ {rng.randint(0, 9)},{rng.randint(10, 99)}"
+        for _ in range(count)
+    ]
+
+
+def make_invoice(carrier, kind, pages, seed=0):
+    """Retorna (bytes do PDF, campos esperados)."""
+    if carrier not in CARRIERS or kind not in KINDS:
+        raise ValueError(f"Combinação desconhecida: {carrier}/{kind}")
+
+    writer = PdfWriter()
+    expected = _add_invoice(writer, carrier, kind, pages, seed)
+    return writer.getvalue(), expected
+
+
+def make_bundle(parts, kind='digital'):
+    """
+    Lote: várias faturas em um único PDF, uma após a outra. `parts` é uma lista de
+    (operadora, páginas, seed). Retorna (bytes do PDF, [(página inicial, página final, operadora, campos)]).
+    """
+    writer = PdfWriter()
+    segments = []
+    for carrier, pages, seed in parts:
+        if carrier not in CARRIERS or kind not in KINDS:
+            raise ValueError(f"Combinação desconhecida: {carrier}/{kind}")
+        start = len(writer.pages) + 1
+        expected = _add_invoice(writer, carrier, kind, pages, seed)
+        segments.append((start, start + pages - 1, carrier, expected))
+    return writer.getvalue(), segments
+
+
+def _add_invoice(writer, carrier, kind, pages, seed):
+    rng = random.Random(f"{carrier}-{kind}-{pages}-{seed}")
+    expected = invoice_fields(carrier, seed)
+    for number in range(pages):
+        lines = (cover_lines(carrier, expected) + [""] if number == 0 else []) + detail_lines(rng)
+        scanned = kind == 'scanned' or (kind == 'mixed' and number == 0)
+        if scanned:
+            writer.add_image_page(render_page(lines))
+        else:
+            writer.add_text_page(lines)
+    return expected
+
+
+def render_page(lines, dpi=SCAN_DPI):
+    """Página "escaneada": o texto desenhado em uma imagem em tons de cinza."""
+    width, height = (round(side * dpi / 72) for side in PAGE_SIZE)
+    image = Image.new('L', (width, height), 245)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=round(11 * dpi / 72))
+    margin = round(50 * dpi / 72)
+    leading = round(14 * dpi / 72)
+    for index, line in enumerate(lines):
+        draw.text((margin, margin + index * leading), line, fill=20, font=font)
+    return image
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+class PdfWriter:
+    """PDF mínimo com xref válido: páginas de texto (Helvetica) e páginas de imagem."""
+
+    def __init__(self):
+        # Objetos 1 (catálogo), 2 (árvore de páginas) e 3 (fonte) fixos
+        self.objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+        self.pages = []
+
+    def _add(self, body):
+        self.objects.append(body)
+        return len(self.objects)
+
+    def _add_stream(self, data, attributes=b""):
+        return self._add(b"<< /Length %d %s>>\nstream\n" % (len(data), attributes) + data + b"\nendstream")
+
+    def add_text_page(self, lines):
+        content = b"BT /F1 11 Tf 50 792 Td 14 TL " + b" ".join(
+            b"(" + _escape(line).encode('latin-1') + b") Tj T*" for line in lines
+        ) + b" ET"
+        contents = self._add_stream(content)
+        self.pages.append(self._add(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> >> >>" % (*PAGE_SIZE, contents)
+        ))
+
+    def add_image_page(self, image):
+        width, height = image.size
+        pixels = zlib.compress(image.convert('L').tobytes(), 6)
+        xobject = self._add_stream(pixels, b"/Type /XObject /Subtype /Image /Width %d /Height %d "
+                                           b"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode " % (width, height))
+        contents = self._add_stream(b"q %d 0 0 %d 0 0 cm /Im1 Do Q" % PAGE_SIZE)
+        self.pages.append(self._add(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /XObject << /Im1 %d 0 R >> >> >>" % (*PAGE_SIZE, contents, xobject)
+        ))
+
+    def getvalue(self):
+        self.objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+        kids = b" ".join(b"%d 0 R" % page for page in self.pages)
+        self.objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages))
+
+        chunks = [b"%PDF-1.4\n"]
+        position = len(chunks[0])
+        offsets = []
+        for number, body in enumerate(self.objects, start=1):
+            obj = b"%d 0 obj\n" % number + body + b"\nendobj\n"
+            offsets.append(position)
+            chunks.append(obj)
+            position += len(obj)
+        chunks.append(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self.objects) + 1))
+        chunks.append(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+        chunks.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(self.objects) + 1, position))
+        return b"".join(chunks)
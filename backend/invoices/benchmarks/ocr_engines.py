@@ -0,0 +1,64 @@
+"""
+Benchmark dos motores de OCR (invoices.parsers.engines): um processo do tesseract por
+página (pytesseract) contra instâncias aquecidas (tesserocr), sobre páginas de faturas
+sintéticas (invoices.benchmarks.corpus). A primeira página de cada motor é medida à parte
+(carga do traineddata); as demais dão a vazão em regime.
+"""
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ..parsers.engines import OCR_ENGINES, TesserocrEngine
+from ..parsers.vivo import VivoParser
+from .corpus import cover_lines, detail_lines, invoice_fields, render_page
+
+FIELDS = ('invoice_number', 'due_date', 'total_value')
+
+
+def make_pages(samples, dpi):
+    """Capas de faturas VIVO "escaneadas". Retorna [(imagem, campos esperados)]."""
+    pages = []
+    for seed in range(samples):
+        expected = invoice_fields('VIVO', seed)
+        lines = cover_lines('VIVO', expected) + [""] + detail_lines(random.Random(seed), 20)
+        pages.append((render_page(lines, dpi=dpi), expected))
+    return pages
+
+
+def run(samples=10, dpi=150, workers=1, lang='por'):
+    """Retorna um resumo por motor: tempo da primeira página, média em regime, páginas/s e acertos."""
+    parser = VivoParser()
+    pages = make_pages(samples, dpi)
+    summary = []
+    for name, engine_class in OCR_ENGINES.items():
+        # Pool de instâncias aquecidas do tamanho do número de threads
+        engine = TesserocrEngine(size=workers) if engine_class is TesserocrEngine else engine_class()
+        result = {'engine': name, 'samples': samples, 'dpi': dpi, 'workers': workers}
+        if not engine.is_available():
+            result['error'] = "indisponível"
+            summary.append(result)
+            continue
+        result['version'] = engine.version()
+
+        try:
+            started = time.perf_counter()
+            engine.image_to_string(pages[0][0], lang)
+            result['first_page_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                texts = list(pool.map(lambda page: engine.image_to_string(page[0], lang), pages))
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            result['error'] = str(e)
+            summary.append(result)
+            continue
+
+        hits = 0
+        for text, (_, expected) in zip(texts, pages):
+            data = parser.parse(None, text=text)
+            hits += sum(1 for field in FIELDS if data.get(field) == expected[field])
+        result['avg_page_ms'] = round(elapsed / samples * 1000, 1)
+        result['pages_per_second'] = round(samples / elapsed, 2)
+        result['field_hit_rate'] = round(hits / (samples * len(FIELDS)), 3)
+        summary.append(result)
+    return summary
@@ -0,0 +1,192 @@
+"""
+Microbenchmark do motor de regras compilado (invoices.parsers.rules) contra a
+implementação anterior (uma chamada re.findall/re.search por padrão + strptime).
+A implementação anterior fica congelada aqui como referência de paridade.
+
+O ganho vem das etapas com várias regras (VIVO). Na CLARO, com uma regra por campo, as duas
+implementações fazem as mesmas buscas diretas: os tempos ficam na casa de 10 µs e o
+`speedup` em torno de 1 (o custo fixo de montar a varredura pesa mais que o texto).
+"""
+import re
+import random
+import time
+from datetime import datetime
+from decimal import Decimal
+from ..parsers.vivo import VivoParser
+from ..parsers.claro import ClaroParser
+
+
+def _clean_currency(value_str):
+    clean = re.sub(r'[^\d,]', '', value_str).replace(',', '.')
+    try:
+        return Decimal(clean)
+    except Exception:
+        return None
+
+
+def _parse_date(date_str):
+    try:
+        return datetime.strptime(date_str.strip(), '%d/%m/%Y').date()
+    except Exception:
+        return None
+
+
+def legacy_vivo_parse(text):
+    data = {'invoice_number': None, 'due_date': None, 'total_value': None, 'carrier': 'VIVO', 'confidence': 100}
+    if not text:
+        data['confidence'] = 0
+        return data
+
+    total_patterns = [
+        r'Total a pagar\s*(?:R\$)?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',
+        r'VALOR TOTAL\s*(?:R\$)?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',
+        r'Total desta fatura\s*(?:R\$)?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',
+        r'Valor a pagar\s*(?:R\$)?\s*(\d{1,3}(?:\.\d{3})*,\d{2})'
+    ]
+    found_values = []
+    for pattern in total_patterns:
+        for m in re.findall(pattern, text, re.IGNORECASE):
+            val = _clean_currency(m)
+            if val:
+                found_values.append(val)
+    if found_values:
+        data['total_value'] = max(found_values)
+
+    date_patterns = [
+        r'Vencimento\s*(\d{2}/\d{2}/\d{4})',
+        r'Data de vencimento\s*(\d{2}/\d{2}/\d{4})',
+        r'Vence em\s*(\d{2}/\d{2}/\d{4})',
+        r'Pague até\s*(\d{2}/\d{2}/\d{4})'
+    ]
+    for pattern in date_patterns:
+        date_match = re.search(pattern, text, re.IGNORECASE)
+        if date_match:
+            data['due_date'] = _parse_date(date_match.group(1))
+            if data['due_date']:
+                break
+
+    inv_match = re.search(r'(?:Fatura número|Nº da fatura|Conta No\.)\s*(\d+)', text, re.IGNORECASE)
+    if inv_match:
+        data['invoice_number'] = inv_match.group(1)
+
+    if not data['total_value'] or not data['due_date'] or not data['invoice_number']:
+        data['confidence'] = 80
+        _legacy_vivo_fallback(text, data)
+        if not data['total_value'] or not data['due_date']:
+            data['confidence'] = 50
+    return data
+
+
+def _legacy_vivo_fallback(text, data):
+    fallback_total_patterns = [
+        r'TOTAL GERAL A PAGAR[\s\S]{0,50}?(\d{1,3}(?:\.\d{3})*,\d{2})',
+        r'TOTAL A PAGAR[\s\S]{0,50}?(\d{1,3}(?:\.\d{3})*,\d{2})',
+        r'Total Geral[\s\S]{0,50}?(\d{1,3}(?:\.\d{3})*,\d{2})',
+        r'(?:Resumo|VALOR \(R\$\))[\s\S]{0,50}?(\d{1,3}(?:\.\d{3})*,\d{2})',
+        r'valor.*?(\d{1,3}(?:\.\d{3})*,\d{2})',
+    ]
+    if not data['total_value']:
+        values = [v for p in fallback_total_patterns for v in map(_clean_currency, re.findall(p, text, re.IGNORECASE)) if v]
+        if values:
+            data['total_value'] = max(values)
+
+    fallback_date_patterns = [
+        r'VENCIMENTO[\s\S]{0,50}?(\d{2}/\d{2}/\d{4})',
+        r'Venc\.[\s\S]{0,50}?(\d{2}/\d{2}/\d{4})',
+        r'(?:Pagamento até|Data limite|Pague até)[\s\S]{0,50}?(\d{2}/\d{2}/\d{4})',
+        r'(\d{2}/\d{2}/\d{4})',
+    ]
+    if not data['due_date']:
+        dates = [d for p in fallback_date_patterns for d in map(_parse_date, re.findall(p, text, re.IGNORECASE)) if d]
+        if dates:
+            data['due_date'] = max(dates)
+
+    if not data['invoice_number']:
+        inv_match = re.search(r'Fatura\D*(\d{7,15})', text, re.IGNORECASE)
+        if inv_match:
+            data['invoice_number'] = inv_match.group(1)
+
+
+def legacy_claro_parse(text):
+    data = {'invoice_number': None, 'due_date': None, 'total_value': None, 'carrier': 'CLARO', 'confidence': 100}
+    if not text:
+        data['confidence'] = 0
+        return data
+    val_match = re.search(r'TOTAL A PAGAR.*?(\d+,\d{2})', text, re.IGNORECASE)
+    if val_match:
+        data['total_value'] = _clean_currency(val_match.group(1))
+    date_match = re.search(r'VENCIMENTO.*?(\d{2}/\d{2}/\d{4})', text, re.IGNORECASE)
+    if date_match:
+        data['due_date'] = _parse_date(date_match.group(1))
+    if not data['total_value'] or not data['due_date']:
+        data['confidence'] = 50
+    return data
+
+
+HEADERS = {
+    'VIVO': (
+        "VIVO EMPRESAS\nTELEFONICA BRASIL S.A.\nNúmero da Conta: 699991956555\n"
+        "Fatura número 2008843401\nPeríodo de Utilização: 09/11/2025 a 08/12/2025\n"
+        "Vencimento 03/01/2026\nTotal a pagar R$ 12.929,30\n"
+    ),
+    'VIVO_FALLBACK': (
+        "VIVO EMPRESAS\nMÊS DE REFERÊNCIA\n12/2025\nVenc. 03/01/2026\n"
+        "RESUMO VALOR (R$)\nConsumo Mínimo 900,00\nTOTAL GERAL A PAGAR: 929,30\n"
+    ),
+    'CLARO': "CLARO S.A.\nVENCIMENTO 15/12/2025\nTOTAL A PAGAR R$ 89,90\n",
+}
+
+
+def make_document(layout, pages, seed=0):
+    """Texto sintético: cabeçalho na página 1 seguido de páginas de detalhamento de chamadas."""
+    rng = random.Random(seed)
+    parts = [HEADERS[layout]]
+    for page in range(2, pages + 1):
+        lines = [f"Detalhamento de ligações - Página {page} de {pages}"]
+        for _ in range(40):
+            day = rng.randint(1, 28)
+            lines.append(
+                f"{day:02d}/11/2025 {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d} "
+                f"(11) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)} Local valor {rng.randint(0, 9)},{rng.randint(10, 99)}"
+            )
+        lines.append(f"Subtotal da página {rng.randint(10, 999)},{rng.randint(10, 99)}")
+        parts.append("\n".join(lines) + "\n")
+    return "".join(parts)
+
+
+def _best_time(func, text, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(page_counts=(1, 10, 200), repeat=5):
+    """Retorna uma lista de resultados (um por layout/tamanho) com tempos e paridade."""
+    vivo = VivoParser()
+    claro = ClaroParser()
+    cases = [
+        ('VIVO', lambda text: vivo.parse(None, text=text), legacy_vivo_parse),
+        ('VIVO_FALLBACK', lambda text: vivo.parse(None, text=text), legacy_vivo_parse),
+        ('CLARO', lambda text: claro.parse(None, text=text), legacy_claro_parse),
+    ]
+
+    results = []
+    for layout, compiled, legacy in cases:
+        for pages in page_counts:
+            text = make_document(layout, pages)
+            legacy_seconds = _best_time(legacy, text, repeat)
+            compiled_seconds = _best_time(compiled, text, repeat)
+            results.append({
+                'layout': layout,
+                'pages': pages,
+                'chars': len(text),
+                'legacy_ms': round(legacy_seconds * 1000, 3),
+                'compiled_ms': round(compiled_seconds * 1000, 3),
+                'speedup': round(legacy_seconds / compiled_seconds, 2) if compiled_seconds else None,
+                'parity': compiled(text) == legacy(text),
+            })
+    return results
@@ -0,0 +1,183 @@
+"""
+Benchmark do pipeline de importação sobre o corpus sintético (invoices.benchmarks.corpus):
+faturas VIVO/Claro digitais, escaneadas e mistas de 1, 10 e 200 páginas.
+
+Para cada caso mede as etapas hash, extração de texto, OCR, regras (regex) e persistência,
+a taxa de acerto dos campos e o pico de memória da extração (em uma execução à parte,
+pois o tracemalloc deixa a extração bem mais lenta). A persistência roda em uma transação desfeita ao final,
+então o banco não é alterado. Sem tesseract/poppler os casos com OCR trazem um aviso.
+"""
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+import pdfplumber
+from django.db import transaction
+from ..models import InvoiceImport
+from ..parsers.base import get_tesseract_version
+from ..parsers.backends import get_text_backends
+from ..parsers.context import ExtractionContext
+from ..parsers.ocr import current_rss_mb
+from ..services.importer import ImportManager
+from ..services.text_store import ExtractedTextStore
+from .corpus import CARRIERS, KINDS, make_invoice
+
+PAGE_COUNTS = (1, 10, 200)
+STAGES = ('hash', 'text', 'ocr', 'regex', 'persist')
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def ocr_available():
+    return shutil.which('tesseract') is not None and shutil.which('pdftoppm') is not None
+
+
+def environment():
+    """Versões que influenciam os tempos, para comparar execuções."""
+    return {
+        'ocr_available': ocr_available(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'pdfplumber': pdfplumber.__version__,
+        'text_backends': [backend.version() for backend in get_text_backends()],
+        'tesseract': get_tesseract_version(),
+    }
+
+
+def _persist(carrier, file_hash, data, context):
+    with transaction.atomic():
+        InvoiceImport.objects.create(
+            file_path=f"benchmark/{file_hash}.pdf",
+            file_hash=file_hash,
+            year=data['due_date'].year if data.get('due_date') else 2026,
+            city='BENCHMARK',
+            carrier=carrier,
+            month='-',
+            invoice_number=data.get('invoice_number'),
+            due_date=data.get('due_date'),
+            total_value=data.get('total_value'),
+            confidence_score=data.get('confidence', 0),
+            ocr_dpi=context.ocr_dpi,
+            ocr_duration_ms=context.ocr_duration_ms,
+        )
+        ExtractedTextStore.save(context)
+        transaction.set_rollback(True)
+
+
+def run_case(importer, path, carrier):
+    """Uma importação medida por etapa. Retorna (tempos em ms, campos lidos, método)."""
+    timings = {}
+
+    started = time.perf_counter()
+    file_hash = importer.get_file_hash(path)
+    timings['hash'] = _ms(time.perf_counter() - started)
+
+    # Sem file_hash no contexto: a extração não lê nem grava o ExtractedTextStore
+    parser = importer.parsers[carrier]
+    context = ExtractionContext(carrier=carrier)
+    started = time.perf_counter()
+    text = parser.extract_text(path, context=context)
+    extraction_ms = _ms(time.perf_counter() - started)
+    timings['ocr'] = float(context.ocr_duration_ms or 0)
+    timings['text'] = round(max(extraction_ms - timings['ocr'], 0.0), 2)
+
+    started = time.perf_counter()
+    data = parser.parse(None, text=text)
+    timings['regex'] = _ms(time.perf_counter() - started)
+
+    context.file_hash = file_hash
+    started = time.perf_counter()
+    _persist(carrier, file_hash, data, context)
+    timings['persist'] = _ms(time.perf_counter() - started)
+
+    timings['total'] = round(sum(timings[stage] for stage in STAGES), 2)
+    return timings, data, context.method
+
+
+def _mb(size):
+    return round(size / (1024 * 1024), 1)
+
+
+def measure_memory(parser, path, carrier):
+    """
+    Memória de uma extração de texto: pico das alocações Python (tracemalloc) e quanto
+    a memória residente do processo cresceu (inclui poppler/tesseract em processo).
+    """
+    context = ExtractionContext(carrier=carrier)
+    rss_before = current_rss_mb()
+    tracemalloc.start()
+    try:
+        parser.extract_text(path, context=context)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rss_after = current_rss_mb()
+    return {
+        'text_peak_mb': _mb(peak),
+        'rss_mb': round(rss_after, 1),
+        'rss_growth_mb': round(max(rss_after - rss_before, 0.0), 1),
+    }
+
+
+def accuracy(parser, data, expected):
+    fields = parser.required_fields
+    mismatches = {
+        field: {'expected': expected[field], 'found': data.get(field)}
+        for field in fields if data.get(field) != expected[field]
+    }
+    return round((len(fields) - len(mismatches)) / len(fields), 3), mismatches
+
+
+def run(carriers=CARRIERS, kinds=KINDS, page_counts=PAGE_COUNTS, repeat=3):
+    """
+    Retorna {'environment', 'cases', 'rss_peak_mb'}; cada caso traz a mediana de cada etapa
+    em `repeat` execuções (ms), o método de extração, a taxa de acerto dos campos obrigatórios
+    e a memória da extração (`memory`).
+    """
+    importer = ImportManager()
+    can_ocr = ocr_available()
+    cases = []
+    with tempfile.TemporaryDirectory(prefix='invoice-benchmark-') as workdir:
+        for carrier in carriers:
+            parser = importer.parsers[carrier]
+            for kind in kinds:
+                for pages in page_counts:
+                    content, expected = make_invoice(carrier, kind, pages)
+                    path = os.path.join(workdir, f"{carrier}-{kind}-{pages}.pdf")
+                    with open(path, 'wb') as f:
+                        f.write(content)
+
+                    case = {'carrier': carrier, 'kind': kind, 'pages': pages, 'bytes': len(content)}
+                    if kind != 'digital' and not can_ocr:
+                        # Tempos e acerto ainda são registrados, mas não são comparáveis
+                        case['warning'] = "OCR indisponível (tesseract/poppler não instalados)"
+                    runs = []
+                    try:
+                        for _ in range(repeat):
+                            runs.append(run_case(importer, path, carrier))
+                    except Exception as e:
+                        case['error'] = f"{type(e).__name__}: {e}"
+                    if runs:
+                        timings = [timing for timing, _, _ in runs]
+                        _, data, method = runs[-1]
+                        case['method'] = method
+                        case['timings_ms'] = {
+                            stage: sorted(timing[stage] for timing in timings)[len(timings) // 2]
+                            for stage in STAGES + ('total',)
+                        }
+                        case['field_accuracy'], case['mismatches'] = accuracy(parser, data, expected)
+                        case['memory'] = measure_memory(parser, path, carrier)
+                    cases.append(case)
+    return {
+        'environment': environment(),
+        'repeat': repeat,
+        'cases': cases,
+        # Pico de memória residente do processo na execução inteira
+        'rss_peak_mb': _mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024),
+    }
@@ -0,0 +1,74 @@
+"""
+Benchmark dos backends da camada de texto (invoices.parsers.backends) sobre um corpus
+de PDFs: vazão (páginas/s, documento inteiro) e paridade do resultado do parser
+em relação ao pdfplumber (referência histórica).
+"""
+import os
+import time
+from ..parsers.backends import get_text_backends, TEXT_BACKENDS
+from ..services.importer import ImportManager
+
+REFERENCE = 'pdfplumber'
+
+
+def collect_pdfs(paths):
+    """Arquivos .pdf informados diretamente ou encontrados (recursivamente) nos diretórios."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names) if name.lower().endswith('.pdf'))
+        elif path.lower().endswith('.pdf'):
+            files.append(path)
+    return files
+
+
+def _parse(importer, text):
+    carrier = importer.identify_carrier(text) or 'VIVO'
+    data = importer.parsers[carrier].parse(None, text=text) or {}
+    return {field: data.get(field) for field in ('carrier', 'invoice_number', 'due_date', 'total_value')}
+
+
+def run(paths, backend_names=None):
+    """Retorna um resumo por backend: páginas/s e quantos documentos deram o mesmo resultado da referência."""
+    importer = ImportManager()
+    files = collect_pdfs(paths)
+    backends = get_text_backends(backend_names or list(TEXT_BACKENDS))
+
+    parsed = {}
+    summary = []
+    for backend in backends:
+        pages = 0
+        seconds = 0.0
+        errors = []
+        for path in files:
+            started = time.perf_counter()
+            try:
+                page_texts = list(backend.iter_pages(path))
+            except Exception as e:
+                errors.append({'file': path, 'error': str(e)})
+                continue
+            seconds += time.perf_counter() - started
+            pages += len(page_texts)
+            text = "".join(page_text + "\n" for page_text in page_texts if page_text)
+            parsed[(backend.name, path)] = _parse(importer, text)
+
+        summary.append({
+            'backend': backend.name,
+            'version': backend.version(),
+            'files': len(files),
+            'pages': pages,
+            'seconds': round(seconds, 3),
+            'pages_per_second': round(pages / seconds, 1) if seconds else None,
+            'errors': errors,
+        })
+
+    for result in summary:
+        compared = [
+            path for path in files
+            if (result['backend'], path) in parsed and (REFERENCE, path) in parsed
+        ]
+        mismatches = [path for path in compared if parsed[(result['backend'], path)] != parsed[(REFERENCE, path)]]
+        result['parity'] = f"{len(compared) - len(mismatches)}/{len(compared)}"
+        result['mismatches'] = mismatches
+    return summary
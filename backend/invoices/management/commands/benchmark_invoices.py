@@ -0,0 +1,22 @@
+import contextlib
+import io
+import json
+from django.core.management.base import BaseCommand
+from invoices.benchmarks import pipeline
+from invoices.benchmarks.corpus import CARRIERS, KINDS
+
+
+class Command(BaseCommand):
+    help = "Tempos por etapa (hash, texto, OCR, regras, persistência) e acerto dos campos sobre faturas sintéticas (saída JSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carriers', nargs='+', choices=CARRIERS, default=list(CARRIERS))
+        parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS))
+        parser.add_argument('--pages', nargs='+', type=int, default=list(pipeline.PAGE_COUNTS))
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        # O fallback da VIVO e o OCR imprimem diagnóstico a cada fatura; não polui a saída JSON
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = pipeline.run(options['carriers'], options['kinds'], options['pages'], options['repeat'])
+        self.stdout.write(json.dumps(results, indent=2, default=str))
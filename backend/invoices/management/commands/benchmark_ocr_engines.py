@@ -0,0 +1,20 @@
+import contextlib
+import io
+import json
+from django.core.management.base import BaseCommand
+from invoices.benchmarks import ocr_engines
+
+
+class Command(BaseCommand):
+    help = "Compara o tesseract por processo (pytesseract) com instâncias aquecidas (tesserocr): tempo por página e acertos (saída JSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=10)
+        parser.add_argument('--dpi', type=int, default=150)
+        parser.add_argument('--workers', type=int, default=1, help="Threads de OCR simultâneas (tamanho do pool)")
+
+    def handle(self, *args, **options):
+        # O fallback da VIVO imprime diagnóstico a cada parse; não polui a saída JSON
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = ocr_engines.run(options['samples'], options['dpi'], options['workers'])
+        self.stdout.write(json.dumps(results, indent=2))
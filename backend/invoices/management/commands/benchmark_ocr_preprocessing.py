@@ -0,0 +1,19 @@
+import contextlib
+import io
+import json
+from django.core.management.base import BaseCommand
+from invoices.benchmarks import ocr_preprocessing
+
+
+class Command(BaseCommand):
+    help = "Compara tempo de OCR e acerto dos campos com e sem pré-processamento das páginas (saída JSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=5)
+        parser.add_argument('--max-side', type=int, default=3600)
+
+    def handle(self, *args, **options):
+        # O fallback da VIVO imprime diagnóstico a cada parse; não polui a saída JSON
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = ocr_preprocessing.run(options['samples'], options['max_side'])
+        self.stdout.write(json.dumps(results, indent=2))
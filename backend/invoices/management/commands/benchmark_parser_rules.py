@@ -0,0 +1,19 @@
+import contextlib
+import io
+import json
+from django.core.management.base import BaseCommand
+from invoices.benchmarks import parser_rules
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark do motor de regras compilado vs. regex por padrão (saída JSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, nargs='*', default=[1, 10, 200])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # O fallback da VIVO imprime diagnóstico a cada parse; não polui a saída JSON
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = parser_rules.run(options['pages'], options['repeat'])
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,19 @@
+import contextlib
+import io
+import json
+from django.core.management.base import BaseCommand
+from invoices.benchmarks import text_backends
+
+
+class Command(BaseCommand):
+    help = "Compara vazão e paridade de parse dos backends de texto sobre um corpus de PDFs (saída JSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Arquivos PDF ou diretórios (busca recursiva)")
+        parser.add_argument('--backends', nargs='*', default=None, help="Padrão: todos os instalados")
+
+    def handle(self, *args, **options):
+        # O fallback da VIVO imprime diagnóstico a cada parse; não polui a saída JSON
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = text_backends.run(options['paths'], options['backends'])
+        self.stdout.write(json.dumps(results, indent=2, default=str))
@@ -0,0 +1,43 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from invoices.models import InvoiceImport
+from invoices.services.reparser import InvoiceReparser
+
+
+class Command(BaseCommand):
+    help = "Re-aplica as regras dos parsers sobre o texto já extraído (sem reler PDF/OCR)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', nargs='*', choices=InvoiceImport.Status.values, help="Status das importações")
+        parser.add_argument('--carrier', help="Operadora (VIVO, CLARO...)")
+        parser.add_argument('--from', dest='date_from', help="Data de importação inicial (AAAA-MM-DD)")
+        parser.add_argument('--to', dest='date_to', help="Data de importação final (AAAA-MM-DD)")
+        parser.add_argument('--chunk-size', type=int, default=InvoiceReparser.CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Apenas conta as mudanças, sem gravar")
+        parser.add_argument('--async', dest='run_async', action='store_true', help="Enfileira lotes no Celery")
+
+    def handle(self, *args, **options):
+        date_from = self._parse_date(options['date_from'])
+        date_to = self._parse_date(options['date_to'])
+        queryset = InvoiceReparser.select(options['status'], options['carrier'], date_from, date_to)
+        chunk_size = options['chunk_size']
+
+        if options['run_async']:
+            job, chunks = InvoiceReparser.dispatch(queryset, dry_run=options['dry_run'], chunk_size=chunk_size)
+            self.stdout.write(f"{sum(len(chunk) for chunk in chunks)} faturas em {len(chunks)} lotes. Job: {job.id}")
+            return
+
+        reparser = InvoiceReparser()
+        summaries = []
+        for chunk in InvoiceReparser.chunk_ids(queryset, chunk_size):
+            summaries.append(reparser.reparse(chunk, dry_run=options['dry_run']))
+        self.stdout.write(json.dumps(InvoiceReparser.merge_summaries(summaries), indent=2))
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        parsed = parse_date(value)
+        if not parsed:
+            raise CommandError(f"Data inválida: {value}")
+        return parsed
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0006_invoiceimport_error_code_alter_invoiceimport_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_hash', models.CharField(max_length=64, unique=True, verbose_name='Hash do Arquivo')),
+                ('method', models.CharField(choices=[('TEXT', 'Camada de Texto'), ('OCR', 'OCR')], max_length=20, verbose_name='Método de Extração')),
+                ('engine_version', models.CharField(blank=True, max_length=100, verbose_name='Versão do Motor')),
+                ('page_count', models.IntegerField(default=0, verbose_name='Páginas')),
+                ('text_length', models.IntegerField(default=0, verbose_name='Tamanho do Texto')),
+                ('content', models.BinaryField(verbose_name='Conteúdo Comprimido')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Texto Extraído',
+                'verbose_name_plural': 'Textos Extraídos',
+            },
+        ),
+    ]
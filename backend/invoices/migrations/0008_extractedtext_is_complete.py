@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0007_extractedtext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedtext',
+            name='is_complete',
+            field=models.BooleanField(default=True, verbose_name='Documento Completo'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0008_extractedtext_is_complete'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='extractedtext',
+            name='method',
+            field=models.CharField(choices=[('TEXT', 'Camada de Texto'), ('OCR', 'OCR'), ('OCR_ROI', 'OCR por Regiões')], max_length=20, verbose_name='Método de Extração'),
+        ),
+    ]
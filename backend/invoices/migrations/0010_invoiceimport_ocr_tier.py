@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0009_extractedtext_method_ocr_regions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceimport',
+            name='ocr_dpi',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='DPI do OCR'),
+        ),
+        migrations.AddField(
+            model_name='invoiceimport',
+            name='ocr_duration_ms',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Tempo de OCR (ms)'),
+        ),
+    ]
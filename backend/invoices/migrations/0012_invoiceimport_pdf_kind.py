@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0011_extractedtext_method_hybrid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceimport',
+            name='pdf_kind',
+            field=models.CharField(blank=True, choices=[('TEXT', 'Digital'), ('SCANNED', 'Escaneado'), ('UNKNOWN', 'Não Classificado')], max_length=20, null=True, verbose_name='Tipo de PDF'),
+        ),
+    ]
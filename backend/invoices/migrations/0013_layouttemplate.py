@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0012_invoiceimport_pdf_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LayoutTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('carrier', models.CharField(max_length=100, verbose_name='Operadora')),
+                ('signature', models.CharField(max_length=64, unique=True, verbose_name='Assinatura')),
+                ('page_width', models.FloatField(verbose_name='Largura da Página')),
+                ('page_height', models.FloatField(verbose_name='Altura da Página')),
+                ('anchors', models.JSONField(default=list, verbose_name='Âncoras')),
+                ('fields', models.JSONField(default=dict, verbose_name='Campos')),
+                ('confidence', models.IntegerField(default=100, verbose_name='Confiabilidade')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Usos')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Modelo de Layout',
+                'verbose_name_plural': 'Modelos de Layout',
+                'ordering': ['-hits'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:41
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0013_layouttemplate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParseResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_hash', models.CharField(db_index=True, max_length=64, verbose_name='Hash do Arquivo')),
+                ('parser', models.CharField(max_length=50, verbose_name='Parser')),
+                ('rules_version', models.PositiveIntegerField(verbose_name='Versão das Regras')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Dados Extraídos')),
+                ('method', models.CharField(blank=True, max_length=20, verbose_name='Método de Extração')),
+                ('ocr_dpi', models.PositiveIntegerField(blank=True, null=True, verbose_name='DPI do OCR')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Usos')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Resultado de Parser',
+                'verbose_name_plural': 'Resultados de Parser',
+                'constraints': [models.UniqueConstraint(fields=('file_hash', 'parser', 'rules_version'), name='unique_parse_result')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0014_parseresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParserRuleStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('carrier', models.CharField(max_length=100, verbose_name='Operadora')),
+                ('rule', models.CharField(max_length=100, verbose_name='Regra')),
+                ('field', models.CharField(max_length=50, verbose_name='Campo')),
+                ('stage', models.CharField(max_length=20, verbose_name='Etapa')),
+                ('evaluations', models.PositiveIntegerField(default=0, verbose_name='Avaliações')),
+                ('matched', models.PositiveIntegerField(default=0, verbose_name='Casou')),
+                ('won', models.PositiveIntegerField(default=0, verbose_name='Venceu')),
+                ('exhausted', models.PositiveIntegerField(default=0, verbose_name='Interrompida pelo Orçamento')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Tempo Total (ms)')),
+                ('time_histogram', models.JSONField(default=list, verbose_name='Histograma de Tempo')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estatística de Regra',
+                'verbose_name_plural': 'Estatísticas de Regras',
+                'constraints': [models.UniqueConstraint(fields=('carrier', 'rule'), name='unique_parser_rule_stat')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0015_parserrulestat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceLineItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.PositiveIntegerField(verbose_name='Página')),
+                ('position', models.PositiveIntegerField(verbose_name='Posição')),
+                ('access', models.CharField(max_length=30, verbose_name='Acesso/Linha')),
+                ('description', models.CharField(blank=True, max_length=255, verbose_name='Descrição')),
+                ('duration_seconds', models.PositiveIntegerField(blank=True, null=True, verbose_name='Duração (s)')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Valor')),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='line_items', to='invoices.invoiceimport', verbose_name='Fatura')),
+            ],
+            options={
+                'verbose_name': 'Item da Fatura',
+                'verbose_name_plural': 'Itens da Fatura',
+                'ordering': ['invoice', 'page', 'position'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0016_invoicelineitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceimport',
+            name='page_end',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Página Final'),
+        ),
+        migrations.AddField(
+            model_name='invoiceimport',
+            name='page_start',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Página Inicial'),
+        ),
+        migrations.AddField(
+            model_name='invoiceimport',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='invoices.invoiceimport', verbose_name='Lote de Origem'),
+        ),
+        migrations.AlterField(
+            model_name='invoiceimport',
+            name='status',
+            field=models.CharField(choices=[('INBOX', 'Caixa de Entrada'), ('PROCESSING', 'Processando'), ('OCR_RUNNING', 'OCR em Execução'), ('PENDING', 'Pendente'), ('SUCCESS', 'Sucesso'), ('FAILED', 'Falha'), ('SKIPPED', 'Pulados (Duplicado)'), ('PENDING_REVIEW', 'Aguardando Revisão'), ('SPLIT', 'Dividido em Faturas')], default='PENDING', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0017_invoiceimport_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='layouttemplate',
+            name='rules_version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Versão das Regras'),
+        ),
+    ]
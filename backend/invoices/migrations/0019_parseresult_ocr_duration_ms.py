@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0018_layouttemplate_rules_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parseresult',
+            name='ocr_duration_ms',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Tempo de OCR (ms)'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.translation import gettext_lazy as _
 from reports.models import Report
 
@@ -12,6 +13,12 @@ class InvoiceImport(models.Model):
         FAILED = 'FAILED', _('Falha')
         SKIPPED = 'SKIPPED', _('Pulados (Duplicado)')
         PENDING_REVIEW = 'PENDING_REVIEW', _('Aguardando Revisão')
+        SPLIT = 'SPLIT', _('Dividido em Faturas')
+
+    class PdfKind(models.TextChoices):
+        TEXT = 'TEXT', _('Digital')
+        SCANNED = 'SCANNED', _('Escaneado')
+        UNKNOWN = 'UNKNOWN', _('Não Classificado')
 
     file_path = models.CharField(max_length=500, verbose_name=_("Caminho do Arquivo"))
     file = models.FileField(upload_to='invoices/%Y/%m/', null=True, blank=True, verbose_name=_("Arquivo PDF"))
@@ -49,6 +56,17 @@ class InvoiceImport(models.Model):
         verbose_name=_("Confiabilidade"),
         help_text="0-100 score of parsing confidence"
     )
+    # Nível de OCR usado (faturas escaneadas): DPI escolhido e tempo total de OCR, somando as escalas
+    ocr_dpi = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("DPI do OCR"))
+    ocr_duration_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Tempo de OCR (ms)"))
+    # Pré-classificação no upload/varredura, usada para escolher a fila (text/ocr)
+    pdf_kind = models.CharField(max_length=20, choices=PdfKind.choices, null=True, blank=True, verbose_name=_("Tipo de PDF"))
+    # PDF com várias faturas (lote): cada fatura vira uma importação filha com o intervalo de páginas
+    parent = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True, related_name='segments', verbose_name=_("Lote de Origem")
+    )
+    page_start = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Página Inicial"))
+    page_end = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Página Final"))
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -60,3 +78,152 @@ class InvoiceImport(models.Model):
 
     def __str__(self):
         return f"{self.carrier} - {self.city} - {self.month}/{self.year}"
+
+
+class InvoiceLineItem(models.Model):
+    """
+    Linha do detalhamento da fatura (ligação/serviço por acesso), para rateio de custos.
+    Extraída depois da importação, página a página (LineItemExtractor).
+    """
+    invoice = models.ForeignKey(InvoiceImport, on_delete=models.CASCADE, related_name='line_items', verbose_name=_("Fatura"))
+    page = models.PositiveIntegerField(verbose_name=_("Página"))
+    # Ordem da linha dentro da página
+    position = models.PositiveIntegerField(verbose_name=_("Posição"))
+    access = models.CharField(max_length=30, verbose_name=_("Acesso/Linha"))
+    description = models.CharField(max_length=255, blank=True, verbose_name=_("Descrição"))
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Duração (s)"))
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name=_("Valor"))
+
+    class Meta:
+        verbose_name = _("Item da Fatura")
+        verbose_name_plural = _("Itens da Fatura")
+        ordering = ['invoice', 'page', 'position']
+
+    def __str__(self):
+        return f"{self.access} R$ {self.amount}"
+
+class ExtractedText(models.Model):
+    """
+    Texto extraído de um PDF, endereçado pelo hash do conteúdo.
+    Permite reprocessar faturas sem rodar pdfplumber/OCR novamente.
+    """
+    class Method(models.TextChoices):
+        TEXT = 'TEXT', _('Camada de Texto')
+        OCR = 'OCR', _('OCR')
+        OCR_REGIONS = 'OCR_ROI', _('OCR por Regiões')
+        HYBRID = 'HYBRID', _('Texto + OCR por Página')
+
+    file_hash = models.CharField(max_length=64, unique=True, verbose_name=_("Hash do Arquivo"))
+    method = models.CharField(max_length=20, choices=Method.choices, verbose_name=_("Método de Extração"))
+    engine_version = models.CharField(max_length=100, blank=True, verbose_name=_("Versão do Motor"))
+    page_count = models.IntegerField(default=0, verbose_name=_("Páginas"))
+    text_length = models.IntegerField(default=0, verbose_name=_("Tamanho do Texto"))
+    # False quando a extração parou ao encontrar os campos obrigatórios (páginas seguintes não lidas)
+    is_complete = models.BooleanField(default=True, verbose_name=_("Documento Completo"))
+    # JSON {text, page_texts, ocr_texts} comprimido com zlib
+    content = models.BinaryField(verbose_name=_("Conteúdo Comprimido"))
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Texto Extraído")
+        verbose_name_plural = _("Textos Extraídos")
+
+    def __str__(self):
+        return f"{self.file_hash[:12]} ({self.method})"
+
+
+class LayoutTemplate(models.Model):
+    """
+    Layout conhecido de uma operadora: tamanho da página 1, âncoras (rótulos em posição fixa)
+    e a caixa de cada campo, em frações da página (x0, y0, x1, y1). Aprendido uma vez por
+    layout a partir de uma fatura lida pelas regras; depois os campos são lidos por recorte.
+    """
+    carrier = models.CharField(max_length=100, verbose_name=_("Operadora"))
+    # Hash de operadora + versão das regras + tamanho da página + âncoras: um registro por layout
+    signature = models.CharField(max_length=64, unique=True, verbose_name=_("Assinatura"))
+    # rules_version do parser quando o layout foi aprendido; só é usado com a mesma versão
+    rules_version = models.PositiveIntegerField(default=1, verbose_name=_("Versão das Regras"))
+    page_width = models.FloatField(verbose_name=_("Largura da Página"))
+    page_height = models.FloatField(verbose_name=_("Altura da Página"))
+    # [{"text": "total a pagar", "box": [x0, y0, x1, y1]}, ...]
+    anchors = models.JSONField(default=list, verbose_name=_("Âncoras"))
+    # {"total_value": {"box": [x0, y0, x1, y1], "pattern": "..."}, ...}
+    fields = models.JSONField(default=dict, verbose_name=_("Campos"))
+    # Confiança da leitura por regras de onde o layout foi aprendido
+    confidence = models.IntegerField(default=100, verbose_name=_("Confiabilidade"))
+    is_active = models.BooleanField(default=True, verbose_name=_("Ativo"))
+    hits = models.PositiveIntegerField(default=0, verbose_name=_("Usos"))
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Modelo de Layout")
+        verbose_name_plural = _("Modelos de Layout")
+        ordering = ['-hits']
+
+    def __str__(self):
+        return f"{self.carrier} {self.page_width:.0f}x{self.page_height:.0f} ({self.signature[:8]})"
+
+
+class ParseResult(models.Model):
+    """
+    Saída de parser.parse() memorizada por (file_hash, parser, versão das regras). Reimportar
+    ou reprocessar um PDF inalterado com as mesmas regras é só uma consulta; incrementar o
+    `rules_version` de um parser invalida apenas os resultados dele.
+    """
+    file_hash = models.CharField(max_length=64, db_index=True, verbose_name=_("Hash do Arquivo"))
+    parser = models.CharField(max_length=50, verbose_name=_("Parser"))
+    rules_version = models.PositiveIntegerField(verbose_name=_("Versão das Regras"))
+    # Dict retornado por parse(): datas em ISO e valores decimais como texto
+    data = models.JSONField(encoder=DjangoJSONEncoder, verbose_name=_("Dados Extraídos"))
+    method = models.CharField(max_length=20, blank=True, verbose_name=_("Método de Extração"))
+    ocr_dpi = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("DPI do OCR"))
+    ocr_duration_ms = models.PositiveIntegerField(null=True, blank=True, verbose_name=_("Tempo de OCR (ms)"))
+    hits = models.PositiveIntegerField(default=0, verbose_name=_("Usos"))
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Resultado de Parser")
+        verbose_name_plural = _("Resultados de Parser")
+        constraints = [
+            models.UniqueConstraint(fields=['file_hash', 'parser', 'rules_version'], name='unique_parse_result'),
+        ]
+
+    def __str__(self):
+        return f"{self.file_hash[:12]} {self.parser} v{self.rules_version}"
+
+
+class ParserRuleStat(models.Model):
+    """
+    Uso acumulado de uma regra de parser (somado de todos os workers): quantas vezes a etapa
+    da regra foi avaliada em parse(), casou, venceu (forneceu o valor do campo) ou foi
+    interrompida pelo orçamento, e o tempo gasto. Base para podar regras mortas, reordenar
+    por taxa de acerto e perceber quando uma operadora passa a cair no fallback.
+    """
+    carrier = models.CharField(max_length=100, verbose_name=_("Operadora"))
+    rule = models.CharField(max_length=100, verbose_name=_("Regra"))
+    field = models.CharField(max_length=50, verbose_name=_("Campo"))
+    stage = models.CharField(max_length=20, verbose_name=_("Etapa"))
+    evaluations = models.PositiveIntegerField(default=0, verbose_name=_("Avaliações"))
+    matched = models.PositiveIntegerField(default=0, verbose_name=_("Casou"))
+    won = models.PositiveIntegerField(default=0, verbose_name=_("Venceu"))
+    exhausted = models.PositiveIntegerField(default=0, verbose_name=_("Interrompida pelo Orçamento"))
+    total_ms = models.FloatField(default=0, verbose_name=_("Tempo Total (ms)"))
+    # Avaliações por intervalo de tempo (RULE_TIME_BUCKETS_MS + acima do último)
+    time_histogram = models.JSONField(default=list, verbose_name=_("Histograma de Tempo"))
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("Estatística de Regra")
+        verbose_name_plural = _("Estatísticas de Regras")
+        constraints = [
+            models.UniqueConstraint(fields=['carrier', 'rule'], name='unique_parser_rule_stat'),
+        ]
+
+    def __str__(self):
+        return f"{self.carrier}/{self.rule}"
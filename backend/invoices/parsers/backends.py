@@ -0,0 +1,126 @@
+import shutil
+import subprocess
+import tempfile
+import pdfplumber
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from pdf2image import pdfinfo_from_path
+
+
+class TextBackend:
+    """
+    Extrator da camada de texto de um PDF. `iter_pages` gera o texto de cada página
+    a partir de `start`, sob demanda, para que o parser possa parar de ler cedo.
+    """
+    name = None
+
+    def is_available(self):
+        return True
+
+    def version(self):
+        return self.name
+
+    def iter_pages(self, pdf_file, start=0):
+        raise NotImplementedError
+
+
+class PdfPlumberBackend(TextBackend):
+    name = 'pdfplumber'
+
+    def version(self):
+        return f"pdfplumber {pdfplumber.__version__}"
+
+    def iter_pages(self, pdf_file, start=0):
+        # Garante que o ponteiro está no início se for um objeto de arquivo
+        if hasattr(pdf_file, 'seek'):
+            pdf_file.seek(0)
+
+        with pdfplumber.open(pdf_file) as pdf:
+            for page in pdf.pages[start:]:
+                try:
+                    text = page.extract_text() or ""
+                finally:
+                    # Libera os objetos de layout (chars, linhas, mapa de texto) da página já
+                    # lida; sem isso o documento inteiro fica em memória até o fim da leitura
+                    page.close()
+                yield text
+
+
+class PdftotextBackend(TextBackend):
+    """
+    pdftotext (poppler, já instalado para o pdf2image). Só texto corrido, sem objetos
+    de layout: bem mais rápido que o pdfplumber. Lê em blocos de páginas (-f/-l),
+    separadas por form feed, para manter a parada antecipada.
+    """
+    name = 'pdftotext'
+    CHUNK_PAGES = 4
+    TIMEOUT = 60
+
+    _version = None
+
+    def is_available(self):
+        return shutil.which('pdftotext') is not None
+
+    def version(self):
+        if PdftotextBackend._version is None:
+            try:
+                output = subprocess.run(['pdftotext', '-v'], capture_output=True, text=True, timeout=10)
+                # "pdftotext version 22.02.0" (stderr)
+                PdftotextBackend._version = (output.stderr or output.stdout).splitlines()[0].replace(' version', '')
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception:
+                PdftotextBackend._version = 'pdftotext'
+        return PdftotextBackend._version
+
+    def iter_pages(self, pdf_file, start=0):
+        if isinstance(pdf_file, str):
+            yield from self._iter_path(pdf_file, start)
+            return
+
+        # Upload: o pdftotext só lê arquivos; copiado em blocos, sem o PDF inteiro em memória
+        if hasattr(pdf_file, 'seek'):
+            pdf_file.seek(0)
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as tmp:
+            shutil.copyfileobj(pdf_file, tmp)
+            tmp.flush()
+            if hasattr(pdf_file, 'seek'):
+                pdf_file.seek(0)
+            yield from self._iter_path(tmp.name, start)
+
+    def _iter_path(self, path, start):
+        page_count = int(pdfinfo_from_path(path).get('Pages', 0))
+        for first in range(start + 1, page_count + 1, self.CHUNK_PAGES):
+            last = min(first + self.CHUNK_PAGES - 1, page_count)
+            output = subprocess.run(
+                ['pdftotext', '-enc', 'UTF-8', '-f', str(first), '-l', str(last), path, '-'],
+                capture_output=True, check=True, timeout=self.TIMEOUT,
+            )
+            # Cada página termina com \f
+            pages = output.stdout.decode('utf-8', errors='replace').split('\f')
+            for page_text in pages[:last - first + 1]:
+                yield page_text.strip('\n')
+
+
+TEXT_BACKENDS = {
+    backend.name: backend for backend in (PdftotextBackend, PdfPlumberBackend)
+}
+
+
+def get_text_backends(names=None):
+    """
+    Backends disponíveis, na ordem de preferência: `names` (ex: do parser) ou
+    INVOICE_TEXT_BACKENDS. Nomes desconhecidos e backends não instalados são ignorados.
+    """
+    if names is None:
+        names = getattr(settings, 'INVOICE_TEXT_BACKENDS', None) or ['pdfplumber']
+    backends = []
+    for name in names:
+        backend_class = TEXT_BACKENDS.get(name)
+        if backend_class is None:
+            print(f"Aviso: backend de texto desconhecido: {name}")
+            continue
+        backend = backend_class()
+        if backend.is_available():
+            backends.append(backend)
+    return backends
@@ -1,62 +1,399 @@
 from abc import ABC, abstractmethod
-import pdfplumber
 import re
 import pytesseract
-from pdf2image import convert_from_path, convert_from_bytes
 from datetime import datetime
 from decimal import Decimal
-import io
+import time
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from .backends import get_text_backends
+from .context import ExtractionContext
+from .engines import get_ocr_engine
+from .ocr import OcrBudget, OcrExecutor
+from .preprocessing import ImagePreprocessor
+from .rules import PRIMARY
+from ..services.text_store import ExtractedTextStore
+
+_tesseract_version = None
+
+def get_tesseract_version():
+    global _tesseract_version
+    if _tesseract_version is None:
+        try:
+            _tesseract_version = f"tesseract {pytesseract.get_tesseract_version()}"
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception:
+            _tesseract_version = "tesseract"
+    return _tesseract_version
 
 class BaseInvoiceParser(ABC):
+    # Regras compiladas da operadora (RuleSet), usadas também para a parada antecipada
+    rules = None
+    # Campos que, encontrados pelas regras primárias, dispensam a leitura das páginas seguintes
+    required_fields = ('total_value', 'due_date', 'invoice_number')
+    # Campos que identificam a fatura (distinguem duas faturas em um mesmo PDF)
+    identity_fields = ('invoice_number', 'due_date')
+    # True para parsers que precisam do documento inteiro (sem parada antecipada)
+    full_document = False
+    # Backends da camada de texto em ordem de preferência (None: INVOICE_TEXT_BACKENDS)
+    text_backends = None
+    # Abaixo disso o texto é considerado insuficiente (próximo backend / OCR)
+    MIN_TEXT_LENGTH = 50
+    # Página com menos texto que isso é tratada como escaneada (OCR só dela em PDFs mistos)
+    MIN_PAGE_TEXT_LENGTH = 20
+    # Zonas (OcrRegion) da página 1 com os campos obrigatórios, para faturas escaneadas desta operadora
+    ocr_regions = ()
+    # Motor de OCR (nome em OCR_ENGINES; None: INVOICE_OCR_ENGINE)
+    ocr_engine = None
+    # Versão das regras/parse(): incrementar a cada mudança que altere o resultado, para
+    # invalidar os resultados memorizados (ParseResult) deste parser
+    rules_version = 1
+    # Regex (re.MULTILINE, grupos access/description/duration/amount) das linhas do detalhamento;
+    # None: a operadora não tem extração de itens
+    line_item_pattern = None
+
     @abstractmethod
-    def parse(self, pdf_file):
+    def parse(self, pdf_file, text=None, context=None):
         """
         Recebe um caminho de arquivo ou objeto de arquivo e retorna dados extraídos.
+        Se `text` for informado (já extraído), o PDF não é lido novamente.
+        `context` (ExtractionContext) reaproveita a extração feita na identificação da operadora.
         """
         pass
 
-    def extract_text(self, pdf_file):
-        text = ""
+    def get_text_backends(self):
+        """Backends da camada de texto, na ordem de tentativa (`text_backends` do parser ou INVOICE_TEXT_BACKENDS)."""
+        return get_text_backends(self.text_backends)
+
+    def get_ocr_engine(self):
+        """Motor de OCR do parser (`ocr_engine` ou INVOICE_OCR_ENGINE), com as instâncias aquecidas do processo."""
+        return get_ocr_engine(self.ocr_engine)
+
+    def found_fields(self, text):
+        """Campos de `required_fields` encontrados com alta confiança (regras primárias) em um trecho de texto."""
+        if self.rules is None or not text:
+            return set()
+
+        matches = self.rules.scan(text)
+        found = set()
+        for field in self.required_fields:
+            decoder = self.rules.decoders.get(field)
+            for rule in self.rules.select(field, PRIMARY):
+                value = matches.first(rule)
+                if value and (decoder is None or decoder(value)):
+                    found.add(field)
+                    break
+        return found
+
+    def header_key(self, text):
+        """
+        Identidade da fatura em uma página de cabeçalho: valores de `identity_fields` pelas regras
+        primárias, ou None se a página não tiver todos os `required_fields`. O total fica de fora
+        da chave: subtotais de seção repetem o rótulo. Usado para achar o início de cada fatura em um lote.
+        """
+        if self.rules is None or not text:
+            return None
+
+        matches = self.rules.scan(text)
+        values = {}
+        for field in dict.fromkeys(self.required_fields + self.identity_fields):
+            rules = self.rules.select(field, PRIMARY)
+            value = matches.pick(rules, self.rules.decoders.get(field)) if rules else None
+            if value is None and field in self.required_fields:
+                return None
+            values[field] = value
+        return tuple(values[field] for field in self.identity_fields)
+
+    def has_required_fields(self, text):
+        return not self.full_document and self.rules is not None and self.found_fields(text) >= set(self.required_fields)
+
+    def extract_text(self, pdf_file, context=None):
+        """
+        Extrai o texto página a página. Se o parser não exige o documento inteiro,
+        para de abrir páginas assim que os campos obrigatórios são encontrados.
+        """
+        if context is None:
+            context = ExtractionContext()
+
+        # Texto já extraído nesta importação (ex: na identificação da operadora)
+        # ou em uma importação anterior do mesmo arquivo
+        if context.is_extracted or self._load_stored_text(context):
+            if context.complete or self.has_required_fields(context.text):
+                return context.text
+
+        resumed = list(context.page_texts) if context.method == ExtractionContext.METHOD_TEXT else []
+        page_texts, text, complete, engine_version = [], "", True, None
+        for backend in self.get_text_backends():
+            if backend.name in context.failed_backends:
+                continue
+            page_texts = list(resumed)
+            text, complete, failed = self._read_pages(backend, pdf_file, page_texts)
+            engine_version = backend.version()
+            if failed:
+                # Leitura interrompida no meio (os campos não estavam nas páginas lidas, senão
+                # teria parado antes): o próximo backend relê o documento do início
+                context.failed_backends.add(backend.name)
+                print(f"[{backend.name}] Leitura interrompida, tentando o próximo backend.")
+                resumed = []
+                continue
+            if len(text.strip()) >= self.MIN_TEXT_LENGTH:
+                break
+            # Texto insuficiente: o próximo backend relê o documento do início
+            print(f"[{backend.name}] Texto insuficiente, tentando o próximo backend.")
+            resumed = []
+
+        page_methods = [ExtractionContext.METHOD_TEXT] * len(page_texts)
+        method = ExtractionContext.METHOD_TEXT
+        if len(text.strip()) < self.MIN_TEXT_LENGTH:
+            # Se o texto for muito curto, pode ser um PDF escaneado
+            context.method = None
+            text = self.extract_text_via_ocr(pdf_file, context=context)
+            method = context.method or ExtractionContext.METHOD_OCR
+            page_methods = [method] * len(context.ocr_texts)
+            engine_version = get_tesseract_version()
+            complete = True
+        else:
+            # PDF misto: OCR só das páginas sem camada de texto, se os campos não estiverem no texto
+            missing = [
+                index for index, page_text in enumerate(page_texts)
+                if len(page_text.strip()) < self.MIN_PAGE_TEXT_LENGTH
+            ]
+            if missing and not self.has_required_fields(text):
+                text = self.extract_pages_via_ocr(pdf_file, page_texts, page_methods, missing, context)
+                if ExtractionContext.METHOD_OCR in page_methods:
+                    method = ExtractionContext.METHOD_HYBRID
+                    engine_version = f"{engine_version} + {get_tesseract_version()}"
+
+        context.text = text
+        context.page_texts = page_texts
+        context.page_methods = page_methods
+        context.method = method
+        context.engine_version = engine_version
+        context.complete = complete
+        # OCR interrompido pelo orçamento: o texto parcial não é reaproveitado em reprocessamentos
+        if not context.ocr_timed_out:
+            self._save_stored_text(context)
+            
+        return text
+
+    def _read_pages(self, backend, pdf_file, page_texts):
+        """
+        Lê páginas do backend a partir de len(page_texts), acrescentando em `page_texts`.
+        Retorna (texto, documento completo, backend falhou). O texto é montado uma vez no fim:
+        concatenar a cada página recopiaria o texto acumulado (quadrático em faturas de centenas
+        de páginas). Uma falha no meio do documento nunca é um texto completo.
+        """
+        found = set() if self.full_document else self.found_fields(self.join_pages(page_texts))
+        required = set(self.required_fields)
+        pages = backend.iter_pages(pdf_file, start=len(page_texts))
         try:
-            # Garante que o ponteiro está no início se for um objeto de arquivo
-            if hasattr(pdf_file, 'seek'):
-                pdf_file.seek(0)
-                
-            with pdfplumber.open(pdf_file) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
+            for page_text in pages:
+                page_texts.append(page_text)
+                if page_text and not self.full_document and self.rules is not None:
+                    found |= self.found_fields(page_text)
+                    if found >= required:
+                        return self.join_pages(page_texts), False, False
+        except SoftTimeLimitExceeded:
+            raise
         except Exception as e:
-            print(f"Erro pdfplumber: {e}")
+            print(f"Erro {backend.name}: {e}")
+            return self.join_pages(page_texts), False, True
+        finally:
+            # Parada antecipada: fecha o PDF agora, não quando o gerador for coletado
+            pages.close()
+        return self.join_pages(page_texts), True, False
 
-        # Se o texto for muito curto, pode ser um PDF escaneado
-        if len(text.strip()) < 50:
-            text = self.extract_text_via_ocr(pdf_file)
-            
+    def extract_full_text(self, pdf_file):
+        """
+        Camada de texto de todas as páginas, sem parada antecipada nem OCR (ex: completar um
+        texto guardado após a parada antecipada). Retorna (texto, page_texts, versão do backend)
+        ou None se nenhum backend ler texto suficiente.
+        """
+        for backend in self.get_text_backends():
+            page_texts = []
+            pages = backend.iter_pages(pdf_file)
+            try:
+                page_texts.extend(pages)
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as e:
+                print(f"Erro {backend.name}: {e}")
+                continue
+            finally:
+                pages.close()
+            text = self.join_pages(page_texts)
+            if len(text.strip()) >= self.MIN_TEXT_LENGTH:
+                return text, page_texts, backend.version()
+        return None
+
+    def _load_stored_text(self, context):
+        try:
+            return ExtractedTextStore.load(context)
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: Falha ao ler texto armazenado: {e}")
+            return False
+
+    def _save_stored_text(self, context):
+        try:
+            ExtractedTextStore.save(context)
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: Falha ao armazenar texto extraído: {e}")
+
+    def extract_text_via_ocr(self, pdf_file, context=None):
+        """
+        OCR em níveis crescentes de DPI (INVOICE_OCR_DPI_TIERS). Começa no mais barato e só
+        rasteriza de novo em resolução maior se o parser não confiar no resultado.
+        """
+        tiers = list(getattr(settings, 'INVOICE_OCR_DPI_TIERS', None) or [200])
+        budget = self.get_ocr_budget(context)
+        started = time.monotonic()
+        text, ocr_texts, method, dpi = "", [], ExtractionContext.METHOD_OCR, None
+        previous = None
+        for dpi in tiers:
+            text, ocr_texts, method = self._ocr_at_dpi(pdf_file, context, dpi, budget)
+            if self.is_reliable_ocr(text):
+                break
+            if budget.exceeded:
+                # Nível interrompido pelo prazo: fica com o anterior (completo), se houver
+                if previous is not None:
+                    text, ocr_texts, method, dpi = previous
+                break
+            previous = (text, ocr_texts, method, dpi)
+            if dpi != tiers[-1]:
+                print(f"[OCR] Resultado pouco confiável a {dpi} DPI, escalando.")
+
+        if context is not None:
+            context.ocr_texts = ocr_texts
+            context.method = method
+            context.ocr_dpi = dpi
+            context.ocr_duration_ms = int((time.monotonic() - started) * 1000)
         return text
 
-    def extract_text_via_ocr(self, pdf_file):
+    def extract_pages_via_ocr(self, pdf_file, page_texts, page_methods, missing, context):
+        """
+        OCR apenas das páginas sem texto utilizável (índices em `missing`, até INVOICE_OCR_MAX_PAGES),
+        substituindo-as em `page_texts`/`page_methods`. Usa os mesmos níveis de DPI do OCR completo.
+        Retorna o texto do documento.
+        """
+        max_pages = getattr(settings, 'INVOICE_OCR_MAX_PAGES', 2)
+        if max_pages:
+            missing = missing[:max_pages]
+        numbers = [index + 1 for index in missing]
+
+        tiers = list(getattr(settings, 'INVOICE_OCR_DPI_TIERS', None) or [200])
+        budget = self.get_ocr_budget(context)
+        started = time.monotonic()
+        texts = list(page_texts)
+        dpi = None
+        for dpi in tiers:
+            try:
+                ocr_texts = OcrExecutor(
+                    lang='por', dpi=dpi, preprocess=self.get_preprocessor(), budget=budget, engine=self.get_ocr_engine()
+                ).run_pages(pdf_file, numbers)
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as e:
+                print(f"Erro no OCR: {e}")
+                break
+            for index, page_text in zip(missing, ocr_texts):
+                # Página não processada no prazo: mantém a do nível anterior
+                if page_text or not budget.exceeded:
+                    texts[index] = page_text
+            if self.is_reliable_ocr(self.join_pages(texts)) or budget.exceeded:
+                break
+            if dpi != tiers[-1]:
+                print(f"[OCR] Resultado pouco confiável a {dpi} DPI, escalando.")
+
+        for index in missing:
+            if texts[index] != page_texts[index]:
+                page_texts[index] = texts[index]
+                page_methods[index] = ExtractionContext.METHOD_OCR
+        context.ocr_texts = [page_texts[index] for index in missing]
+        context.ocr_dpi = dpi
+        context.ocr_duration_ms = int((time.monotonic() - started) * 1000)
+        return self.join_pages(page_texts)
+
+    @staticmethod
+    def join_pages(page_texts):
+        return "".join(page_text + "\n" for page_text in page_texts if page_text)
+
+    def get_ocr_budget(self, context):
+        """
+        Orçamento de OCR da fatura (INVOICE_OCR_BUDGET_SECONDS). Começa a contar no primeiro
+        OCR e fica no contexto, para valer para a importação inteira.
+        """
+        if context is None:
+            return OcrBudget.from_settings()
+        if context.ocr_budget is None:
+            context.ocr_budget = OcrBudget.from_settings()
+        return context.ocr_budget
+
+    def _ocr_at_dpi(self, pdf_file, context, dpi, budget=None):
+        """Retorna (texto, textos por página, método) do OCR em um nível de DPI."""
+        # Operadora já conhecida: tenta primeiro o OCR só das zonas dos campos
+        if self.ocr_regions and not self.full_document and context is not None \
+                and self.rules is not None and context.carrier == self.rules.carrier:
+            text = None
+            try:
+                text = self.extract_text_via_regions(pdf_file, dpi=dpi, budget=budget)
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as e:
+                print(f"Erro no OCR por regiões: {e}")
+            if text:
+                return text, [text], ExtractionContext.METHOD_OCR_REGIONS
+
         text = ""
+        ocr_texts = []
         try:
-            if hasattr(pdf_file, 'seek'):
-                pdf_file.seek(0)
-            
-            # Se for um caminho de arquivo
-            if isinstance(pdf_file, str):
-                images = convert_from_path(pdf_file, last_page=2)
-            else:
-                # Se for um objeto de arquivo (upload)
-                content = pdf_file.read()
-                images = convert_from_bytes(content, last_page=2)
-                # Reset pointer again just in case
-                if hasattr(pdf_file, 'seek'):
-                    pdf_file.seek(0)
-
-            for img in images:
-                text += pytesseract.image_to_string(img, lang='por') + "\n"
+            # Páginas rasterizadas e processadas em paralelo, na ordem do documento
+            ocr_texts = OcrExecutor(
+                lang='por', dpi=dpi, preprocess=self.get_preprocessor(), budget=budget, engine=self.get_ocr_engine()
+            ).run(pdf_file)
+            text = "".join(page_text + "\n" for page_text in ocr_texts)
+        except SoftTimeLimitExceeded:
+            raise
         except Exception as e:
             print(f"Erro no OCR: {e}")
+        return text, ocr_texts, ExtractionContext.METHOD_OCR
+
+    def get_preprocessor(self):
+        """Limpeza das páginas antes do OCR da página inteira (desligável por INVOICE_OCR_PREPROCESS)."""
+        if not getattr(settings, 'INVOICE_OCR_PREPROCESS', True):
+            return None
+        return ImagePreprocessor(max_side=getattr(settings, 'INVOICE_OCR_MAX_SIDE', 3600))
+
+    def is_reliable_ocr(self, text):
+        """O parser extrai os campos obrigatórios do texto com confiança >= INVOICE_OCR_MIN_CONFIDENCE."""
+        if not text or not text.strip():
+            return False
+        data = self.parse(None, text=text) or {}
+        if data.get('confidence', 0) < getattr(settings, 'INVOICE_OCR_MIN_CONFIDENCE', 80):
+            return False
+        return all(data.get(field) for field in self.required_fields)
+
+    def extract_text_via_regions(self, pdf_file, dpi=None, budget=None):
+        """
+        OCR apenas das zonas de `ocr_regions` na página 1. Retorna None (OCR da página inteira)
+        se alguma zona tiver confiança baixa ou se faltar algum campo obrigatório.
+        """
+        min_confidence = getattr(settings, 'INVOICE_OCR_REGION_MIN_CONFIDENCE', 70)
+        lines = [self.rules.carrier]
+        executor = OcrExecutor(lang='por', dpi=dpi, budget=budget, engine=self.get_ocr_engine())
+        for region, region_text, confidence in executor.run_regions(pdf_file, self.ocr_regions):
+            region_lines = region.lines(region_text)
+            if region_lines and confidence < min_confidence:
+                return None
+            lines.extend(region_lines)
+
+        text = "\n".join(lines) + "\n"
+        if not self.has_required_fields(text):
+            return None
         return text
 
     def clean_currency(self, value_str):
@@ -65,6 +402,8 @@ class BaseInvoiceParser(ABC):
         clean = re.sub(r'[^\d,]', '', value_str).replace(',', '.')
         try:
             return Decimal(clean)
+        except SoftTimeLimitExceeded:
+            raise
         except:
             return None
 
@@ -73,5 +412,7 @@ class BaseInvoiceParser(ABC):
             return None
         try:
             return datetime.strptime(date_str.strip(), fmt).date()
+        except SoftTimeLimitExceeded:
+            raise
         except:
             return None
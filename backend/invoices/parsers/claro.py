@@ -1,9 +1,39 @@
-from .base import BaseInvoiceParser
 import re
+from .base import BaseInvoiceParser
+from .ocr import OcrRegion
+from .rules import Rule, RuleSet, DATE, LINE_ITEM, PRIMARY, decode_currency, decode_date
+
+CLARO_RULES = RuleSet('CLARO', [
+    # Exemplo Claro: "TOTAL A PAGAR R$ 89,90"
+    Rule('total_a_pagar', 'total_value', PRIMARY, r'TOTAL A PAGAR.*?(\d+,\d{2})', ['TOTAL A PAGAR']),
+    # Exemplo Claro: "VENCIMENTO 15/12/2025"
+    Rule('vencimento', 'due_date', PRIMARY, r'VENCIMENTO.*?' + DATE, ['VENCIMENTO']),
+], decoders={'due_date': decode_date, 'total_value': decode_currency})
+
+
+# Zonas da página 1 da fatura Claro (frações da página: x0, y0, x1, y1): faixa de resumo do topo
+CLARO_OCR_REGIONS = (
+    OcrRegion('total_value', (0.40, 0.00, 1.00, 0.30), 'TOTAL A PAGAR', r'(\d+,\d{2})'),
+    OcrRegion('due_date', (0.40, 0.00, 1.00, 0.30), 'VENCIMENTO', DATE),
+)
+
+
+# Linhas do detalhamento (acesso, descrição, duração, valor), uma por linha do texto
+CLARO_LINE_ITEMS = re.compile(LINE_ITEM, re.MULTILINE)
+
 
 class ClaroParser(BaseInvoiceParser):
-    def parse(self, pdf_file):
-        text = self.extract_text(pdf_file)
+    rules = CLARO_RULES
+    ocr_regions = CLARO_OCR_REGIONS
+    # A Claro não tem regra de número da fatura
+    required_fields = ('total_value', 'due_date')
+    # Incrementar ao alterar CLARO_RULES ou parse()
+    rules_version = 1
+    line_item_pattern = CLARO_LINE_ITEMS
+
+    def parse(self, pdf_file, text=None, context=None):
+        if text is None:
+            text = self.extract_text(pdf_file, context=context)
         
         data = {
             'invoice_number': None,
@@ -17,15 +47,12 @@ class ClaroParser(BaseInvoiceParser):
             data['confidence'] = 0
             return data
 
-        # Exemplo Claro: "TOTAL A PAGAR R$ 89,90"
-        val_match = re.search(r'TOTAL A PAGAR.*?(\d+,\d{2})', text, re.IGNORECASE)
-        if val_match:
-            data['total_value'] = self.clean_currency(val_match.group(1))
-        
-        # Exemplo Claro: "VENCIMENTO 15/12/2025"
-        date_match = re.search(r'VENCIMENTO.*?(\d{2}/\d{2}/\d{4})', text, re.IGNORECASE)
-        if date_match:
-            data['due_date'] = self.parse_date(date_match.group(1))
+        matches = self.rules.scan(text)
+        if context is not None:
+            context.rule_matches = matches
+
+        data['total_value'] = matches.pick(self.rules.select('total_value', PRIMARY), decode_currency)
+        data['due_date'] = matches.pick(self.rules.select('due_date', PRIMARY), decode_date)
             
         if not data['total_value'] or not data['due_date']:
             data['confidence'] = 50
@@ -0,0 +1,49 @@
+class ExtractionContext:
+    """
+    Resultado da extração de texto de um PDF, identificado pelo file_hash.
+
+    Criado uma vez por importação e repassado para a identificação da operadora
+    e para o parser, para que pdfplumber/OCR rodem uma única vez por arquivo.
+    """
+    METHOD_TEXT = 'TEXT'
+    METHOD_OCR = 'OCR'
+    METHOD_OCR_REGIONS = 'OCR_ROI'
+    # Camada de texto + OCR só das páginas escaneadas
+    METHOD_HYBRID = 'HYBRID'
+
+    def __init__(self, file_hash=None, carrier=None):
+        self.file_hash = file_hash
+        # Operadora já conhecida antes da extração (metadados/pasta); habilita o OCR por regiões
+        self.carrier = carrier
+        self.text = None
+        self.page_texts = []
+        # Método de cada página de page_texts (TEXT/OCR); no OCR do documento inteiro, de cada ocr_texts
+        self.page_methods = []
+        self.ocr_texts = []
+        self.method = None
+        self.engine_version = None
+        # False quando a extração parou antes da última página (campos já encontrados)
+        self.complete = False
+        # DPI do nível de OCR aceito e tempo gasto no OCR (todas as escalas); None sem OCR
+        self.ocr_dpi = None
+        self.ocr_duration_ms = None
+        # True quando o texto veio do ExtractedTextStore (sem pdfplumber/OCR)
+        self.from_store = False
+        # Backends de texto que já falharam ao abrir o arquivo (ex: no fingerprint da página 1)
+        self.failed_backends = set()
+        # OcrBudget da importação, criado no primeiro OCR
+        self.ocr_budget = None
+        # RuleMatches da última leitura pelas regras (regra vencedora de cada campo)
+        self.rule_matches = None
+
+    @property
+    def is_extracted(self):
+        return self.text is not None
+
+    @property
+    def ocr_timed_out(self):
+        """O OCR estourou o orçamento da fatura (texto parcial)."""
+        return self.ocr_budget is not None and self.ocr_budget.exceeded
+
+    def __repr__(self):
+        return f"<ExtractionContext {self.file_hash} method={self.method} pages={len(self.page_texts)}>"
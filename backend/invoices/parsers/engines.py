@@ -0,0 +1,190 @@
+import os
+import queue
+import shlex
+import threading
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # opcional: precisa da libtesseract para compilar
+    tesserocr = None
+
+
+class OcrEngine:
+    """
+    Motor de OCR usado pelo OcrExecutor. `image` é uma imagem PIL ou o caminho da página
+    rasterizada. `timeout` em segundos (None: sem limite); ao estourar, levanta
+    RuntimeError('Tesseract process timeout'), como o pytesseract.
+    """
+    name = None
+
+    def is_available(self):
+        return True
+
+    def version(self):
+        return self.name
+
+    def image_to_string(self, image, lang, config='', timeout=None):
+        raise NotImplementedError
+
+    def image_to_data(self, image, lang, config='', timeout=None):
+        """Palavras reconhecidas e confianças: {'text': [...], 'conf': [...]} (conf -1 fora de palavras)."""
+        raise NotImplementedError
+
+
+class PytesseractEngine(OcrEngine):
+    """Um processo do tesseract por chamada (recarrega o traineddata a cada página)."""
+    name = 'pytesseract'
+
+    def version(self):
+        try:
+            return f"tesseract {pytesseract.get_tesseract_version()}"
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception:
+            return "tesseract"
+
+    @staticmethod
+    def _kwargs(config, timeout):
+        kwargs = {}
+        if config:
+            kwargs['config'] = config
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        return kwargs
+
+    def image_to_string(self, image, lang, config='', timeout=None):
+        return pytesseract.image_to_string(image, lang=lang, **self._kwargs(config, timeout))
+
+    def image_to_data(self, image, lang, config='', timeout=None):
+        return pytesseract.image_to_data(
+            image, lang=lang, output_type=pytesseract.Output.DICT, **self._kwargs(config, timeout)
+        )
+
+
+class TesserocrEngine(OcrEngine):
+    """
+    Instâncias da API do tesseract (tesserocr) mantidas carregadas e reaproveitadas: o
+    traineddata é lido uma vez por instância, não por página. O pool é por processo (worker
+    do Celery) e por idioma, com até INVOICE_OCR_WORKERS instâncias, uma por thread de OCR.
+    """
+    name = 'tesserocr'
+
+    def __init__(self, size=None):
+        self.size = size
+        self._pools = {}
+        self._created = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        return tesserocr is not None
+
+    def version(self):
+        return f"tesserocr {tesserocr.tesseract_version().splitlines()[0]}"
+
+    def pool_size(self):
+        return self.size or max(1, int(getattr(settings, 'INVOICE_OCR_WORKERS', 2)))
+
+    def _pool(self, lang):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Processo filho (fork do worker): as instâncias do pai não são reaproveitáveis
+                self._pools, self._created, self._pid = {}, {}, os.getpid()
+            if lang not in self._pools:
+                self._pools[lang] = queue.LifoQueue()
+                self._created[lang] = 0
+            return self._pools[lang]
+
+    def _acquire(self, lang):
+        pool = self._pool(lang)
+        try:
+            return pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created[lang] < self.pool_size()
+            if create:
+                self._created[lang] += 1
+        if create:
+            return tesserocr.PyTessBaseAPI(lang=lang)
+        return pool.get()
+
+    def _release(self, lang, api):
+        self._pool(lang).put(api)
+
+    @staticmethod
+    def _configure(api, config):
+        """Aplica '--psm N' e '-c chave=valor' do config no formato do pytesseract. Retorna as variáveis alteradas."""
+        tokens = shlex.split(config or '')
+        changed = []
+        for index, token in enumerate(tokens[:-1]):
+            if token == '--psm':
+                api.SetPageSegMode(int(tokens[index + 1]))
+            elif token == '-c' and '=' in tokens[index + 1]:
+                key, value = tokens[index + 1].split('=', 1)
+                api.SetVariable(key, value)
+                changed.append(key)
+        return changed
+
+    def _recognize(self, lang, image, config, timeout, read):
+        api = self._acquire(lang)
+        changed = []
+        try:
+            changed = self._configure(api, config)
+            # Página rasterizada em disco: a leptonica lê o arquivo, sem passar pelo PIL
+            if isinstance(image, str):
+                api.SetImageFile(image)
+            else:
+                api.SetImage(image)
+            # timeout do Recognize em ms (0: sem limite)
+            if not api.Recognize(int(timeout * 1000) if timeout else 0):
+                raise RuntimeError('Tesseract process timeout' if timeout else 'Tesseract recognition failed')
+            return read(api)
+        finally:
+            for key in changed:
+                api.SetVariable(key, '')
+            api.SetPageSegMode(tesserocr.PSM.AUTO)
+            api.Clear()
+            self._release(lang, api)
+
+    def image_to_string(self, image, lang, config='', timeout=None):
+        return self._recognize(lang, image, config, timeout, lambda api: api.GetUTF8Text())
+
+    def image_to_data(self, image, lang, config='', timeout=None):
+        def read(api):
+            words = api.MapWordConfidences()
+            return {'text': [word for word, _ in words], 'conf': [confidence for _, confidence in words]}
+        return self._recognize(lang, image, config, timeout, read)
+
+
+OCR_ENGINES = {
+    engine.name: engine for engine in (TesserocrEngine, PytesseractEngine)
+}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_ocr_engine(name=None):
+    """
+    Motor de OCR do processo: `name` ou INVOICE_OCR_ENGINE. Sem o tesserocr instalado,
+    cai no pytesseract. Uma instância por motor (o pool de instâncias é compartilhado).
+    """
+    name = name or getattr(settings, 'INVOICE_OCR_ENGINE', None) or PytesseractEngine.name
+    engine_class = OCR_ENGINES.get(name)
+    if engine_class is None:
+        print(f"Aviso: motor de OCR desconhecido: {name}")
+        engine_class = PytesseractEngine
+    with _engines_lock:
+        engine = _engines.get(engine_class.name)
+        if engine is None:
+            engine = engine_class()
+            if not engine.is_available():
+                print(f"Aviso: motor de OCR {engine_class.name} indisponível, usando pytesseract.")
+                engine = _engines.get(PytesseractEngine.name) or PytesseractEngine()
+                _engines[PytesseractEngine.name] = engine
+            _engines[engine_class.name] = engine
+    return engine
@@ -0,0 +1,308 @@
+import os
+import re
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from pdf2image import convert_from_path, pdfinfo_from_path
+from pdf2image.exceptions import PDFPopplerTimeoutError
+from PIL import Image
+from .engines import get_ocr_engine
+
+# Cada página já roda em um processo do tesseract; sem este limite, cada processo
+# abre suas próprias threads OpenMP e as páginas paralelas disputam os mesmos núcleos.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_workers():
+    return max(1, int(getattr(settings, 'INVOICE_OCR_WORKERS', 2)))
+
+
+def get_ocr_pool():
+    """
+    Pool de threads compartilhado pelo processo (worker do Celery). O número de threads
+    é o teto de páginas em OCR simultâneo no worker, mesmo com várias importações em paralelo.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=get_ocr_workers(), thread_name_prefix='invoice-ocr')
+    return _pool
+
+
+def current_rss_mb():
+    """Memória residente atual do processo (MB)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Fora do Linux: pico do processo (ru_maxrss em KB no Linux, bytes no macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if os.uname().sysname == 'Darwin' else peak / 1024
+
+
+class OcrBudget:
+    """
+    Prazo de OCR de uma fatura, compartilhado por todas as etapas (regiões, níveis de DPI,
+    páginas). Cada chamada ao pdftoppm/tesseract recebe só o tempo restante como timeout,
+    e o subprocesso é encerrado ao estourá-lo. Depois do prazo as páginas pendentes ficam
+    vazias (resultado parcial) e `exceeded` fica True.
+
+    `max_rss_mb` é o teto de memória residente do worker durante o OCR: acima dele nenhuma
+    página nova é rasterizada e o OCR termina como no estouro do prazo (`reason` 'memory').
+    """
+    TIME = 'time'
+    MEMORY = 'memory'
+
+    def __init__(self, seconds=None, max_rss_mb=None):
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.max_rss_mb = max_rss_mb
+        self.exceeded = False
+        self.reason = None
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            getattr(settings, 'INVOICE_OCR_BUDGET_SECONDS', 120),
+            max_rss_mb=getattr(settings, 'INVOICE_OCR_MAX_RSS_MB', None),
+        )
+
+    def remaining(self):
+        """Segundos restantes; None sem limite."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        """False (e marca o estouro) quando o prazo acabou ou a memória passou do teto."""
+        if self.exceeded:
+            return False
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.expire(self.TIME)
+        elif self.max_rss_mb and current_rss_mb() > self.max_rss_mb:
+            self.expire(self.MEMORY)
+            print(f"[OCR] Memória do worker acima de {self.max_rss_mb} MB; páginas restantes não serão lidas.")
+        return not self.exceeded
+
+    def expire(self, reason):
+        self.exceeded = True
+        self.reason = reason
+
+    def __repr__(self):
+        return f"<OcrBudget {self.seconds}s remaining={self.remaining()} exceeded={self.reason or False}>"
+
+
+def is_timeout(error):
+    # pytesseract encerra o processo e levanta RuntimeError('Tesseract process timeout')
+    return isinstance(error, PDFPopplerTimeoutError) or (
+        isinstance(error, RuntimeError) and 'timeout' in str(error).lower()
+    )
+
+
+class OcrRegion:
+    """
+    Zona de um campo na página 1, em frações da página: (x0, y0, x1, y1).
+
+    O texto reconhecido na zona é reescrito como "<label> <valor>" quando um único valor
+    casa com `pattern`, de modo que as regras primárias do parser o reconheçam. Com dois ou
+    mais candidatos (ex: data de emissão e vencimento, fragmentos de CNPJ/CEP) a zona é
+    ambígua: nenhuma linha é gerada e a fatura cai no OCR da página inteira. O texto gerado
+    é sintético (ExtractedText com método OCR_ROI) e não é reprocessado pelo reparse.
+    """
+    # Bloco uniforme de texto, apenas dígitos e separadores (valores, datas e números de fatura)
+    NUMERIC_CONFIG = '--psm 6 -c tessedit_char_whitelist=0123456789.,/'
+
+    def __init__(self, field, box, label, pattern, config=NUMERIC_CONFIG):
+        self.field = field
+        self.box = box
+        self.label = label
+        self.regex = re.compile(pattern)
+        self.config = config
+
+    def crop(self, image):
+        width, height = image.size
+        x0, y0, x1, y1 = self.box
+        return image.crop((int(x0 * width), int(y0 * height), int(x1 * width), int(y1 * height)))
+
+    def lines(self, text):
+        values = list(dict.fromkeys(self.regex.findall(text)))
+        if len(values) != 1:
+            return []
+        return [f"{self.label} {values[0]}"]
+
+    def __repr__(self):
+        return f"<OcrRegion {self.field} {self.box}>"
+
+
+class OcrExecutor:
+    """
+    Rasteriza (pdftoppm) e roda o tesseract por página em paralelo. Ambos são subprocessos,
+    então as threads só esperam I/O. O resultado mantém a ordem das páginas.
+    """
+    def __init__(self, lang='por', max_pages=None, pool=None, dpi=None, preprocess=None, budget=None, engine=None):
+        self.lang = lang
+        # OcrEngine (None: INVOICE_OCR_ENGINE)
+        self.engine = engine or get_ocr_engine()
+        # OcrBudget da fatura (None: sem prazo)
+        self.budget = budget
+        # Callable PIL -> PIL aplicado a cada página antes do tesseract (ex: ImagePreprocessor)
+        self.preprocess = preprocess
+        # Rasterização em escala de cinza (tesseract binariza internamente; 1/3 dos bytes do RGB)
+        self.dpi = dpi or 200
+        self.max_pages = max_pages if max_pages is not None else getattr(settings, 'INVOICE_OCR_MAX_PAGES', 2)
+        self.pool = pool
+        # Diretório temporário da chamada em andamento (run/run_pages/run_regions)
+        self.workdir = None
+
+    def run(self, pdf_file):
+        """Retorna o texto OCR de cada página (até max_pages), na ordem do documento."""
+        return self._with_path(pdf_file, self._run_path)
+
+    def run_regions(self, pdf_file, regions):
+        """
+        OCR apenas das zonas da página 1. Retorna [(região, texto, confiança média 0-100)],
+        na ordem das regiões.
+        """
+        return self._with_path(pdf_file, lambda path: self._run_regions_path(path, regions))
+
+    def _with_path(self, pdf_file, run):
+        # Diretório de trabalho da chamada: cada página é rasterizada para um arquivo aqui
+        # e apagada logo após o OCR, em vez de ficar em memória como imagem PIL
+        with tempfile.TemporaryDirectory(prefix='invoice-ocr-') as workdir:
+            self.workdir = workdir
+            try:
+                if isinstance(pdf_file, str):
+                    return run(pdf_file)
+
+                # Upload: copiado em blocos uma vez para o disco, e cada página é rasterizada
+                # direto do arquivo (convert_from_bytes copiaria o PDF a cada chamada)
+                path = os.path.join(workdir, 'source.pdf')
+                if hasattr(pdf_file, 'seek'):
+                    pdf_file.seek(0)
+                with open(path, 'wb') as tmp:
+                    shutil.copyfileobj(pdf_file, tmp)
+                if hasattr(pdf_file, 'seek'):
+                    pdf_file.seek(0)
+                return run(path)
+            finally:
+                self.workdir = None
+
+    def run_pages(self, pdf_file, numbers):
+        """OCR apenas das páginas `numbers` (1-based), na ordem informada."""
+        return self._with_path(pdf_file, lambda path: self._ocr_pages(path, list(numbers)))
+
+    def _run_path(self, path):
+        return self._ocr_pages(path, self.page_numbers(path))
+
+    def _ocr_pages(self, path, pages):
+        if len(pages) <= 1:
+            return [self.ocr_page(path, number) for number in pages]
+        pool = self.pool or get_ocr_pool()
+        # map preserva a ordem de entrada, independente de qual página termina primeiro
+        return list(pool.map(lambda number: self.ocr_page(path, number), pages))
+
+    def _run_regions_path(self, path, regions):
+        images = self._within_budget(lambda: self.rasterize(path, 1), [])
+        if not images:
+            return []
+        try:
+            page = self.load(images[0])
+            pool = self.pool or get_ocr_pool()
+            return list(pool.map(lambda region: (region,) + self.ocr_region(page, region), regions))
+        finally:
+            self.release(images)
+
+    def _timeout(self):
+        """kwargs de timeout para pdf2image/pytesseract com o tempo restante do orçamento."""
+        remaining = self.budget.remaining() if self.budget is not None else None
+        if remaining is None:
+            return {}
+        # 0 desligaria o timeout do pytesseract: o mínimo é 1 ms
+        return {'timeout': max(remaining, 0.001)}
+
+    def _within_budget(self, call, partial):
+        """Executa `call` dentro do orçamento; sem prazo restante ou no timeout, retorna `partial`."""
+        if self.budget is not None and not self.budget.check():
+            return partial
+        try:
+            return call()
+        except Exception as e:
+            if self.budget is None or not is_timeout(e):
+                raise
+            self.budget.expire(OcrBudget.TIME)
+            print(f"[OCR] Orçamento de {self.budget.seconds}s esgotado: {e}")
+            return partial
+
+    def ocr_region(self, page, region):
+        data = self._within_budget(lambda: self.engine.image_to_data(
+            region.crop(page), self.lang, config=region.config, **self._timeout()
+        ), {'text': [], 'conf': []})
+        words = []
+        confidences = []
+        for word, confidence in zip(data['text'], data['conf']):
+            # conf -1 marca blocos/linhas, não palavras
+            if word.strip() and float(confidence) >= 0:
+                words.append(word.strip())
+                confidences.append(float(confidence))
+        confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        return " ".join(words), confidence
+
+    def page_numbers(self, path):
+        page_count = int(pdfinfo_from_path(path).get('Pages', 0))
+        if self.max_pages:
+            page_count = min(page_count, self.max_pages)
+        return list(range(1, page_count + 1))
+
+    def rasterize(self, path, number):
+        """
+        Rasteriza só a página `number` para um arquivo no diretório de trabalho e retorna
+        [caminho]. O pdftoppm grava direto em disco (PGM, sem compressão: rápido de gravar
+        e de ler), então a página não passa pela memória do worker como imagem PIL.
+        """
+        if self.workdir is None:
+            return convert_from_path(
+                path, dpi=self.dpi, grayscale=True, first_page=number, last_page=number, **self._timeout()
+            )
+        return convert_from_path(
+            path, dpi=self.dpi, grayscale=True, first_page=number, last_page=number,
+            output_folder=self.workdir, paths_only=True, **self._timeout()
+        )
+
+    @staticmethod
+    def load(image):
+        """Imagem PIL da página rasterizada (caminho no disco ou imagem já em memória)."""
+        if isinstance(image, str):
+            image = Image.open(image)
+            # load() lê os pixels e fecha o arquivo, que pode ser apagado em seguida
+            image.load()
+        return image
+
+    def release(self, images):
+        """Apaga as páginas rasterizadas no diretório de trabalho."""
+        for image in images:
+            if self.workdir and isinstance(image, str) and image.startswith(self.workdir):
+                try:
+                    os.remove(image)
+                except OSError:
+                    pass
+
+    def ocr_page(self, path, number):
+        images = self._within_budget(lambda: self.rasterize(path, number), [])
+        if not images:
+            return ""
+        try:
+            # Sem pré-processamento o tesseract lê a página direto do arquivo
+            image = images[0]
+            if self.preprocess is not None:
+                image = self.preprocess(image)
+            return self._within_budget(lambda: self.engine.image_to_string(image, self.lang, **self._timeout()), "")
+        finally:
+            self.release(images)
@@ -0,0 +1,447 @@
+import re
+import time
+from collections import Counter
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+
+# Fragmentos de captura compartilhados pelas regras das operadoras
+CURRENCY = r'(\d{1,3}(?:\.\d{3})*,\d{2})'
+DATE = r'(\d{2}/\d{2}/\d{4})'
+
+# Linha do detalhamento: acesso (DDD + número), descrição opcional, duração opcional e valor.
+# Ex: "11 99999-0000  Ligação local  00:01:23  R$ 0,10"
+LINE_ITEM = (
+    r'^[ \t]*(?P<access>\(?\d{2}\)?[ \t]?9?\d{4}-?\d{4})'
+    r'(?:[ \t]+(?P<description>[^\n]*?))??'
+    r'(?:[ \t]+(?P<duration>\d{1,2}:\d{2}:\d{2}))?'
+    r'[ \t]+R\$[ \t]*(?P<amount>\d{1,3}(?:\.\d{3})*,\d{2})[ \t]*$'
+)
+
+PRIMARY = 'primary'
+FALLBACK = 'fallback'
+
+# Agregação das capturas de um campo: primeira regra (em ordem de prioridade) que casa,
+# ou todas as ocorrências de todas as regras (o parser escolhe o maior valor)
+FIRST = 'first'
+ALL = 'all'
+
+# Maior trecho (em caracteres, a partir da âncora) que uma ocorrência de regra pode cobrir
+DEFAULT_WINDOW = 256
+
+# Motivo de interrupção de uma regra pelo orçamento (RuleMatches.exhausted)
+BUDGET_ATTEMPTS = 'attempts'
+
+
+def decode_date(value):
+    """
+    Decodifica 'dd/mm/aaaa' por fatiamento fixo.
+    Equivale a datetime.strptime(value, '%d/%m/%Y').date() para strings capturadas por DATE.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return date(int(value[6:10]), int(value[3:5]), int(value[0:2]))
+    except ValueError:
+        return None
+
+
+def decode_currency(value):
+    """'1.234,56' -> Decimal('1234.56'). Mesmo resultado de BaseInvoiceParser.clean_currency para capturas numéricas."""
+    if not value:
+        return None
+    try:
+        return Decimal(value.replace('.', '').replace(',', '.'))
+    except InvalidOperation:
+        return None
+
+
+class Rule:
+    """
+    Uma regex de extração (IGNORECASE). O primeiro grupo é o valor capturado.
+
+    `anchors` são os literais (comparados em minúsculas) com que toda ocorrência da regra começa;
+    a regra só é avaliada onde algum deles aparece, e só sobre os `window` caracteres seguintes
+    (padrões como `valor.*?` não percorrem uma linha de lixo de OCR inteira a cada âncora).
+    Sem âncoras, a regra é executada sozinha sobre o texto (ex: "qualquer data").
+    """
+    def __init__(self, name, field, stage, pattern, anchors=None, aggregate=FIRST, window=DEFAULT_WINDOW):
+        self.name = name
+        self.field = field
+        self.stage = stage
+        self.pattern = pattern
+        self.regex = re.compile(pattern, re.IGNORECASE)
+        self.anchors = tuple(anchor.lower() for anchor in anchors or ())
+        self.aggregate = aggregate
+        self.window = window
+
+    def __repr__(self):
+        return f"<Rule {self.name} ({self.field}/{self.stage})>"
+
+
+class RuleBudget:
+    """
+    Limites da avaliação das regras sobre um texto: tamanho máximo do texto varrido e, por
+    regra, tentativas de match. Uma regra que estoura o orçamento deixa de ser avaliada no
+    restante do texto (mantém as capturas já feitas). Como cada match anchorado cobre no
+    máximo `Rule.window` caracteres, nenhuma chamada isolada ao `re` fica presa em um texto
+    patológico. Só limites determinísticos: o mesmo texto dá sempre o mesmo resultado,
+    qualquer que seja a carga do worker.
+    """
+    def __init__(self, max_text=1_000_000, max_attempts=10_000):
+        self.max_text = max_text
+        self.max_attempts = max_attempts
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            max_text=getattr(settings, 'INVOICE_RULES_MAX_TEXT', 1_000_000),
+            max_attempts=getattr(settings, 'INVOICE_RULE_MAX_ATTEMPTS', 10_000),
+        )
+
+# Limites (ms) dos intervalos do histograma de tempo por regra; o último intervalo é > 50 ms
+RULE_TIME_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50)
+
+
+def time_bucket(seconds):
+    """Índice do intervalo de RULE_TIME_BUCKETS_MS (ou o último, acima de todos)."""
+    milliseconds = seconds * 1000
+    for index, limit in enumerate(RULE_TIME_BUCKETS_MS):
+        if milliseconds <= limit:
+            return index
+    return len(RULE_TIME_BUCKETS_MS)
+
+
+class RuleMetrics:
+    """
+    Acumulador (por processo) do uso das regras em parse(): por operadora/regra, quantas vezes
+    a etapa da regra foi avaliada, casou, venceu (forneceu o valor do campo), foi interrompida
+    pelo orçamento, e o histograma do tempo gasto por avaliação. Esvaziado periodicamente
+    para o banco (ParserRuleStat), onde os contadores de todos os workers são somados.
+    """
+    def __init__(self):
+        self.pending = {}
+
+    def record(self, carrier, matches):
+        for stat in matches.stats():
+            key = (carrier, stat['rule'])
+            entry = self.pending.get(key)
+            if entry is None:
+                entry = self.pending[key] = {
+                    'field': stat['field'], 'stage': stat['stage'],
+                    'evaluations': 0, 'matched': 0, 'won': 0, 'exhausted': 0, 'seconds': 0.0,
+                    'histogram': [0] * (len(RULE_TIME_BUCKETS_MS) + 1),
+                }
+            entry['evaluations'] += 1
+            entry['matched'] += stat['matched']
+            entry['won'] += stat['won']
+            entry['exhausted'] += stat['exhausted']
+            entry['seconds'] += stat['seconds']
+            entry['histogram'][time_bucket(stat['seconds'])] += 1
+
+    def drain(self):
+        """Retorna e zera os contadores acumulados: {(operadora, regra): contadores}."""
+        pending, self.pending = self.pending, {}
+        return pending
+
+
+rule_metrics = RuleMetrics()
+
+
+class _StagePlan:
+    """Varredura compilada das âncoras de uma etapa (primária ou fallback)."""
+    def __init__(self, rules):
+        self.rules = rules
+        self.standalone = [rule for rule in rules if not rule.anchors]
+
+        self.anchor_rules = {}
+        for rule in rules:
+            for anchor in rule.anchors:
+                self.anchor_rules.setdefault(anchor, []).append(rule)
+
+        anchors = sorted(self.anchor_rules, key=len, reverse=True)
+        self.max_anchor_length = len(anchors[0]) if anchors else 0
+        alternation = '|'.join(re.escape(anchor) for anchor in anchors)
+        self.scanner = re.compile(alternation) if anchors else None
+
+        # Âncoras que podem começar dentro de outra, ou no mesmo ponto sendo prefixo dela
+        # (a alternação escolhe a mais longa). A varredura consome o token encontrado,
+        # então essas posições são conferidas explicitamente.
+        self.shadowed = {}
+        for anchor in anchors:
+            self.shadowed[anchor] = [
+                (offset, other)
+                for offset in range(len(anchor))
+                for other in anchors
+                if (offset == 0 and other != anchor and anchor.startswith(other))
+                or (offset > 0 and (other.startswith(anchor[offset:]) or anchor[offset:].startswith(other)))
+            ]
+
+        # Campos que só precisam da primeira regra que casa permitem encerrar a varredura cedo
+        fields = {}
+        for rule in rules:
+            fields.setdefault(rule.field, []).append(rule)
+        self.first_fields = [field_rules for field_rules in fields.values() if field_rules[0].aggregate == FIRST]
+        self.can_stop_early = not self.standalone and len(self.first_fields) == len(fields)
+        # Uma única regra FIRST por campo: a primeira captura de cada uma é a de `re.search`,
+        # e uma busca direta por regra sai mais barata que a varredura das âncoras
+        self.direct = self.can_stop_early and all(len(field_rules) == 1 for field_rules in fields.values())
+
+
+class RuleMatches:
+    """
+    Capturas por regra, em ordem de posição no texto. Cada etapa é varrida uma única vez,
+    na primeira consulta a uma de suas regras (o fallback só roda se for consultado).
+    """
+    BLOCK_SIZE = 4096
+
+    def __init__(self, ruleset, text, budget=None):
+        self.ruleset = ruleset
+        self.budget = budget or RuleBudget.from_settings()
+        # Regras interrompidas pelo orçamento nesta varredura: nome -> motivo
+        self.exhausted = {}
+        self._attempts = Counter()
+        self._seconds = Counter()
+        # Texto cortado em max_text: todas as regras avaliam só o começo
+        self.truncated = False
+        if self.budget.max_text and len(text) > self.budget.max_text:
+            print(f"Aviso: texto com {len(text)} caracteres; regras {ruleset.carrier} avaliam só os primeiros {self.budget.max_text}.")
+            self.truncated = True
+            text = text[:self.budget.max_text]
+        self.text = text
+        self.by_rule = {}
+        # Regra que forneceu o valor de cada campo (registrada por pick)
+        self.winners = {}
+        self._scanned = set()
+        self._lowered = None
+
+    @property
+    def lowered(self):
+        if self._lowered is None:
+            lowered = self.text.lower()
+            if len(lowered) != len(self.text):
+                # Alguns caracteres mudam de tamanho em lower(); mantém o alinhamento de posições
+                lowered = ''.join(ch if len(ch.lower()) != 1 else ch.lower() for ch in self.text)
+            self._lowered = lowered
+        return self._lowered
+
+    def first(self, rule):
+        self._ensure(rule.stage)
+        values = self.by_rule.get(rule.name)
+        return values[0] if values else None
+
+    def all(self, rules):
+        values = []
+        for rule in rules:
+            self._ensure(rule.stage)
+            values.extend(self.by_rule.get(rule.name, ()))
+        return values
+
+    def pick(self, rules, decoder=None, choose=None):
+        """
+        Valor de um campo pelas `rules` (em ordem de prioridade), registrando a regra vencedora.
+        Sem `choose`: a primeira regra cuja primeira captura é válida (decoder não retorna None).
+        Com `choose` (ex: max): o escolhido entre todas as capturas válidas de todas as regras.
+        """
+        if not rules:
+            return None
+        decode = decoder or (lambda value: value)
+        field = rules[0].field
+        if choose is None:
+            for rule in rules:
+                value = decode(self.first(rule))
+                if value is not None:
+                    self.winners[field] = rule.name
+                    return value
+            return None
+
+        candidates = []
+        for rule in rules:
+            self._ensure(rule.stage)
+            candidates.extend((value, rule) for value in map(decode, self.by_rule.get(rule.name, ())) if value)
+        if not candidates:
+            return None
+        chosen = choose(value for value, _ in candidates)
+        self.winners[field] = next(rule.name for value, rule in candidates if value == chosen)
+        return chosen
+
+    @property
+    def budget_hit(self):
+        """Alguma regra (ou o texto) foi cortada pelo orçamento: o resultado pode estar incompleto."""
+        return self.truncated or bool(self.exhausted)
+
+    def stats(self):
+        """
+        Uso de cada regra das etapas varridas: casou, venceu, tempo gasto e interrupção pelo
+        orçamento (tentativas esgotadas ou texto cortado).
+        """
+        return [
+            {
+                'rule': rule.name,
+                'field': rule.field,
+                'stage': rule.stage,
+                'matched': bool(self.by_rule.get(rule.name)),
+                'won': self.winners.get(rule.field) == rule.name,
+                'seconds': self._seconds[rule.name],
+                'exhausted': self.truncated or rule.name in self.exhausted,
+            }
+            for rule in self.ruleset.rules if rule.stage in self._scanned
+        ]
+
+    def _ensure(self, stage):
+        if stage not in self._scanned:
+            self._scanned.add(stage)
+            self._scan(self.ruleset.plan(stage))
+
+    def _scan(self, plan):
+        text = self.text
+        by_rule = self.by_rule
+
+        if plan.direct:
+            # Sem janela: a busca parte da âncora como a varredura, mas não é cortada em `window`
+            for rule in plan.rules:
+                started = time.perf_counter()
+                found = rule.regex.search(text)
+                self._charge(rule, time.perf_counter() - started)
+                by_rule[rule.name] = [found.group(1)] if found else []
+            return
+
+        for rule in plan.standalone:
+            values = by_rule[rule.name] = []
+            started = time.perf_counter()
+            for found in rule.regex.finditer(text):
+                values.append(found.group(1) if rule.regex.groups else found.group())
+                now = time.perf_counter()
+                if not self._charge(rule, now - started):
+                    break
+                started = now
+
+        if plan.scanner is None:
+            return
+
+        if not plan.can_stop_early:
+            self._scan_segment(plan, self.lowered, 0, len(text))
+            return
+
+        # Etapas que podem parar cedo são varridas em blocos, para não converter
+        # o documento inteiro para minúsculas quando o cabeçalho já resolve tudo
+        pad = 2 * plan.max_anchor_length
+        start = 0
+        while start < len(text):
+            end = start + self.BLOCK_SIZE
+            segment = text[start:end + pad].lower()
+            if len(segment) != len(text[start:end + pad]):
+                self._scan_segment(plan, self.lowered, start, len(text))
+                return
+            resume, resolved = self._scan_segment(plan, segment, 0, end - start, offset=start)
+            if resolved:
+                return
+            start = max(end, resume)
+
+    def _scan_segment(self, plan, lowered, start, end, offset=0):
+        """
+        Varre tokens que começam em [start, end) de `lowered` (posição `offset` do texto original).
+        Retorna (fim do último token, etapa resolvida).
+        """
+        text = self.text
+        by_rule = self.by_rule
+        anchor_rules = plan.anchor_rules
+        resume = start
+        for token in plan.scanner.finditer(lowered, start):
+            token_start = token.start()
+            if token_start >= end:
+                break
+            resume = token.end()
+            anchor = token.group()
+            hits = [(token_start, anchor)]
+            for shift, other in plan.shadowed[anchor]:
+                if lowered.startswith(other, token_start + shift):
+                    hits.append((token_start + shift, other))
+
+            captured = False
+            for pos, hit_anchor in hits:
+                for rule in anchor_rules[hit_anchor]:
+                    if rule.name in self.exhausted:
+                        continue
+                    started = time.perf_counter()
+                    found = rule.regex.match(text, offset + pos, offset + pos + rule.window)
+                    self._charge(rule, time.perf_counter() - started)
+                    if found:
+                        by_rule.setdefault(rule.name, []).append(found.group(1))
+                        captured = True
+
+            if captured and plan.can_stop_early and self._resolved(plan):
+                return offset + resume, True
+        return offset + resume, False
+
+    def _charge(self, rule, seconds):
+        """
+        Contabiliza uma tentativa da regra. Retorna False se ela acabou de estourar o orçamento.
+        O tempo só alimenta as métricas: o orçamento é por tentativas, não por relógio.
+        """
+        self._attempts[rule.name] += 1
+        self._seconds[rule.name] += seconds
+        if not self.budget.max_attempts or self._attempts[rule.name] < self.budget.max_attempts:
+            return True
+
+        self.exhausted[rule.name] = BUDGET_ATTEMPTS
+        print(f"Aviso: regra {self.ruleset.carrier}/{rule.name} interrompida ({BUDGET_ATTEMPTS}) após {self._attempts[rule.name]} tentativas.")
+        return False
+
+    def _resolved(self, plan):
+        """Todos os campos FIRST da etapa já têm a regra vencedora definida (nenhuma de maior prioridade pendente)."""
+        decoders = self.ruleset.decoders
+        for field_rules in plan.first_fields:
+            decoder = decoders.get(field_rules[0].field)
+            for rule in field_rules:
+                values = self.by_rule.get(rule.name)
+                if not values:
+                    return False
+                if decoder is None or decoder(values[0]) is not None:
+                    break
+        return True
+
+
+class RuleSet:
+    """
+    Tabela de regras de uma operadora, compilada uma vez.
+
+    Em vez de um findall/search por padrão, cada etapa faz uma única varredura sobre
+    text.lower() com a alternação das âncoras literais das regras, e só nas posições
+    encontradas as regras correspondentes são testadas com `regex.match`. Como toda
+    ocorrência de uma regra começa em uma de suas âncoras, a primeira captura de cada
+    regra é a mesma de `re.search` e o conjunto de capturas cobre o de `re.findall`
+    (ocorrências sobrepostas repetem o mesmo valor), preservando a prioridade entre
+    regras e o critério de maior valor. Etapas com uma única regra FIRST por campo (ex: a
+    Claro) dispensam a varredura: cada regra é um `re.search` direto.
+
+    `decoders` (campo -> função) define quando a primeira captura de uma regra é válida,
+    para que etapas só com campos FIRST encerrem a varredura assim que o vencedor é conhecido.
+    """
+    def __init__(self, carrier, rules, decoders=None):
+        self.carrier = carrier
+        self.rules = list(rules)
+        self.decoders = decoders or {}
+        self._plans = {}
+        self._selected = {}
+
+        stages = []
+        for rule in self.rules:
+            if rule.stage not in stages:
+                stages.append(rule.stage)
+        for stage in stages:
+            self._plans[stage] = _StagePlan([rule for rule in self.rules if rule.stage == stage])
+
+    def plan(self, stage):
+        return self._plans[stage]
+
+    def select(self, field, stage):
+        """Regras de um campo/etapa na ordem de prioridade declarada."""
+        key = (field, stage)
+        if key not in self._selected:
+            self._selected[key] = [rule for rule in self.rules if rule.field == field and rule.stage == stage]
+        return self._selected[key]
+
+    def scan(self, text, budget=None):
+        return RuleMatches(self, text, budget)
@@ -1,11 +1,71 @@
-from .base import BaseInvoiceParser
 import re
-from decimal import Decimal
+from .base import BaseInvoiceParser
+from .ocr import OcrRegion
+from .rules import (
+    Rule, RuleSet, CURRENCY, DATE, LINE_ITEM, PRIMARY, FALLBACK, ALL,
+    decode_currency, decode_date,
+)
+
+# A ordem das regras de cada campo é a ordem de prioridade.
+VIVO_RULES = RuleSet('VIVO', [
+    # --- PRIMARY PARSING (DO NOT ALTER) ---
+    # 1. Extração do Valor Total (maior valor encontrado)
+    Rule('total_a_pagar', 'total_value', PRIMARY, r'Total a pagar\s*(?:R\$)?\s*' + CURRENCY, ['Total a pagar'], ALL),
+    Rule('valor_total', 'total_value', PRIMARY, r'VALOR TOTAL\s*(?:R\$)?\s*' + CURRENCY, ['VALOR TOTAL'], ALL),
+    Rule('total_desta_fatura', 'total_value', PRIMARY, r'Total desta fatura\s*(?:R\$)?\s*' + CURRENCY, ['Total desta fatura'], ALL),
+    Rule('valor_a_pagar', 'total_value', PRIMARY, r'Valor a pagar\s*(?:R\$)?\s*' + CURRENCY, ['Valor a pagar'], ALL),
+
+    # 2. Extração da Data de Vencimento (primeira regra que casa)
+    Rule('vencimento', 'due_date', PRIMARY, r'Vencimento\s*' + DATE, ['Vencimento']),
+    Rule('data_de_vencimento', 'due_date', PRIMARY, r'Data de vencimento\s*' + DATE, ['Data de vencimento']),
+    Rule('vence_em', 'due_date', PRIMARY, r'Vence em\s*' + DATE, ['Vence em']),
+    Rule('pague_ate', 'due_date', PRIMARY, r'Pague até\s*' + DATE, ['Pague até']),
+
+    # 3. Número da Fatura
+    Rule('numero_fatura', 'invoice_number', PRIMARY, r'(?:Fatura número|Nº da fatura|Conta No\.)\s*(\d+)',
+         ['Fatura número', 'Nº da fatura', 'Conta No.']),
+
+    # --- FALLBACK PARSING: layouts de cards, resumo lateral, fatura fixa... ---
+    Rule('fb_total_geral_a_pagar', 'total_value', FALLBACK, r'TOTAL GERAL A PAGAR[\s\S]{0,50}?' + CURRENCY, ['TOTAL GERAL A PAGAR'], ALL),
+    Rule('fb_total_a_pagar', 'total_value', FALLBACK, r'TOTAL A PAGAR[\s\S]{0,50}?' + CURRENCY, ['TOTAL A PAGAR'], ALL),
+    Rule('fb_total_geral', 'total_value', FALLBACK, r'Total Geral[\s\S]{0,50}?' + CURRENCY, ['Total Geral'], ALL),
+    Rule('fb_resumo', 'total_value', FALLBACK, r'(?:Resumo|VALOR \(R\$\))[\s\S]{0,50}?' + CURRENCY, ['Resumo', 'VALOR (R$)'], ALL),
+    Rule('fb_valor', 'total_value', FALLBACK, r'valor.*?' + CURRENCY, ['valor'], ALL),
+
+    Rule('fb_vencimento', 'due_date', FALLBACK, r'VENCIMENTO[\s\S]{0,50}?' + DATE, ['VENCIMENTO'], ALL),
+    Rule('fb_venc', 'due_date', FALLBACK, r'Venc\.[\s\S]{0,50}?' + DATE, ['Venc.'], ALL),
+    Rule('fb_pagamento_ate', 'due_date', FALLBACK, r'(?:Pagamento até|Data limite|Pague até)[\s\S]{0,50}?' + DATE,
+         ['Pagamento até', 'Data limite', 'Pague até'], ALL),
+    Rule('fb_qualquer_data', 'due_date', FALLBACK, DATE, aggregate=ALL), # any date (sem âncora: findall)
+
+    Rule('fb_numero_fatura', 'invoice_number', FALLBACK, r'Fatura\D*(\d{7,15})', ['Fatura']),
+], decoders={'due_date': decode_date, 'total_value': decode_currency})
+
+
+# Zonas da página 1 da fatura VIVO (frações da página: x0, y0, x1, y1).
+# O quadro de resumo (total/vencimento) fica no topo à direita; o número da fatura no cabeçalho.
+VIVO_OCR_REGIONS = (
+    OcrRegion('total_value', (0.50, 0.05, 1.00, 0.35), 'Total a pagar R$', CURRENCY),
+    OcrRegion('due_date', (0.50, 0.05, 1.00, 0.35), 'Vencimento', DATE),
+    OcrRegion('invoice_number', (0.00, 0.00, 1.00, 0.20), 'Fatura número', r'\b(\d{6,15})\b'),
+)
+
+
+# Linhas do detalhamento (acesso, descrição, duração, valor), uma por linha do texto
+VIVO_LINE_ITEMS = re.compile(LINE_ITEM, re.MULTILINE)
+
 
 class VivoParser(BaseInvoiceParser):
-    def parse(self, pdf_file):
-        text = self.extract_text(pdf_file)
-        
+    rules = VIVO_RULES
+    ocr_regions = VIVO_OCR_REGIONS
+    # Incrementar ao alterar VIVO_RULES ou parse()
+    rules_version = 1
+    line_item_pattern = VIVO_LINE_ITEMS
+
+    def parse(self, pdf_file, text=None, context=None):
+        if text is None:
+            text = self.extract_text(pdf_file, context=context)
+
         data = {
             'invoice_number': None,
             'due_date': None,
@@ -18,107 +78,46 @@ class VivoParser(BaseInvoiceParser):
             data['confidence'] = 0
             return data
 
-        # --- PRIMARY PARSING (DO NOT ALTER) ---
-        # 1. Extração do Valor Total
-        total_patterns = [
-            r'Total a pagar\s*(?:R\$)?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',
-            r'VALOR TOTAL\s*(?:R\$)?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',
-            r'Total desta fatura\s*(?:R\$)?\s*(\d{1,3}(?:\.\d{3})*,\d{2})',
-            r'Valor a pagar\s*(?:R\$)?\s*(\d{1,3}(?:\.\d{3})*,\d{2})'
-        ]
-        
-        found_values = []
-        for pattern in total_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
-            for m in matches:
-                val = self.clean_currency(m)
-                if val:
-                    found_values.append(val)
-        
-        if found_values:
-            data['total_value'] = max(found_values)
-        
-        # 2. Extração da Data de Vencimento
-        date_patterns = [
-            r'Vencimento\s*(\d{2}/\d{2}/\d{4})',
-            r'Data de vencimento\s*(\d{2}/\d{2}/\d{4})',
-            r'Vence em\s*(\d{2}/\d{2}/\d{4})',
-            r'Pague até\s*(\d{2}/\d{2}/\d{4})'
-        ]
-        
-        for pattern in date_patterns:
-            date_match = re.search(pattern, text, re.IGNORECASE)
-            if date_match:
-                data['due_date'] = self.parse_date(date_match.group(1))
-                if data['due_date']:
-                    break
-            
-        # 3. Número da Fatura
-        inv_match = re.search(r'(?:Fatura número|Nº da fatura|Conta No\.)\s*(\d+)', text, re.IGNORECASE)
-        if inv_match:
-            data['invoice_number'] = inv_match.group(1)
+        # Uma varredura por etapa; a do fallback só acontece se ele for necessário
+        matches = self.rules.scan(text)
+        if context is not None:
+            context.rule_matches = matches
+
+        # --- PRIMARY PARSING ---
+        # Total: maior valor entre todas as regras; vencimento e número: primeira regra que casa
+        data['total_value'] = matches.pick(self.rules.select('total_value', PRIMARY), decode_currency, max)
+        data['due_date'] = matches.pick(self.rules.select('due_date', PRIMARY), decode_date)
+        data['invoice_number'] = matches.pick(self.rules.select('invoice_number', PRIMARY))
 
         # --- FALLBACK PARSING (TRIGGERED ONLY IF DATA IS MISSING OR LAYOUT DETECTED) ---
         if not data['total_value'] or not data['due_date'] or not data['invoice_number']:
             # Downgrade confidence because primary method failed
             data['confidence'] = 80 # Validated heurística fallback
-            self._parse_fallback(text, data)
-            
+            self._parse_fallback(text, data, matches)
+
             # If still missing info after fallback, downgrade further
             if not data['total_value'] or not data['due_date']:
                 data['confidence'] = 50 # Partial extraction
-                
+
         return data
 
-    def _parse_fallback(self, text, data):
+    def _parse_fallback(self, text, data, matches=None):
         """
         Fallback logic for specific problematic layouts (cards, summary sidebars, fatura fixa, etc.)
         Activated if primary parsing fails.
         """
         print(f"[VivoParser] Fallback específico para fatura fixa ativado. Texto detectado: {text[:50]}...")
 
-        # Fallback Total Value Patterns
-        fallback_total_patterns = [
-            r'TOTAL GERAL A PAGAR[\s\S]{0,50}?(\d{1,3}(?:\.\d{3})*,\d{2})',
-            r'TOTAL A PAGAR[\s\S]{0,50}?(\d{1,3}(?:\.\d{3})*,\d{2})',
-            r'Total Geral[\s\S]{0,50}?(\d{1,3}(?:\.\d{3})*,\d{2})',
-            r'(?:Resumo|VALOR \(R\$\))[\s\S]{0,50}?(\d{1,3}(?:\.\d{3})*,\d{2})',
-            r'valor.*?(\d{1,3}(?:\.\d{3})*,\d{2})',
-        ]
+        if matches is None:
+            matches = self.rules.scan(text)
 
         if not data['total_value']:
-            f_found_values = []
-            for pattern in fallback_total_patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                for m in matches:
-                    val = self.clean_currency(m)
-                    if val:
-                        f_found_values.append(val)
-            if f_found_values:
-                data['total_value'] = max(f_found_values)
-
-        # Fallback Date Patterns
-        fallback_date_patterns = [
-            r'VENCIMENTO[\s\S]{0,50}?(\d{2}/\d{2}/\d{4})',
-            r'Venc\.[\s\S]{0,50}?(\d{2}/\d{2}/\d{4})',
-            r'(?:Pagamento até|Data limite|Pague até)[\s\S]{0,50}?(\d{2}/\d{2}/\d{4})',
-            r'(\d{2}/\d{2}/\d{4})', # any date
-        ]
+            data['total_value'] = matches.pick(self.rules.select('total_value', FALLBACK), decode_currency, max)
 
         if not data['due_date']:
-            f_found_dates = []
-            for pattern in fallback_date_patterns:
-                matches = re.findall(pattern, text, re.IGNORECASE)
-                for m in matches:
-                    parsed_date = self.parse_date(m)
-                    if parsed_date:
-                        f_found_dates.append(parsed_date)
-            if f_found_dates:
-                # O vencimento costuma ser a data solitária ou a última do header
-                data['due_date'] = max(f_found_dates)
-        
+            # O vencimento costuma ser a data solitária ou a última do header
+            data['due_date'] = matches.pick(self.rules.select('due_date', FALLBACK), decode_date, max)
+
         # Fallback Invoice Number
         if not data['invoice_number']:
-            inv_match = re.search(r'Fatura\D*(\d{7,15})', text, re.IGNORECASE)
-            if inv_match:
-                data['invoice_number'] = inv_match.group(1)
+            data['invoice_number'] = matches.pick(self.rules.select('invoice_number', FALLBACK))
@@ -0,0 +1,160 @@
+import re
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.core.cache import cache
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+from ..parsers.backends import get_text_backends
+from ..parsers.context import ExtractionContext
+
+# Marcas de cada operadora (metadados, texto da página 1 e bytes do arquivo)
+CARRIER_SIGNATURES = {
+    'VIVO': (r'VIVO', r'TELEF[OÔ]NICA'),
+    'CLARO': (r'CLARO', r'EMBRATEL'),
+}
+METADATA_FIELDS = ('Producer', 'Creator', 'Title', 'Author', 'Subject')
+
+
+def _compile(signatures, flags=0, encode=False):
+    pattern = '|'.join(rf'\b(?:{signature})\b' for signature in signatures)
+    return re.compile(pattern.encode('latin-1') if encode else pattern, flags)
+
+
+TEXT_PATTERNS = {carrier: _compile(signatures, re.IGNORECASE) for carrier, signatures in CARRIER_SIGNATURES.items()}
+BYTE_PATTERNS = {
+    carrier: _compile([signature.replace('[OÔ]', '[O\xd4]') for signature in signatures], re.IGNORECASE, encode=True)
+    for carrier, signatures in CARRIER_SIGNATURES.items()
+}
+
+
+class CarrierFingerprinter:
+    """
+    Identifica a operadora antes da extração completa/OCR, do mais barato ao mais caro:
+    metadados do PDF + assinaturas nos bytes iniciais do arquivo, depois só o texto da
+    página 1. Resultado em cache por file_hash; None quando ambíguo (o importador cai
+    na busca no texto extraído, ImportManager.identify_carrier). Ambíguo com falha de um
+    backend de texto não vai para o cache.
+    """
+    HEAD_BYTES = 256 * 1024
+    CACHE_PREFIX = 'invoice-carrier'
+
+    def identify(self, file_source, file_hash=None, context=None):
+        cache_key = f"{self.CACHE_PREFIX}:{file_hash}" if file_hash else None
+        if cache_key:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached or None
+
+        if context is None:
+            context = ExtractionContext(file_hash)
+        failed_backends = set(context.failed_backends)
+        carrier = self._unique(self.from_metadata(file_source) | self.from_bytes(file_source))
+        if carrier is None:
+            carrier = self._unique(self.from_first_page(file_source, context))
+
+        # Ambíguo também vai para o cache ('') para não repetir a inspeção, exceto se um backend
+        # de texto falhou agora (falha transitória não pode fixar o arquivo na detecção lenta)
+        if cache_key and (carrier or context.failed_backends <= failed_backends):
+            self._cache_set(cache_key, carrier or '')
+        return carrier
+
+    @staticmethod
+    def _unique(carriers):
+        return next(iter(carriers)) if len(carriers) == 1 else None
+
+    @staticmethod
+    def match(text, patterns):
+        return {carrier for carrier, pattern in patterns.items() if pattern.search(text)}
+
+    def from_metadata(self, file_source):
+        try:
+            with self._open(file_source) as fp:
+                document = PDFDocument(PDFParser(fp))
+                values = []
+                for info in document.info:
+                    for field in METADATA_FIELDS:
+                        value = resolve1(info.get(field))
+                        if isinstance(value, bytes):
+                            value = value.decode('utf-16' if value[:2] in (b'\xfe\xff', b'\xff\xfe') else 'latin-1', errors='ignore')
+                        if value:
+                            values.append(str(value))
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception:
+            return set()
+        return self.match(" ".join(values), TEXT_PATTERNS)
+
+    def from_bytes(self, file_source):
+        """Assinaturas nos bytes iniciais (XMP, nomes de fontes/imagens, streams não comprimidos)."""
+        try:
+            with self._open(file_source) as fp:
+                head = fp.read(self.HEAD_BYTES)
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception:
+            return set()
+        return self.match(head, BYTE_PATTERNS)
+
+    def from_first_page(self, file_source, context=None):
+        """Texto só da página 1. Com `context` (ExtractionContext), a página lida é reaproveitada na extração."""
+        for backend in get_text_backends():
+            pages = backend.iter_pages(file_source)
+            try:
+                first_page = next(pages, "")
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception:
+                # A extração não tenta de novo um backend que não abre o arquivo
+                if context is not None:
+                    context.failed_backends.add(backend.name)
+                continue
+            finally:
+                pages.close()
+            if first_page.strip():
+                if context is not None and not context.page_texts:
+                    context.page_texts = [first_page]
+                    context.method = context.METHOD_TEXT
+                return self.match(first_page, TEXT_PATTERNS)
+        return set()
+
+    @staticmethod
+    def _open(file_source):
+        if isinstance(file_source, str):
+            return open(file_source, 'rb')
+        return _Rewound(file_source)
+
+    @staticmethod
+    def _cache_get(key):
+        try:
+            return cache.get(key)
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: cache indisponível: {e}")
+            return None
+
+    @staticmethod
+    def _cache_set(key, value):
+        try:
+            cache.set(key, value, getattr(settings, 'INVOICE_FINGERPRINT_CACHE_TIMEOUT', None))
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: cache indisponível: {e}")
+
+
+class _Rewound:
+    """Usa um arquivo já aberto (upload) a partir do início e o devolve rebobinado."""
+    def __init__(self, fp):
+        self.fp = fp
+
+    def __enter__(self):
+        if hasattr(self.fp, 'seek'):
+            self.fp.seek(0)
+        return self.fp
+
+    def __exit__(self, *exc):
+        if hasattr(self.fp, 'seek'):
+            self.fp.seek(0)
+        return False
@@ -1,10 +1,18 @@
 import hashlib
 import traceback
 from decimal import Decimal
+from celery.exceptions import SoftTimeLimitExceeded
 from django.db import transaction
 from ..models import InvoiceImport
 from ..parsers.vivo import VivoParser
 from ..parsers.claro import ClaroParser
+from ..parsers.context import ExtractionContext
+from ..parsers.ocr import OcrBudget
+from ..parsers.rules import rule_metrics
+from .fingerprint import CarrierFingerprinter
+from .layouts import LayoutTemplateRegistry
+from .parse_results import ParseResultStore
+from .rule_stats import RuleStatsStore
 from reports.models import Report, Category
 from datetime import date
 
@@ -15,6 +23,8 @@ class ImportManager:
             'VIVO': VivoParser(),
             'CLARO': ClaroParser(),
         }
+        self.fingerprinter = CarrierFingerprinter()
+        self.layouts = LayoutTemplateRegistry()
 
     def get_file_hash(self, file_content):
         sha256_hash = hashlib.sha256()
@@ -63,6 +73,8 @@ class ImportManager:
                 file_hash = invoice_instance.file_hash
             else:
                 file_hash = self.get_file_hash(file_source)
+        except SoftTimeLimitExceeded:
+            raise
         except Exception as e:
             msg = f"Erro no hash: {str(e)}"
             if invoice_instance:
@@ -100,22 +112,76 @@ class ImportManager:
         
         # Usamos o VivoParser como base para extração de texto/ocr inicial se necessário
         base_parser = self.parsers.get('VIVO')
-        
-        text_sample = ""
-        try:
-            # Tenta extrair texto para identificação
-            text_sample = base_parser.extract_text(file_source)
-        except Exception as e:
-            # Não falha hard aqui, tenta continuar com parser padrão ou metadata
-            print(f"Aviso: Falha na extração de texto preliminar: {e}")
-        
+
+        # Sem operadora nos metadados: fingerprint barato (metadados do PDF, bytes, página 1)
+        # antes de qualquer extração completa/OCR; ambíguo cai na busca no texto extraído
+        # Contexto compartilhado: o texto (e o OCR) extraído aqui é reaproveitado pelo parser;
+        # a página 1 lida pelo fingerprint também não é lida de novo
+        context = ExtractionContext(file_hash)
         if not carrier_key:
-            carrier_key = self.identify_carrier(text_sample)
-            
-        parser = self.parsers.get(carrier_key) or base_parser
-        
+            carrier_key = self.fingerprinter.identify(file_source, file_hash, context=context) or ''
+
+        # Operadora já conhecida (metadados, fingerprint ou pasta de origem): a extração usa o
+        # parser dela, o que permite o OCR só das zonas dos campos em faturas escaneadas
+        carrier_hint = carrier_key
+        if not carrier_hint and existing_import and existing_import.carrier:
+            carrier_hint = existing_import.carrier.upper()
+        if carrier_hint not in self.parsers:
+            carrier_hint = None
+
+        context.carrier = carrier_hint
+
+        # Mesmo arquivo já lido com as regras atuais do parser: o resultado memorizado dispensa
+        # layout, extração e regras. Sem operadora conhecida, vale o de qualquer parser.
+        extracted = None
+        memoized = ParseResultStore.load(
+            file_hash, [self.parsers[carrier_hint]] if carrier_hint else list(self.parsers.values())
+        )
+        if memoized:
+            parser, result = memoized
+            extracted = ParseResultStore.decode(result.data)
+            carrier_key = carrier_key or parser.rules.carrier
+            context.method = result.method or None
+            context.ocr_dpi = result.ocr_dpi
+            context.ocr_duration_ms = result.ocr_duration_ms
+
+        # Layout conhecido da operadora: campos lidos por recorte da página 1, sem extração/regras
+        if extracted is None and carrier_hint:
+            extracted = self.layouts.extract(file_source, self.parsers[carrier_hint], context)
+            if extracted:
+                carrier_key = carrier_key or carrier_hint
+
         try:
-            extracted = parser.parse(file_source) or {}
+            if extracted is None:
+                text_sample = ""
+                try:
+                    # Tenta extrair texto para identificação
+                    text_sample = self.parsers.get(carrier_hint, base_parser).extract_text(file_source, context=context)
+                except SoftTimeLimitExceeded:
+                    raise
+                except Exception as e:
+                    # Não falha hard aqui, tenta continuar com parser padrão ou metadata
+                    print(f"Aviso: Falha na extração de texto preliminar: {e}")
+
+                if not carrier_key:
+                    carrier_key = self.identify_carrier(text_sample)
+
+                parser = self.parsers.get(carrier_key) or base_parser
+                context.rule_matches = None
+                extracted = parser.parse(file_source, context=context) or {}
+                # Uso das regras contado uma vez, na leitura final (não nas sondagens do OCR)
+                if context.rule_matches is not None:
+                    rule_metrics.record(parser.rules.carrier, context.rule_matches)
+
+                # Leitura pelas regras na camada de texto: aprende o layout para as próximas
+                if (
+                    carrier_key in self.parsers
+                    and context.method == ExtractionContext.METHOD_TEXT
+                    and self.layouts.can_learn(parser, extracted, context.rule_matches)
+                ):
+                    self.layouts.learn(file_source, parser, extracted)
+        except SoftTimeLimitExceeded:
+            raise
         except Exception as e:
             error_msg = f"Erro na extração: {str(e)}"
             if existing_import:
@@ -128,16 +194,44 @@ class ImportManager:
                 existing_import.save()
             return "FAILED", error_msg
 
+        # Memoriza a leitura da operadora identificada; OCR interrompido (parcial) não é reaproveitado
+        if memoized is None and carrier_key in self.parsers and not context.ocr_timed_out:
+            try:
+                ParseResultStore.save(file_hash, self.parsers[carrier_key], extracted, context, context.rule_matches)
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as e:
+                print(f"Aviso: Falha ao memorizar resultado do parser: {e}")
+
+        # Contadores das regras usadas nesta leitura (taxa de acerto por regra/operadora)
+        RuleStatsStore.flush()
+
         # 3. Determine Final Status (InvoiceImport + Report)
         final_import_status = InvoiceImport.Status.SUCCESS
         final_report_status = Report.Status.PENDING
         
+        final_error_code = None
+        final_error_message = None
+
         # Validação básica de sucesso
         if not extracted.get('total_value') or extracted.get('total_value') == Decimal('0.00') or not extracted.get('due_date'):
             final_import_status = InvoiceImport.Status.PENDING_REVIEW
             final_report_status = Report.Status.REVIEW
-            if existing_import:
-                 existing_import.error_code = 'MISSING_REQUIRED_DATA' # Warn only, not failed status
+            final_error_code = 'MISSING_REQUIRED_DATA' # Warn only, not failed status
+
+        # OCR interrompido pelo orçamento (tempo ou memória) da fatura: dados parciais, sempre revisados
+        if context.ocr_timed_out:
+            final_import_status = InvoiceImport.Status.PENDING_REVIEW
+            final_report_status = Report.Status.REVIEW
+            if context.ocr_budget.reason == OcrBudget.MEMORY:
+                final_error_code = 'OCR_MEMORY_LIMIT'
+                final_error_message = f"OCR interrompido ao atingir {context.ocr_budget.max_rss_mb} MB de memória; dados extraídos parcialmente."
+            else:
+                final_error_code = 'OCR_TIMEOUT'
+                final_error_message = f"OCR interrompido após {context.ocr_budget.seconds}s; dados extraídos parcialmente."
+
+        if existing_import and final_error_code:
+            existing_import.error_code = final_error_code
 
         # 4. Persist
         try:
@@ -154,12 +248,21 @@ class ImportManager:
                     'due_date': extracted.get('due_date'),
                     'total_value': extracted.get('total_value') or Decimal('0.00'),
                     'confidence_score': extracted.get('confidence', 0),
+                    'ocr_dpi': context.ocr_dpi,
+                    'ocr_duration_ms': context.ocr_duration_ms,
                     'status': final_import_status,
-                    'error_message': None,
-                    'error_code': None if final_import_status == InvoiceImport.Status.SUCCESS else 'MISSING_REQUIRED_DATA',
+                    'error_message': final_error_message,
+                    'error_code': final_error_code,
                     'file_hash': file_hash # Ensure hash is set/updated
                 }
 
+                # Leitura reaproveitada (memo ou texto armazenado) gravada antes de o custo do OCR ser
+                # guardado junto: mantém o DPI/tempo já registrados na importação
+                if existing_import and (memoized or context.from_store):
+                    for field in ('ocr_dpi', 'ocr_duration_ms'):
+                        if import_data[field] is None:
+                            import_data[field] = getattr(existing_import, field)
+
                 if existing_import:
                     # Update Existing
                     from audit.services import AuditService
@@ -173,10 +276,10 @@ class ImportManager:
                     
                     # Salva arquivo físico somente se necessário (se file_source for arquivo real e novo)
                     if hasattr(file_source, 'read'):
-                        from django.core.files.base import ContentFile
+                        from django.core.files import File
                         if hasattr(file_source, 'seek'): file_source.seek(0)
-                        file_content = file_source.read()
-                        existing_import.file.save(f"{file_hash}.pdf", ContentFile(file_content), save=False)
+                        # Gravado em blocos, sem carregar o PDF inteiro na memória
+                        existing_import.file.save(f"{file_hash}.pdf", file_source if isinstance(file_source, File) else File(file_source), save=False)
                     
                     existing_import.save()
 
@@ -198,10 +301,10 @@ class ImportManager:
                     new_import.file_hash = file_hash
                     
                     if hasattr(file_source, 'read'):
-                        from django.core.files.base import ContentFile
+                        from django.core.files import File
                         if hasattr(file_source, 'seek'): file_source.seek(0)
-                        file_content = file_source.read()
-                        new_import.file.save(f"{file_hash}.pdf", ContentFile(file_content), save=False)
+                        # Gravado em blocos, sem carregar o PDF inteiro na memória
+                        new_import.file.save(f"{file_hash}.pdf", file_source if isinstance(file_source, File) else File(file_source), save=False)
                     
                     new_import.save()
 
@@ -222,6 +325,8 @@ class ImportManager:
                 
                 return final_import_status, msg
 
+        except SoftTimeLimitExceeded:
+            raise
         except Exception as e:
             print(traceback.format_exc())
             # Ensure failure is recorded in DB if possible
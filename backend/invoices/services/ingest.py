@@ -0,0 +1,79 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+import uuid
+from django.core.files import File
+from ..models import InvoiceImport
+
+
+class IngestedUpload:
+    """Resultado da ingestão: hash do conteúdo, nome no storage e tamanho em bytes."""
+
+    def __init__(self, file_hash, name, size):
+        self.file_hash = file_hash
+        self.name = name
+        self.size = size
+
+
+class UploadIngestor:
+    """
+    Ingestão de um upload em uma única leitura: cada bloco atualiza o SHA-256 e é gravado no
+    storage sob um nome temporário; ao fim, o arquivo passa para o nome derivado do hash
+    (`<hash>.pdf` na pasta de `InvoiceImport.file`). A memória fica limitada a um bloco,
+    qualquer que seja o tamanho do PDF, e o mesmo conteúdo reenviado ocupa sempre o mesmo nome.
+
+    Storage local: o temporário fica na pasta de destino e o commit é um os.replace (atômico).
+    Storages sem caminho local (ex: S3): o temporário é um arquivo local e o commit um save.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, storage=None):
+        self.field = InvoiceImport._meta.get_field('file')
+        self.storage = storage or self.field.storage
+
+    def ingest(self, upload):
+        """Lê `upload` (UploadedFile ou file-like) uma vez e o grava no storage. Retorna IngestedUpload."""
+        temp_name = self.field.generate_filename(None, f"upload-{uuid.uuid4().hex}.part")
+        try:
+            temp_path = self.storage.path(temp_name)
+        except NotImplementedError:
+            temp_path = None
+
+        if temp_path is None:
+            return self._ingest_remote(upload, posixpath.dirname(temp_name))
+
+        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+        try:
+            with open(temp_path, 'wb') as destination:
+                file_hash, size = self._copy(upload, destination)
+            name = posixpath.join(posixpath.dirname(temp_name), f"{file_hash}.pdf")
+            os.replace(temp_path, self.storage.path(name))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return IngestedUpload(file_hash, name, size)
+
+    def _ingest_remote(self, upload, directory):
+        with tempfile.TemporaryFile() as destination:
+            file_hash, size = self._copy(upload, destination)
+            name = posixpath.join(directory, f"{file_hash}.pdf")
+            # Mesmo hash, mesmo conteúdo: não reenvia
+            if not self.storage.exists(name):
+                destination.seek(0)
+                name = self.storage.save(name, File(destination))
+        return IngestedUpload(file_hash, name, size)
+
+    def _copy(self, upload, destination):
+        """Copia `upload` para `destination` bloco a bloco. Retorna (sha256 hex, bytes)."""
+        sha256_hash = hashlib.sha256()
+        size = 0
+        if hasattr(upload, 'seek'):
+            upload.seek(0)
+        chunks = upload.chunks(self.CHUNK_SIZE) if hasattr(upload, 'chunks') else iter(lambda: upload.read(self.CHUNK_SIZE), b"")
+        for chunk in chunks:
+            sha256_hash.update(chunk)
+            destination.write(chunk)
+            size += len(chunk)
+        return sha256_hash.hexdigest(), size
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import re
+import pdfplumber
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.db.models import F
+from ..models import LayoutTemplate
+from ..parsers.context import ExtractionContext
+from ..parsers.rules import CURRENCY, DATE, PRIMARY
+from .text_store import ExtractedTextStore
+
+# Padrão do valor de cada campo dentro da sua caixa
+FIELD_PATTERNS = {
+    'total_value': CURRENCY,
+    'due_date': DATE,
+    'invoice_number': r'(\d{3,15})',
+}
+
+
+def _normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+class LayoutTemplateRegistry:
+    """
+    Layouts conhecidos por operadora (LayoutTemplate). Uma fatura cujo tamanho de página e
+    âncoras batem com um layout tem os campos lidos por recortes da página 1, sem extrair
+    o texto do documento nem rodar as regras. Layouts novos são aprendidos de faturas lidas
+    pelas regras, localizando na página 1 os valores encontrados e os rótulos das regras.
+
+    Cada layout vale para a versão das regras (`rules_version`) do parser de onde foi aprendido:
+    incrementar a versão faz as faturas voltarem às regras (e reaprenderem o layout). O texto
+    da página 1 de uma fatura lida por layout é guardado no ExtractedTextStore, para o reparse.
+    """
+    # Tolerância no tamanho da página (pontos)
+    PAGE_TOLERANCE = 2.0
+    # Folga em torno da caixa de um valor aprendido (pontos): valores mais longos/curtos
+    VALUE_MARGIN_X = 40.0
+    # Folga vertical em alturas da linha do valor (deslocamentos pequenos entre documentos)
+    VALUE_MARGIN_LINES = 0.5
+    ANCHOR_MARGIN = 2.0
+    # Pontuação em volta de um valor impresso (ex: "10/12/2026." ou "(150,00)")
+    VALUE_PUNCTUATION = '.,;:()[]'
+
+    def is_enabled(self):
+        return getattr(settings, 'INVOICE_LAYOUT_TEMPLATES', True)
+
+    def extract(self, pdf_file, parser, context=None):
+        """
+        Campos da fatura pelo layout conhecido (dict no formato de parser.parse), ou None
+        se nenhum layout da operadora bater ou algum campo obrigatório não for lido.
+        """
+        if not self.is_enabled() or parser.rules is None:
+            return None
+        if context is not None and 'pdfplumber' in context.failed_backends:
+            return None
+
+        carrier = parser.rules.carrier
+        # Consulta antes de abrir o PDF: sem layouts da operadora, custo zero
+        templates = list(LayoutTemplate.objects.filter(
+            carrier=carrier, rules_version=parser.rules_version, is_active=True
+        ))
+        if not templates:
+            return None
+
+        try:
+            with self._open(pdf_file) as pdf:
+                if not pdf.pages:
+                    return None
+                page = pdf.pages[0]
+                for template in templates:
+                    if not self.matches(template, page):
+                        continue
+                    data = self.read_fields(template, page, parser)
+                    if data is None:
+                        print(f"Aviso: Layout {template} reconhecido, mas os campos não foram lidos.")
+                        continue
+                    LayoutTemplate.objects.filter(pk=template.pk).update(hits=F('hits') + 1)
+                    if context is not None and not context.is_extracted:
+                        self._store_page_text(context, page, len(pdf.pages))
+                    return data
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: Falha na leitura por layout: {e}")
+        finally:
+            if hasattr(pdf_file, 'seek'):
+                pdf_file.seek(0)
+        return None
+
+    def matches(self, template, page):
+        if abs(float(page.width) - template.page_width) > self.PAGE_TOLERANCE:
+            return False
+        if abs(float(page.height) - template.page_height) > self.PAGE_TOLERANCE:
+            return False
+        return all(anchor['text'] in _normalize(self._crop_text(page, anchor['box'])) for anchor in template.anchors)
+
+    def read_fields(self, template, page, parser):
+        data = {
+            'invoice_number': None,
+            'due_date': None,
+            'total_value': None,
+            'carrier': template.carrier,
+            'confidence': template.confidence,
+        }
+        for field, spec in template.fields.items():
+            match = re.search(spec['pattern'], self._crop_text(page, spec['box']))
+            if not match:
+                continue
+            decoder = parser.rules.decoders.get(field)
+            data[field] = decoder(match.group(1)) if decoder else match.group(1)
+
+        if any(not data.get(field) for field in parser.required_fields):
+            return None
+        return data
+
+    def _store_page_text(self, context, page, page_count):
+        """Texto da página 1 (a lida pelo layout) no contexto e no ExtractedTextStore, como a parada antecipada."""
+        context.text = page.extract_text() or ""
+        context.page_texts = [context.text]
+        context.page_methods = [ExtractionContext.METHOD_TEXT]
+        context.method = ExtractionContext.METHOD_TEXT
+        context.engine_version = f"pdfplumber {pdfplumber.__version__}"
+        context.complete = page_count == 1
+        try:
+            ExtractedTextStore.save(context)
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: Falha ao armazenar texto extraído: {e}")
+
+    @staticmethod
+    def can_learn(parser, data, matches):
+        """
+        Só leituras em que todos os campos obrigatórios vieram de regras primárias ensinam
+        layouts: o fallback pode ter pego outro valor da página (ex: a primeira data).
+        `matches` é o RuleMatches da leitura (context.rule_matches).
+        """
+        if matches is None or parser.rules is None:
+            return False
+        primary = {rule.name for rule in parser.rules.rules if rule.stage == PRIMARY}
+        return all(
+            data.get(field) and matches.winners.get(field) in primary for field in parser.required_fields
+        )
+
+    def learn(self, pdf_file, parser, data):
+        """
+        Aprende (ou reaprende) o layout da página 1 a partir dos valores lidos pelas regras.
+        Só grava se todos os campos obrigatórios e ao menos uma âncora forem localizados.
+        """
+        if not self.is_enabled() or parser.rules is None:
+            return None
+
+        try:
+            with self._open(pdf_file) as pdf:
+                if not pdf.pages:
+                    return None
+                page = pdf.pages[0]
+                width, height = float(page.width), float(page.height)
+                words = page.extract_words()
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: Falha ao aprender layout: {e}")
+            return None
+        finally:
+            if hasattr(pdf_file, 'seek'):
+                pdf_file.seek(0)
+
+        fields, anchors = {}, []
+        for field in parser.required_fields:
+            value_box = self._locate_value(words, data.get(field))
+            if value_box is None:
+                return None
+            margin_y = (value_box[3] - value_box[1]) * self.VALUE_MARGIN_LINES
+            fields[field] = {
+                'box': self._fraction(self._expand(value_box, self.VALUE_MARGIN_X, margin_y), width, height),
+                'pattern': FIELD_PATTERNS[field],
+            }
+            anchor = self._locate_anchor(words, parser, field, value_box)
+            if anchor is not None:
+                text, box = anchor
+                anchors.append({
+                    'text': text,
+                    'box': self._fraction(self._expand(box, self.ANCHOR_MARGIN, self.ANCHOR_MARGIN), width, height),
+                })
+
+        if not anchors:
+            return None
+
+        carrier = parser.rules.carrier
+        signature = hashlib.sha256(json.dumps([
+            carrier, parser.rules_version, round(width), round(height),
+            sorted((a['text'], [round(c, 2) for c in a['box']]) for a in anchors),
+        ]).encode('utf-8')).hexdigest()
+        template, _ = LayoutTemplate.objects.update_or_create(
+            signature=signature,
+            defaults={
+                'carrier': carrier,
+                'rules_version': parser.rules_version,
+                'page_width': width,
+                'page_height': height,
+                'anchors': anchors,
+                'fields': fields,
+                'confidence': data.get('confidence', 100),
+                'is_active': True,
+            }
+        )
+        return template
+
+    @staticmethod
+    def _open(pdf_file):
+        if hasattr(pdf_file, 'seek'):
+            pdf_file.seek(0)
+        return pdfplumber.open(pdf_file)
+
+    @staticmethod
+    def _crop_text(page, box):
+        x0, y0, x1, y1 = box
+        width, height = float(page.width), float(page.height)
+        bbox = (max(0.0, x0 * width), max(0.0, y0 * height), min(width, x1 * width), min(height, y1 * height))
+        return page.within_bbox(bbox).extract_text() or ""
+
+    @staticmethod
+    def _value_strings(value):
+        """Formas como o valor aparece impresso na fatura."""
+        if value is None or value == "":
+            return []
+        if hasattr(value, 'strftime'):
+            return [value.strftime('%d/%m/%Y')]
+        if hasattr(value, 'quantize'):
+            plain = f"{value:.2f}".replace('.', ',')
+            grouped = f"{value:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+            return list(dict.fromkeys([grouped, plain]))
+        return [str(value)]
+
+    def _locate_value(self, words, value):
+        """Caixa da palavra igual ao valor (token inteiro: "10,00" não casa dentro de "110,00")."""
+        for candidate in self._value_strings(value):
+            for word in words:
+                token = word['text'].strip(self.VALUE_PUNCTUATION)
+                if token.startswith('R$'):
+                    token = token[2:]
+                if token == candidate:
+                    return (word['x0'], word['top'], word['x1'], word['bottom'])
+        return None
+
+    def _locate_anchor(self, words, parser, field, value_box):
+        """Rótulo (âncora de uma regra do campo) mais próximo do valor na página."""
+        lowered = [word['text'].lower() for word in words]
+        best = None
+        for rule in parser.rules.rules:
+            if rule.field != field:
+                continue
+            for anchor in rule.anchors:
+                tokens = anchor.split()
+                for start in range(len(words) - len(tokens) + 1):
+                    if lowered[start:start + len(tokens)] != tokens:
+                        continue
+                    span = words[start:start + len(tokens)]
+                    box = (min(w['x0'] for w in span), min(w['top'] for w in span),
+                           max(w['x1'] for w in span), max(w['bottom'] for w in span))
+                    distance = abs(box[0] - value_box[0]) + abs(box[1] - value_box[1])
+                    if best is None or distance < best[0]:
+                        best = (distance, _normalize(anchor), box)
+        return best[1:] if best else None
+
+    @staticmethod
+    def _expand(box, margin_x, margin_y):
+        x0, y0, x1, y1 = box
+        return (x0 - margin_x, y0 - margin_y, x1 + margin_x, y1 + margin_y)
+
+    @staticmethod
+    def _fraction(box, width, height):
+        x0, y0, x1, y1 = box
+        return [
+            round(max(0.0, x0 / width), 4), round(max(0.0, y0 / height), 4),
+            round(min(1.0, x1 / width), 4), round(min(1.0, y1 / height), 4),
+        ]
@@ -0,0 +1,102 @@
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.db import transaction
+from ..models import InvoiceLineItem
+from ..parsers.rules import decode_currency
+from .importer import ImportManager
+
+
+def duration_seconds(value):
+    """'hh:mm:ss' -> segundos."""
+    if not value:
+        return None
+    hours, minutes, seconds = (int(part) for part in value.split(':'))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+class LineItemExtractor:
+    """
+    Itens do detalhamento (InvoiceLineItem) de uma fatura importada. As páginas são lidas uma
+    a uma pelo backend de texto (cada página é liberada após a leitura) e as linhas gravadas
+    em lotes de `batch_size` com bulk_create: a memória fica limitada a uma página e um lote,
+    e as idas ao banco a 1 + itens / batch_size, qualquer que seja o número de páginas.
+
+    Só a camada de texto é lida; páginas escaneadas do detalhamento não geram itens.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or getattr(settings, 'INVOICE_LINE_ITEMS_BATCH_SIZE', 1000)
+        self.parsers = ImportManager().parsers
+
+    def extract(self, invoice, source=None, tracker=None):
+        """
+        Substitui os itens da fatura pelos lidos de `source` (padrão: o arquivo da importação). Retorna quantos gravou.
+        `tracker` (SegmentTracker) recebe cada página lida, para procurar outras faturas no PDF na mesma leitura.
+        """
+        parser = self.parsers.get((invoice.carrier or '').upper())
+        pattern = parser.line_item_pattern if parser is not None and getattr(settings, 'INVOICE_LINE_ITEMS', True) else None
+        if pattern is None and tracker is None:
+            return 0
+        if source is None:
+            source = invoice.file.path if invoice.file else invoice.file_path
+
+        created = 0
+        batch = []
+        # Reprocessamento substitui os itens; em caso de erro, os anteriores permanecem
+        with transaction.atomic():
+            if pattern is not None:
+                InvoiceLineItem.objects.filter(invoice=invoice).delete()
+            for page, page_text in enumerate(self.iter_pages(parser or self.parsers['VIVO'], source), start=1):
+                if tracker is not None:
+                    tracker.feed(page_text)
+                if pattern is None:
+                    continue
+                for position, item in enumerate(self.parse_page(pattern, page_text), start=1):
+                    batch.append(InvoiceLineItem(invoice=invoice, page=page, position=position, **item))
+                    if len(batch) >= self.batch_size:
+                        created += self._write(batch)
+                        batch = []
+            if batch:
+                created += self._write(batch)
+        return created
+
+    def _write(self, batch):
+        InvoiceLineItem.objects.bulk_create(batch, batch_size=self.batch_size)
+        return len(batch)
+
+    @staticmethod
+    def parse_page(pattern, page_text):
+        for match in pattern.finditer(page_text or ""):
+            amount = decode_currency(match.group('amount'))
+            if amount is None:
+                continue
+            yield {
+                'access': match.group('access').strip(),
+                'description': (match.group('description') or '').strip()[:255],
+                'duration_seconds': duration_seconds(match.group('duration')),
+                'amount': amount,
+            }
+
+    @staticmethod
+    def iter_pages(parser, source):
+        """Texto de cada página pelo primeiro backend do parser que abrir o arquivo."""
+        backends = parser.get_text_backends()
+        for index, backend in enumerate(backends):
+            pages = backend.iter_pages(source)
+            try:
+                try:
+                    first = next(pages)
+                except StopIteration:
+                    return
+                except SoftTimeLimitExceeded:
+                    raise
+                except Exception as e:
+                    if index == len(backends) - 1:
+                        raise
+                    print(f"[{backend.name}] Falha ao ler o detalhamento, tentando o próximo backend: {e}")
+                    continue
+                yield first
+                yield from pages
+                return
+            finally:
+                pages.close()
@@ -0,0 +1,99 @@
+from datetime import date
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from ..models import ParseResult
+
+# Campos do dict de parse() que não são tipos JSON nativos
+DECODERS = {
+    'due_date': date.fromisoformat,
+    'total_value': Decimal,
+}
+
+
+class ParseResultStore:
+    """
+    Memorização de parser.parse() por (file_hash, parser, rules_version). Usada pelo
+    ImportManager (reimportações/reprocessamentos) e pelo InvoiceReparser.
+    """
+
+    @staticmethod
+    def key(parser):
+        return type(parser).__name__, parser.rules_version
+
+    @staticmethod
+    def decode(data):
+        data = dict(data)
+        for field, decoder in DECODERS.items():
+            if data.get(field) is not None:
+                data[field] = decoder(data[field])
+        return data
+
+    @staticmethod
+    def load(file_hash, parsers):
+        """
+        Primeiro resultado memorizado de `file_hash` entre `parsers` (na ordem), na versão
+        atual das regras de cada um. Retorna (parser, ParseResult) ou None.
+        """
+        if not file_hash or not parsers:
+            return None
+        keys = {ParseResultStore.key(parser): parser for parser in parsers}
+        stored = {
+            (result.parser, result.rules_version): result
+            for result in ParseResult.objects.filter(
+                file_hash=file_hash, parser__in=[name for name, _ in keys]
+            )
+        }
+        for key, parser in keys.items():
+            result = stored.get(key)
+            if result is not None:
+                ParseResult.objects.filter(pk=result.pk).update(hits=F('hits') + 1)
+                return parser, result
+        return None
+
+    @staticmethod
+    def load_many(file_hashes):
+        """Resultados memorizados dos arquivos em uma consulta: {(file_hash, parser, versão): ParseResult}."""
+        return {
+            (result.file_hash, result.parser, result.rules_version): result
+            for result in ParseResult.objects.filter(file_hash__in=set(file_hashes))
+        }
+
+    @staticmethod
+    def is_cacheable(parser, data, matches=None):
+        """
+        Só leituras confiáveis são memorizadas: com texto (confiança > 0) e todos os campos
+        obrigatórios, ou confiança >= INVOICE_OCR_MIN_CONFIDENCE. Uma falha transitória de
+        extração (texto vazio) não pode ficar presa no cache até a próxima versão das regras.
+        Leituras com regras cortadas pelo orçamento (`matches`, RuleMatches) também não.
+        """
+        if not data or not data.get('confidence'):
+            return False
+        if matches is not None and matches.budget_hit:
+            return False
+        if all(data.get(field) for field in parser.required_fields):
+            return True
+        return data['confidence'] >= getattr(settings, 'INVOICE_OCR_MIN_CONFIDENCE', 80)
+
+    @staticmethod
+    def save(file_hash, parser, data, context=None, matches=None):
+        """Memoriza o resultado e descarta os de versões anteriores do mesmo parser para o arquivo."""
+        if not file_hash or not ParseResultStore.is_cacheable(parser, data, matches):
+            return None
+        name, version = ParseResultStore.key(parser)
+        defaults = {'data': data}
+        # Sem contexto (reparse do texto armazenado): mantém o método/DPI/tempo da extração original
+        if context is not None:
+            defaults['method'] = context.method or ''
+            defaults['ocr_dpi'] = context.ocr_dpi
+            defaults['ocr_duration_ms'] = context.ocr_duration_ms
+        with transaction.atomic():
+            ParseResult.objects.filter(file_hash=file_hash, parser=name).exclude(rules_version=version).delete()
+            result, _ = ParseResult.objects.update_or_create(
+                file_hash=file_hash,
+                parser=name,
+                rules_version=version,
+                defaults=defaults,
+            )
+        return result
@@ -0,0 +1,224 @@
+import os
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from django.forms.models import model_to_dict
+from ..models import InvoiceImport, ExtractedText
+from ..parsers.context import ExtractionContext
+from ..parsers.rules import rule_metrics
+from .importer import ImportManager
+from .parse_results import ParseResultStore
+from .rule_stats import RuleStatsStore
+from .text_store import ExtractedTextStore
+
+
+class InvoiceReparser:
+    """
+    Re-aplica as regras atuais dos parsers sobre o texto já armazenado (ExtractedText),
+    sem reler o PDF nem rodar OCR. Usado quando uma regex da VIVO/CLARO é corrigida.
+
+    Apenas os campos extraídos da InvoiceImport são atualizados; relatórios vinculados
+    não são alterados (valores já aprovados continuam passando pela revisão humana).
+    Textos guardados após a parada antecipada (is_complete=False) são completados relendo a
+    camada de texto do PDF, uma vez; sem o PDF, ficam de fora (`incomplete_text`).
+    Textos do OCR por regiões (linhas sintéticas "<rótulo> <valor>") não são fonte para
+    as regras e ficam de fora (`region_text` no resumo).
+    """
+    CHUNK_SIZE = 200
+    TRACKED_FIELDS = ('invoice_number', 'due_date', 'total_value', 'confidence_score')
+
+    def __init__(self):
+        self.importer = ImportManager()
+
+    @staticmethod
+    def select(statuses=None, carrier=None, date_from=None, date_to=None):
+        """Seleciona as importações a reprocessar. Datas filtram pela data de importação (created_at)."""
+        queryset = InvoiceImport.objects.all()
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+        if carrier:
+            queryset = queryset.filter(carrier__iexact=carrier)
+        if date_from:
+            queryset = queryset.filter(created_at__date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(created_at__date__lte=date_to)
+        return queryset.order_by('pk')
+
+    @staticmethod
+    def chunk_ids(queryset, size=None):
+        size = size or InvoiceReparser.CHUNK_SIZE
+        ids = list(queryset.values_list('pk', flat=True))
+        return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+    @staticmethod
+    def dispatch(queryset, user_id=None, dry_run=False, chunk_size=None):
+        """Enfileira um reparse_invoices_task por lote de IDs. Retorna o GroupResult (salvo no result backend)."""
+        from celery import group
+        from ..tasks import reparse_invoices_task
+
+        chunks = InvoiceReparser.chunk_ids(queryset, chunk_size)
+        job = group(reparse_invoices_task.s(chunk, user_id, dry_run) for chunk in chunks).apply_async()
+        job.save()
+        return job, chunks
+
+    @staticmethod
+    def job_status(job_id):
+        """Agrega os resumos dos lotes já concluídos de um job disparado por dispatch()."""
+        from celery.result import GroupResult
+
+        job = GroupResult.restore(job_id)
+        if job is None:
+            return None
+        finished = [result.result for result in job.results if result.successful()]
+        summary = InvoiceReparser.merge_summaries(finished)
+        summary['chunks_total'] = len(job.results)
+        summary['chunks_finished'] = len(finished)
+        summary['chunks_failed'] = len([result for result in job.results if result.failed()])
+        return summary
+
+    @staticmethod
+    def empty_summary():
+        summary = {
+            'processed': 0, 'changed': 0, 'missing_text': 0, 'region_text': 0, 'incomplete_text': 0, 'failed': 0,
+        }
+        summary['fields_changed'] = {field: 0 for field in InvoiceReparser.TRACKED_FIELDS}
+        return summary
+
+    @staticmethod
+    def merge_summaries(summaries):
+        total = InvoiceReparser.empty_summary()
+        for summary in summaries:
+            for key in ('processed', 'changed', 'missing_text', 'region_text', 'incomplete_text', 'failed'):
+                total[key] += summary.get(key, 0)
+            for field, count in summary.get('fields_changed', {}).items():
+                total['fields_changed'][field] = total['fields_changed'].get(field, 0) + count
+        return total
+
+    def _complete_text(self, invoice, dry_run=False):
+        """
+        Texto completo de uma fatura cujo texto guardado parou nas primeiras páginas: relê a
+        camada de texto do PDF inteiro (sem OCR) e, fora do dry run, substitui o texto guardado,
+        para os próximos reparses não relerem o PDF. None se o PDF não estiver disponível.
+        """
+        source = invoice.file.path if invoice.file else None
+        if not source or not os.path.exists(source):
+            return None
+        parser = self.importer.parsers.get((invoice.carrier or '').upper()) or self.importer.parsers['VIVO']
+        full = parser.extract_full_text(source)
+        if full is None:
+            return None
+
+        text, page_texts, engine_version = full
+        if not dry_run:
+            context = ExtractionContext(invoice.file_hash)
+            context.text = text
+            context.page_texts = page_texts
+            context.page_methods = [ExtractionContext.METHOD_TEXT] * len(page_texts)
+            context.method = ExtractionContext.METHOD_TEXT
+            context.engine_version = engine_version
+            context.complete = True
+            ExtractedTextStore.save(context)
+        return text
+
+    def reparse(self, invoice_ids, user=None, dry_run=False):
+        """Reprocessa um lote de importações a partir do texto armazenado e retorna o resumo das mudanças."""
+        summary = self.empty_summary()
+        invoices = list(InvoiceImport.objects.filter(pk__in=invoice_ids))
+        stored_texts = ExtractedText.objects.in_bulk(
+            [invoice.file_hash for invoice in invoices], field_name='file_hash'
+        )
+
+        memoized = ParseResultStore.load_many([invoice.file_hash for invoice in invoices])
+
+        changed_invoices = []
+        for invoice in invoices:
+            carrier_key = (invoice.carrier or '').upper()
+            parser = self.importer.parsers.get(carrier_key)
+            # Regras do parser inalteradas desde a última leitura deste arquivo: só consulta
+            result = memoized.get((invoice.file_hash,) + ParseResultStore.key(parser)) if parser else None
+            if result is not None:
+                extracted = ParseResultStore.decode(result.data)
+            else:
+                stored = stored_texts.get(invoice.file_hash)
+                if not stored:
+                    summary['missing_text'] += 1
+                    continue
+                # OCR por regiões: linhas "<rótulo> <valor>" sintéticas, não o texto da fatura
+                if stored.method == ExtractedText.Method.OCR_REGIONS:
+                    summary['region_text'] += 1
+                    continue
+
+                try:
+                    text = ExtractedTextStore.decompress(stored.content).get('text') or ""
+                    # Texto guardado após a parada antecipada: só as primeiras páginas
+                    if not stored.is_complete:
+                        text = self._complete_text(invoice, dry_run)
+                        if text is None:
+                            summary['incomplete_text'] += 1
+                            continue
+                    if carrier_key not in self.importer.parsers:
+                        carrier_key = self.importer.identify_carrier(text)
+                    parser = self.importer.parsers.get(carrier_key) or self.importer.parsers['VIVO']
+                    context = ExtractionContext(invoice.file_hash)
+                    extracted = parser.parse(None, text=text, context=context) or {}
+                    if context.rule_matches is not None and not dry_run:
+                        rule_metrics.record(parser.rules.carrier, context.rule_matches)
+                except Exception as e:
+                    print(f"Erro ao reprocessar fatura {invoice.pk}: {e}")
+                    summary['failed'] += 1
+                    continue
+
+                if carrier_key in self.importer.parsers and not dry_run:
+                    try:
+                        ParseResultStore.save(invoice.file_hash, parser, extracted, matches=context.rule_matches)
+                    except Exception as e:
+                        print(f"Aviso: Falha ao memorizar resultado do parser: {e}")
+
+            summary['processed'] += 1
+            new_values = {
+                'invoice_number': extracted.get('invoice_number'),
+                'due_date': extracted.get('due_date'),
+                'total_value': extracted.get('total_value') or Decimal('0.00'),
+                'confidence_score': extracted.get('confidence', 0),
+            }
+
+            before_state = model_to_dict(invoice)
+            changed_fields = [
+                field for field, value in new_values.items() if getattr(invoice, field) != value
+            ]
+            if not changed_fields:
+                continue
+
+            summary['changed'] += 1
+            for field in changed_fields:
+                summary['fields_changed'][field] += 1
+                setattr(invoice, field, new_values[field])
+            changed_invoices.append((invoice, before_state))
+
+        if changed_invoices and not dry_run:
+            self._persist(changed_invoices, user)
+        RuleStatsStore.flush()
+
+        return summary
+
+    def _persist(self, changed_invoices, user):
+        from audit.services import AuditService
+        from audit.models import AuditLog
+
+        now = timezone.now()
+        for invoice, _ in changed_invoices:
+            invoice.updated_at = now
+
+        with transaction.atomic():
+            InvoiceImport.objects.bulk_update(
+                [invoice for invoice, _ in changed_invoices], list(self.TRACKED_FIELDS) + ['updated_at']
+            )
+            for invoice, before_state in changed_invoices:
+                AuditService.log_action(
+                    user=user,
+                    action=AuditLog.Action.REPROCESS,
+                    instance=invoice,
+                    before_state=before_state,
+                    after_state=model_to_dict(invoice),
+                    entity_name="InvoiceImport (Reparse)"
+                )
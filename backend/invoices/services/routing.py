@@ -0,0 +1,139 @@
+import re
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+from ..models import InvoiceImport
+
+# Operadores de desenho de texto no content stream: Tj, TJ, ' e "
+TEXT_OPERATOR = re.compile(rb"(?:\)|\]|>)\s*(?:Tj|TJ|'|\")")
+# Matriz "a b c d e f cm" seguida (no mesmo bloco) de "/Nome Do"
+IMAGE_PLACEMENT = re.compile(
+    rb"(-?[\d.]+)\s+(-?[\d.]+)\s+(-?[\d.]+)\s+(-?[\d.]+)\s+-?[\d.]+\s+-?[\d.]+\s+cm\s*/([^\s/]+)\s+Do"
+)
+
+
+class PdfClassifier:
+    """
+    Classificação barata de um PDF em digital (camada de texto) ou escaneado, olhando só
+    a página 1 sem interpretá-la: fontes nos recursos, operadores de texto no content
+    stream e a área coberta por imagens (pela matriz "cm" que antecede cada "Do").
+    """
+    # Imagem cobrindo quase a página e quase nenhum texto (carimbo, rodapé): escaneado
+    FULL_PAGE_COVERAGE = 0.85
+    MIN_TEXT_OPERATORS = 10
+
+    def classify(self, file_source):
+        """Retorna {'kind', 'fonts', 'text_operators', 'image_coverage'}; kind UNKNOWN se o PDF não puder ser lido."""
+        stats = {'kind': InvoiceImport.PdfKind.UNKNOWN, 'fonts': 0, 'text_operators': 0, 'image_coverage': 0.0}
+        try:
+            if isinstance(file_source, str):
+                with open(file_source, 'rb') as f:
+                    self._inspect(f, stats)
+            else:
+                if hasattr(file_source, 'seek'):
+                    file_source.seek(0)
+                self._inspect(file_source, stats)
+                if hasattr(file_source, 'seek'):
+                    file_source.seek(0)
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: Falha ao classificar PDF: {e}")
+            return stats
+
+        if not stats['fonts'] or not stats['text_operators']:
+            stats['kind'] = InvoiceImport.PdfKind.SCANNED
+        elif stats['image_coverage'] >= self.FULL_PAGE_COVERAGE and stats['text_operators'] < self.MIN_TEXT_OPERATORS:
+            stats['kind'] = InvoiceImport.PdfKind.SCANNED
+        else:
+            stats['kind'] = InvoiceImport.PdfKind.TEXT
+        return stats
+
+    def _inspect(self, fp, stats):
+        document = PDFDocument(PDFParser(fp))
+        page = next(PDFPage.create_pages(document), None)
+        if page is None:
+            raise ValueError("PDF sem páginas")
+
+        resources = resolve1(page.resources) or {}
+        fonts = resolve1(resources.get('Font')) or {}
+        xobjects = resolve1(resources.get('XObject')) or {}
+        images = set()
+        for name, ref in xobjects.items():
+            subtype = getattr(resolve1(ref), 'attrs', {}).get('Subtype')
+            if getattr(subtype, 'name', subtype) == 'Image':
+                images.add(name)
+
+        contents = page.contents if isinstance(page.contents, list) else [page.contents]
+        data = b"\n".join(resolve1(stream).get_data() for stream in contents if stream is not None)
+
+        x0, y0, x1, y1 = page.mediabox
+        page_area = abs((x1 - x0) * (y1 - y0)) or 1
+        image_area = 0.0
+        for a, b, c, d, name in IMAGE_PLACEMENT.findall(data):
+            if name.decode('latin-1') in images:
+                image_area += abs(float(a) * float(d) - float(b) * float(c))
+
+        stats['fonts'] = len(fonts)
+        stats['text_operators'] = len(TEXT_OPERATOR.findall(data))
+        stats['image_coverage'] = round(min(image_area / page_area, 1.0), 3)
+
+
+class InvoiceRouter:
+    """
+    Encaminha process_invoice_task para a fila do tipo de PDF: digitais (segundos) na fila
+    `text`, escaneados (OCR, dezenas de segundos) na fila `ocr`, escaláveis separadamente.
+    Uploads manuais têm prioridade sobre as varreduras de pasta em ambas as filas.
+    """
+    @staticmethod
+    def queue_for(kind):
+        if kind == InvoiceImport.PdfKind.TEXT:
+            return getattr(settings, 'INVOICE_TEXT_QUEUE', 'text')
+        # Escaneado ou não classificado: na dúvida, a fila lenta
+        return getattr(settings, 'INVOICE_OCR_QUEUE', 'ocr')
+
+    @staticmethod
+    def priority_for(manual):
+        # Redis: 0 é a maior prioridade
+        if manual:
+            return getattr(settings, 'INVOICE_MANUAL_PRIORITY', 0)
+        return getattr(settings, 'INVOICE_BULK_PRIORITY', 6)
+
+    @staticmethod
+    def dispatch(invoice, user_id=None, source=None, manual=False):
+        """Classifica o PDF (source ou o arquivo da importação), grava o tipo e enfileira a task."""
+        from ..tasks import process_invoice_task
+
+        if source is None:
+            source = invoice.file.path if invoice.file else invoice.file_path
+        kind = PdfClassifier().classify(source)['kind']
+        if invoice.pdf_kind != kind:
+            invoice.pdf_kind = kind
+            invoice.save(update_fields=['pdf_kind'])
+
+        return process_invoice_task.apply_async(
+            args=[invoice.id, user_id],
+            queue=InvoiceRouter.queue_for(kind),
+            priority=InvoiceRouter.priority_for(manual),
+        )
+
+    @staticmethod
+    def dispatch_line_items(invoice, user_id=None, manual=False):
+        """
+        Enfileira a leitura de todas as páginas após a importação, na fila `text` e com prioridade
+        de varredura (não atrasa as importações): itens do detalhamento (só camada de texto) e
+        procura de outras faturas no PDF (lotes). `user_id`/`manual` passam para as partes de um lote.
+        """
+        from ..tasks import extract_line_items_task
+        from .splitter import InvoiceSplitter
+
+        if not getattr(settings, 'INVOICE_LINE_ITEMS', True) and InvoiceSplitter().tracker(invoice) is None:
+            return None
+        return extract_line_items_task.apply_async(
+            args=[invoice.id, user_id, manual],
+            queue=getattr(settings, 'INVOICE_TEXT_QUEUE', 'text'),
+            priority=InvoiceRouter.priority_for(manual=False),
+        )
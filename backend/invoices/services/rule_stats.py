@@ -0,0 +1,117 @@
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from ..models import ParserRuleStat
+from ..parsers.rules import FALLBACK, PRIMARY, RULE_TIME_BUCKETS_MS, rule_metrics
+
+STAGE_ORDER = {PRIMARY: 0, FALLBACK: 1}
+
+
+class RuleStatsStore:
+    """
+    Persistência dos contadores de regras acumulados no processo (rule_metrics) em
+    ParserRuleStat e resumo por operadora para o endpoint de métricas.
+    """
+
+    @staticmethod
+    def is_enabled():
+        return getattr(settings, 'INVOICE_RULE_METRICS', True)
+
+    # Tentativas de somar o histograma quando outro worker o altera entre a leitura e a escrita
+    HISTOGRAM_RETRIES = 5
+
+    @staticmethod
+    def flush():
+        """Soma os contadores pendentes do processo no banco. Retorna quantas regras foram atualizadas."""
+        pending = rule_metrics.drain()
+        if not pending or not RuleStatsStore.is_enabled():
+            return 0
+
+        updated = 0
+        try:
+            now = timezone.now()
+            for (carrier, rule), entry in pending.items():
+                # Soma feita pelo banco (F), linha a linha: imports concorrentes da mesma
+                # operadora não esperam uns pelos outros nem perdem incrementos
+                rows = ParserRuleStat.objects.filter(carrier=carrier, rule=rule)
+                increments = {
+                    'evaluations': F('evaluations') + entry['evaluations'],
+                    'matched': F('matched') + entry['matched'],
+                    'won': F('won') + entry['won'],
+                    'exhausted': F('exhausted') + entry['exhausted'],
+                    'total_ms': F('total_ms') + entry['seconds'] * 1000,
+                    'updated_at': now,
+                }
+                if not rows.update(**increments):
+                    # Primeira avaliação da regra: cria a linha zerada (outro worker pode criar a mesma)
+                    ParserRuleStat.objects.get_or_create(
+                        carrier=carrier, rule=rule, defaults={'field': entry['field'], 'stage': entry['stage']}
+                    )
+                    rows.update(**increments)
+                RuleStatsStore._add_histogram(rows, entry['histogram'])
+                updated += 1
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: Falha ao gravar estatísticas de regras: {e}")
+        return updated
+
+    @staticmethod
+    def _add_histogram(rows, counts):
+        """
+        Soma `counts` ao histograma (JSON) da linha sem travá-la: a escrita só vale se o
+        histograma ainda for o lido; se outro worker o alterou no meio, relê e tenta de novo.
+        """
+        for _ in range(RuleStatsStore.HISTOGRAM_RETRIES):
+            current = rows.values_list('time_histogram', flat=True).first()
+            if current is None:
+                return
+            histogram = list(current) + [0] * (len(counts) - len(current))
+            merged = [old + new for old, new in zip(histogram, counts)]
+            if rows.filter(time_histogram=current).update(time_histogram=merged):
+                return
+        print(f"Aviso: histograma de tempo não atualizado (concorrência): {rows.first()}")
+
+    @staticmethod
+    def summary(carrier=None):
+        """
+        Por operadora: quantas leituras (avaliações das regras primárias), a fração que caiu no
+        fallback e, por regra, taxas de acerto/vitória, tempo médio e histograma de tempo.
+        """
+        queryset = ParserRuleStat.objects.all()
+        if carrier:
+            queryset = queryset.filter(carrier__iexact=carrier)
+
+        labels = [f"<={limit}ms" for limit in RULE_TIME_BUCKETS_MS] + [f">{RULE_TIME_BUCKETS_MS[-1]}ms"]
+        carriers = {}
+        for stat in queryset:
+            carriers.setdefault(stat.carrier, []).append(stat)
+
+        result = []
+        for name, stats in sorted(carriers.items()):
+            parses = max((stat.evaluations for stat in stats if stat.stage == PRIMARY), default=0)
+            fallbacks = max((stat.evaluations for stat in stats if stat.stage == FALLBACK), default=0)
+            stats.sort(key=lambda stat: (STAGE_ORDER.get(stat.stage, 2), stat.field, -stat.won, stat.rule))
+            result.append({
+                'carrier': name,
+                'parses': parses,
+                'fallback_rate': round(fallbacks / parses, 3) if parses else None,
+                'rules': [
+                    {
+                        'rule': stat.rule,
+                        'field': stat.field,
+                        'stage': stat.stage,
+                        'evaluations': stat.evaluations,
+                        'matched': stat.matched,
+                        'won': stat.won,
+                        'exhausted': stat.exhausted,
+                        'match_rate': round(stat.matched / stat.evaluations, 3) if stat.evaluations else None,
+                        'win_rate': round(stat.won / stat.evaluations, 3) if stat.evaluations else None,
+                        'mean_ms': round(stat.total_ms / stat.evaluations, 3) if stat.evaluations else None,
+                        'time_histogram': dict(zip(labels, stat.time_histogram or [])),
+                    }
+                    for stat in stats
+                ],
+            })
+        return result
@@ -0,0 +1,191 @@
+import hashlib
+import tempfile
+import pypdfium2 as pdfium
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from ..models import InvoiceImport, InvoiceLineItem
+from .importer import ImportManager
+from .line_items import LineItemExtractor
+from reports.models import Report
+
+
+def segment_hash(file_hash, page_start, page_end):
+    """Hash da fatura de um lote: derivado do hash do lote e do intervalo de páginas (estável entre reprocessamentos)."""
+    return hashlib.sha256(f"{file_hash}:{page_start}-{page_end}".encode('utf-8')).hexdigest()
+
+
+class SegmentTracker:
+    """
+    Acompanha as páginas de um PDF, na ordem, e marca onde começa cada fatura. Alimentado pelo
+    fluxo de páginas de uma leitura que já acontece (ex: itens do detalhamento), sem reler o PDF.
+    """
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+        self.segments = []
+        self.current = None
+        self.page = 0
+
+    def feed(self, page_text):
+        self.page += 1
+        header = InvoiceSplitter._header(self.candidates, page_text)
+        if header is None or header == self.current:
+            return
+        if self.segments:
+            self.segments[-1]['page_end'] = self.page - 1
+        self.segments.append({'page_start': self.page if self.segments else 1, 'page_end': None, 'carrier': header[0]})
+        self.current = header
+
+    def finish(self):
+        """Faturas do PDF: [{'page_start', 'page_end', 'carrier'}] (vazio se nenhum cabeçalho for encontrado)."""
+        if self.segments:
+            self.segments[-1]['page_end'] = self.page
+        return self.segments
+
+
+class InvoiceSplitter:
+    """
+    Divide PDFs com várias faturas (lotes) em uma importação por fatura. Uma página com todos os
+    campos obrigatórios pelas regras primárias e identidade (número, vencimento) diferente da
+    fatura atual é o início de outra fatura. O cabeçalho repetido da mesma fatura (ex: boleto no
+    fim, subtotais de seção) não divide. Páginas antes do primeiro cabeçalho ficam com a primeira
+    fatura.
+
+    A importação mantém a parada antecipada (só as primeiras páginas são lidas); os cabeçalhos são
+    procurados na leitura de todas as páginas que a extração dos itens do detalhamento já faz
+    (SegmentTracker), e o PDF só é dividido se ela encontrar mais de uma fatura.
+
+    Cada parte vira um PDF próprio (pypdfium2, sem re-renderizar) em uma InvoiceImport filha com
+    `parent`, `page_start`/`page_end` e hash derivado; o lote fica com status SPLIT, o relatório
+    criado pela importação do lote é cancelado e seus itens são descartados (cada parte extrai os seus).
+    Escaneados não são divididos (não há camada de texto para achar os cabeçalhos).
+    """
+
+    def __init__(self):
+        self.parsers = ImportManager().parsers
+
+    def _candidates(self, carrier=None):
+        """Parsers a testar em cada página: o da operadora conhecida primeiro."""
+        carrier = (carrier or '').upper()
+        ordered = sorted(self.parsers.items(), key=lambda item: item[0] != carrier)
+        return [(key, parser) for key, parser in ordered if parser.rules is not None]
+
+    def tracker(self, invoice):
+        """SegmentTracker para a leitura das páginas de `invoice`, ou None se ela não pode ser um lote."""
+        if not getattr(settings, 'INVOICE_SPLIT_BUNDLES', True):
+            return None
+        if invoice.parent_id or invoice.pdf_kind == InvoiceImport.PdfKind.SCANNED:
+            return None
+        candidates = self._candidates(invoice.carrier)
+        return SegmentTracker(candidates) if candidates else None
+
+    def find_segments(self, source, carrier=None):
+        """Faturas do PDF, lendo todas as páginas (ver SegmentTracker.finish)."""
+        candidates = self._candidates(carrier)
+        if not candidates:
+            return []
+        tracker = SegmentTracker(candidates)
+        for page_text in LineItemExtractor.iter_pages(candidates[0][1], source):
+            tracker.feed(page_text)
+        return tracker.finish()
+
+    @staticmethod
+    def _header(candidates, page_text):
+        """(operadora, identidade da fatura) se a página for um cabeçalho de fatura, senão None."""
+        for key, parser in candidates:
+            header_key = parser.header_key(page_text)
+            if header_key is not None:
+                return key, header_key
+        return None
+
+    def split(self, invoice, source=None, segments=None):
+        """
+        Se a importação for um lote, cria (ou reaproveita) as importações filhas e marca o lote
+        como SPLIT. `segments` vem de uma leitura já feita (SegmentTracker); sem ele, o PDF é
+        lido aqui. Retorna as filhas, ou [] se o PDF tiver uma única fatura.
+        """
+        if not getattr(settings, 'INVOICE_SPLIT_BUNDLES', True):
+            return []
+        if invoice.parent_id or invoice.pdf_kind == InvoiceImport.PdfKind.SCANNED:
+            return []
+        if segments is not None and len(segments) < 2:
+            return []
+        # Relatório do lote já aprovado: a divisão fica para revisão manual
+        if invoice.report and invoice.report.status == Report.Status.APPROVED:
+            print(f"Aviso: Lote {invoice.id} com relatório aprovado não foi dividido.")
+            return []
+        if source is None:
+            source = invoice.file.path if invoice.file else invoice.file_path
+
+        try:
+            document = pdfium.PdfDocument(source)
+        except SoftTimeLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"Aviso: Falha ao abrir PDF para divisão: {e}")
+            return []
+
+        try:
+            if len(document) < getattr(settings, 'INVOICE_SPLIT_MIN_PAGES', 2):
+                return []
+            if segments is None:
+                try:
+                    segments = self.find_segments(source, invoice.carrier)
+                except SoftTimeLimitExceeded:
+                    raise
+                except Exception as e:
+                    print(f"Aviso: Falha ao procurar faturas no PDF: {e}")
+                    return []
+            if len(segments) < 2:
+                return []
+
+            with transaction.atomic():
+                children = [self._segment_import(invoice, document, segment) for segment in segments]
+                if invoice.report and invoice.report.status != Report.Status.CANCELED:
+                    invoice.report.status = Report.Status.CANCELED
+                    invoice.report.save(update_fields=['status', 'updated_at'])
+                InvoiceLineItem.objects.filter(invoice=invoice).delete()
+                invoice.status = InvoiceImport.Status.SPLIT
+                invoice.error_message = None
+                invoice.error_code = None
+                invoice.save(update_fields=['status', 'error_message', 'error_code'])
+            return children
+        finally:
+            document.close()
+
+    def _segment_import(self, invoice, document, segment):
+        start, end = segment['page_start'], segment['page_end']
+        file_hash = segment_hash(invoice.file_hash, start, end)
+        child, _ = InvoiceImport.objects.get_or_create(
+            file_hash=file_hash,
+            defaults={
+                'parent': invoice,
+                'page_start': start,
+                'page_end': end,
+                'file_path': f"{invoice.file_path}#p{start}-{end}",
+                'year': invoice.year,
+                'city': invoice.city,
+                'carrier': segment['carrier'] or invoice.carrier,
+                'month': invoice.month,
+                'status': InvoiceImport.Status.PROCESSING,
+            },
+        )
+        # O conteúdo da parte é determinado pelo hash: reprocessar o lote não regrava o arquivo
+        if not child.file:
+            with tempfile.TemporaryFile() as part_file:
+                self.write_pages(document, start, end, part_file)
+                part_file.seek(0)
+                child.file.save(f"{file_hash}.pdf", File(part_file), save=True)
+        return child
+
+    @staticmethod
+    def write_pages(document, page_start, page_end, dest):
+        """Grava as páginas [page_start, page_end] (a partir de 1) de `document` em um novo PDF."""
+        part = pdfium.PdfDocument.new()
+        try:
+            part.import_pages(document, pages=list(range(page_start - 1, page_end)))
+            part.save(dest)
+        finally:
+            part.close()
@@ -0,0 +1,71 @@
+import json
+import zlib
+from django.db import transaction
+from ..models import ExtractedText
+
+
+class ExtractedTextStore:
+    """
+    Armazenamento persistente (comprimido) do texto extraído por file_hash.
+    Usado como read-through por BaseInvoiceParser.extract_text.
+    """
+    COMPRESSION_LEVEL = 6
+
+    @staticmethod
+    def compress(context):
+        payload = {
+            'text': context.text,
+            'page_texts': context.page_texts,
+            'page_methods': context.page_methods,
+            'ocr_texts': context.ocr_texts,
+            'ocr_dpi': context.ocr_dpi,
+            'ocr_duration_ms': context.ocr_duration_ms,
+        }
+        return zlib.compress(json.dumps(payload).encode('utf-8'), ExtractedTextStore.COMPRESSION_LEVEL)
+
+    @staticmethod
+    def decompress(content):
+        return json.loads(zlib.decompress(bytes(content)).decode('utf-8'))
+
+    @staticmethod
+    def load(context):
+        """Preenche o contexto com o texto armazenado. Retorna True se encontrou."""
+        if not context.file_hash:
+            return False
+
+        stored = ExtractedText.objects.filter(file_hash=context.file_hash).first()
+        if not stored:
+            return False
+
+        payload = ExtractedTextStore.decompress(stored.content)
+        context.text = payload.get('text') or ""
+        context.page_texts = payload.get('page_texts') or []
+        context.page_methods = payload.get('page_methods') or []
+        context.ocr_texts = payload.get('ocr_texts') or []
+        context.ocr_dpi = payload.get('ocr_dpi')
+        context.ocr_duration_ms = payload.get('ocr_duration_ms')
+        context.method = stored.method
+        context.engine_version = stored.engine_version
+        context.complete = stored.is_complete
+        context.from_store = True
+        return True
+
+    @staticmethod
+    def save(context):
+        """Persiste a extração do contexto. Extrações vazias não são guardadas (podem ser falhas transitórias)."""
+        if not context.file_hash or not context.text or not context.text.strip():
+            return None
+
+        with transaction.atomic():
+            stored, _ = ExtractedText.objects.update_or_create(
+                file_hash=context.file_hash,
+                defaults={
+                    'method': context.method or ExtractedText.Method.TEXT,
+                    'engine_version': context.engine_version or '',
+                    'page_count': len(context.page_texts if context.method in (ExtractedText.Method.TEXT, ExtractedText.Method.HYBRID) else context.ocr_texts),
+                    'text_length': len(context.text),
+                    'is_complete': context.complete,
+                    'content': ExtractedTextStore.compress(context),
+                }
+            )
+        return stored
@@ -1,13 +1,23 @@
 from celery import shared_task
+from celery.exceptions import SoftTimeLimitExceeded
+from django.conf import settings
 from django.db import transaction
 from .models import InvoiceImport
 from .services.importer import ImportManager
+from .services.reparser import InvoiceReparser
+from .services.routing import InvoiceRouter
+from .services.splitter import InvoiceSplitter
 from audit.services import AuditService
 from audit.models import AuditLog
 from django.forms.models import model_to_dict
 import os
 
-@shared_task(bind=True)
+@shared_task(
+    bind=True,
+    # Soft: a fatura vai para revisão e o slot do worker é liberado; hard: o processo é morto
+    soft_time_limit=getattr(settings, 'INVOICE_TASK_SOFT_TIME_LIMIT', 240),
+    time_limit=getattr(settings, 'INVOICE_TASK_TIME_LIMIT', 270),
+)
 def process_invoice_task(self, invoice_import_id, user_id=None):
     """
     Task to process an uploaded invoice automatically.
@@ -39,9 +49,32 @@ def process_invoice_task(self, invoice_import_id, user_id=None):
 
         # Pass invoice instance to avoid duplicate lookups/race conditions
         status, msg = importer.process_invoice(file_path, user=user, invoice_instance=invoice)
+
+        # Detalhamento (itens) e procura de outras faturas no PDF (lotes) fora desta task: faturas
+        # de centenas de páginas não seguram o slot, e a importação mantém a parada antecipada
+        if status in (InvoiceImport.Status.SUCCESS, InvoiceImport.Status.PENDING_REVIEW):
+            priority = (self.request.delivery_info or {}).get('priority')
+            manual = priority == InvoiceRouter.priority_for(manual=True)
+            try:
+                InvoiceRouter.dispatch_line_items(invoice, user_id, manual=manual)
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception as e:
+                print(f"Aviso: Falha ao enfileirar itens da fatura {invoice.id}: {e}")
         
         return f"Processed {invoice.id}: {status}"
 
+    except SoftTimeLimitExceeded:
+        # Estourou o tempo da task apesar do orçamento de OCR: revisão manual, sem re-tentar.
+        # Os `except Exception` do caminho da task (extração, OCR, fingerprint...) re-levantam
+        # SoftTimeLimitExceeded para que ele chegue aqui.
+        if invoice:
+            invoice.status = InvoiceImport.Status.PENDING_REVIEW
+            invoice.error_message = "Processamento interrompido pelo limite de tempo da tarefa."
+            invoice.error_code = 'TASK_TIMEOUT'
+            invoice.save(update_fields=["status", "error_message", "error_code"])
+        return f"Processed {invoice_import_id}: TIMEOUT"
+
     except Exception as e:
         # Fail handler
         # Fail handler
@@ -51,3 +84,42 @@ def process_invoice_task(self, invoice_import_id, user_id=None):
             invoice.error_code = 'CRITICAL_TASK_FAILURE'
             invoice.save(update_fields=["status", "error_message", "error_code"])
         raise e
+
+@shared_task
+def reparse_invoices_task(invoice_ids, user_id=None, dry_run=False):
+    """
+    Re-parse de um lote de faturas a partir do texto armazenado (sem PDF/OCR).
+    Retorna o resumo das mudanças do lote.
+    """
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    user = User.objects.filter(pk=user_id).first() if user_id else None
+
+    return InvoiceReparser().reparse(invoice_ids, user=user, dry_run=dry_run)
+
+
+@shared_task(
+    soft_time_limit=getattr(settings, 'INVOICE_TASK_SOFT_TIME_LIMIT', 240),
+    time_limit=getattr(settings, 'INVOICE_TASK_TIME_LIMIT', 270),
+)
+def extract_line_items_task(invoice_import_id, user_id=None, manual=False):
+    """
+    Extrai os itens do detalhamento (InvoiceLineItem) de uma fatura já importada. Na mesma
+    leitura das páginas, procura outras faturas no PDF: um lote é dividido e cada parte
+    ganha a sua task de importação.
+    """
+    from .services.line_items import LineItemExtractor
+
+    invoice = InvoiceImport.objects.filter(pk=invoice_import_id).first()
+    if invoice is None:
+        return f"Line items {invoice_import_id}: NOT_FOUND"
+    splitter = InvoiceSplitter()
+    tracker = splitter.tracker(invoice)
+    count = LineItemExtractor().extract(invoice, tracker=tracker)
+
+    children = splitter.split(invoice, segments=tracker.finish()) if tracker is not None else []
+    if children:
+        for child in children:
+            InvoiceRouter.dispatch(child, user_id, manual=manual)
+        return f"Line items {invoice_import_id}: {InvoiceImport.Status.SPLIT} ({len(children)})"
+    return f"Line items {invoice_import_id}: {count}"
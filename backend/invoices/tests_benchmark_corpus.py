@@ -0,0 +1,53 @@
+import io
+import os
+import tempfile
+import pdfplumber
+from django.test import TestCase
+from unittest.mock import patch
+from .benchmarks import pipeline
+from .benchmarks.corpus import make_invoice
+from .models import ExtractedText, InvoiceImport
+from .services.importer import ImportManager
+from .services.routing import PdfClassifier
+
+
+class SyntheticCorpusTests(TestCase):
+    def test_page_count_and_kind(self):
+        for kind, expected_kind in (('digital', 'TEXT'), ('scanned', 'SCANNED'), ('mixed', 'SCANNED')):
+            with self.subTest(kind=kind):
+                content, _ = make_invoice('CLARO', kind, 3)
+                with pdfplumber.open(io.BytesIO(content)) as pdf:
+                    self.assertEqual(len(pdf.pages), 3)
+                    # Mista: capa escaneada, detalhamento com camada de texto
+                    self.assertEqual(bool(pdf.pages[2].extract_text()), kind != 'scanned')
+                self.assertEqual(PdfClassifier().classify(io.BytesIO(content))['kind'], expected_kind)
+
+    def test_same_seed_same_document(self):
+        self.assertEqual(make_invoice('VIVO', 'digital', 2, seed=7), make_invoice('VIVO', 'digital', 2, seed=7))
+
+    def test_digital_cases_are_read_without_touching_the_database(self):
+        with patch('builtins.print'):
+            results = pipeline.run(kinds=['digital'], page_counts=[1, 10], repeat=1)
+
+        self.assertEqual(len(results['cases']), 4)
+        for case in results['cases']:
+            self.assertEqual(case['field_accuracy'], 1.0, case)
+            self.assertEqual(set(case['timings_ms']), set(pipeline.STAGES) | {'total'})
+            self.assertGreater(case['memory']['text_peak_mb'], 0)
+        self.assertFalse(InvoiceImport.objects.exists())
+        self.assertFalse(ExtractedText.objects.exists())
+
+    def test_text_extraction_memory_does_not_grow_with_page_count(self):
+        parser = ImportManager().parsers['CLARO']
+        # Sem parada antecipada: o documento inteiro é lido
+        parser.full_document = True
+        peaks = {}
+        with tempfile.TemporaryDirectory() as workdir, patch('builtins.print'):
+            for pages in (2, 20):
+                path = os.path.join(workdir, f"{pages}.pdf")
+                with open(path, 'wb') as f:
+                    f.write(make_invoice('CLARO', 'digital', pages)[0])
+                peaks[pages] = pipeline.measure_memory(parser, path, 'CLARO')['text_peak_mb']
+
+        # Páginas liberadas após a leitura: o pico é o de uma página, não do documento
+        self.assertLess(peaks[20], peaks[2] * 3)
@@ -0,0 +1,75 @@
+import io
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from unittest.mock import patch, MagicMock
+from .parsers.context import ExtractionContext
+from .services.fingerprint import CarrierFingerprinter
+from .tests_routing import make_text_pdf
+
+
+def plumber_pdf(page_texts):
+    pages = []
+    for text in page_texts:
+        page = MagicMock()
+        page.extract_text.return_value = text
+        pages.append(page)
+    pdf = MagicMock()
+    pdf.pages = pages
+    pdf.__enter__.return_value = pdf
+    return pdf
+
+
+@override_settings(INVOICE_TEXT_BACKENDS=['pdfplumber'])
+class CarrierFingerprinterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.fingerprinter = CarrierFingerprinter()
+
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    def test_byte_signature_skips_text_extraction(self, mock_open):
+        pdf = io.BytesIO(make_text_pdf(["CLARO S.A.", "Total a pagar R$ 10,00"]))
+
+        self.assertEqual(self.fingerprinter.identify(pdf, "hash-bytes"), 'CLARO')
+        mock_open.assert_not_called()
+        self.assertEqual(pdf.tell(), 0)
+
+    def test_metadata_producer(self):
+        content = make_text_pdf(["Fatura"]).replace(
+            b"/Root 1 0 R", b"/Root 1 0 R /Info << /Producer (Telefonica Brasil) >>"
+        )
+        self.assertEqual(self.fingerprinter.from_metadata(io.BytesIO(content)), {'VIVO'})
+
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    def test_first_page_is_reused_by_extraction(self, mock_open):
+        pdf = plumber_pdf(["VIVO EMPRESAS Fatura", "Total a pagar R$ 150,00"])
+        mock_open.return_value = pdf
+        context = ExtractionContext("hash-page")
+
+        self.assertEqual(self.fingerprinter.identify(io.BytesIO(b"%PDF-1.4 comprimido"), "hash-page", context), 'VIVO')
+        self.assertEqual(context.page_texts, ["VIVO EMPRESAS Fatura"])
+        pdf.pages[1].extract_text.assert_not_called()
+
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    def test_ambiguous_result_is_cached(self, mock_open):
+        mock_open.return_value = plumber_pdf(["VIVO e CLARO"])
+        source = io.BytesIO(b"%PDF-1.4 comprimido")
+
+        self.assertIsNone(self.fingerprinter.identify(source, "hash-ambiguous"))
+        self.assertIsNone(self.fingerprinter.identify(source, "hash-ambiguous"))
+        self.assertEqual(mock_open.call_count, 1)
+
+    @patch('invoices.parsers.backends.pdfplumber.open', side_effect=Exception("PDF sem camada de texto"))
+    def test_failed_backend_is_recorded(self, mock_open):
+        context = ExtractionContext()
+        self.assertIsNone(self.fingerprinter.identify(io.BytesIO(b"%PDF-1.4"), context=context))
+        self.assertEqual(context.failed_backends, {'pdfplumber'})
+
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    def test_ambiguous_result_after_backend_failure_is_not_cached(self, mock_open):
+        mock_open.side_effect = [Exception("storage indisponível"), plumber_pdf(["VIVO EMPRESAS Fatura"])]
+        source = io.BytesIO(b"%PDF-1.4 comprimido")
+
+        self.assertIsNone(self.fingerprinter.identify(source, "hash-transient"))
+        self.assertEqual(self.fingerprinter.identify(source, "hash-transient"), 'VIVO')
+        self.assertEqual(self.fingerprinter.identify(source, "hash-transient"), 'VIVO')
+        self.assertEqual(mock_open.call_count, 2)
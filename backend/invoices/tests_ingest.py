@@ -0,0 +1,142 @@
+import hashlib
+import io
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from unittest.mock import patch
+from rest_framework.test import APIClient
+from .models import InvoiceImport
+from .services.ingest import UploadIngestor
+from .benchmarks.corpus import PdfWriter
+
+
+class CountingFile(io.BytesIO):
+    """Registra o tamanho de cada leitura."""
+
+    def __init__(self, content):
+        super().__init__(content)
+        self.reads = []
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.reads.append(len(data))
+        return data
+
+
+class RemoteStorage(Storage):
+    """Storage sem caminho local (como S3), em um dicionário."""
+
+    def __init__(self):
+        self.files = {}
+
+    def _save(self, name, content):
+        self.files[name] = b"".join(content.chunks())
+        return name
+
+    def _open(self, name, mode='rb'):
+        return ContentFile(self.files[name], name=name)
+
+    def exists(self, name):
+        return name in self.files
+
+
+class UploadIngestorTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.storage = FileSystemStorage(location=self.media.name)
+        self.content = os.urandom(3 * UploadIngestor.CHUNK_SIZE + 10)
+
+    def tearDown(self):
+        self.media.cleanup()
+
+    def stored_files(self):
+        return [name for _, _, files in os.walk(self.media.name) for name in files]
+
+    def test_hash_and_store_in_one_read(self):
+        upload = CountingFile(self.content)
+
+        ingested = UploadIngestor(self.storage).ingest(upload)
+
+        file_hash = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual((ingested.file_hash, ingested.size), (file_hash, len(self.content)))
+        self.assertTrue(ingested.name.startswith('invoices/'))
+        self.assertTrue(ingested.name.endswith(f"{file_hash}.pdf"))
+        with self.storage.open(ingested.name) as f:
+            self.assertEqual(f.read(), self.content)
+        # Uma única passada, em blocos
+        self.assertEqual(sum(upload.reads), len(self.content))
+        self.assertLessEqual(max(upload.reads), UploadIngestor.CHUNK_SIZE)
+        self.assertEqual(self.stored_files(), [f"{file_hash}.pdf"])
+
+    def test_same_content_keeps_one_file(self):
+        first = UploadIngestor(self.storage).ingest(io.BytesIO(self.content))
+        second = UploadIngestor(self.storage).ingest(SimpleUploadedFile("b.pdf", self.content))
+        self.assertEqual(first.name, second.name)
+        self.assertEqual(len(self.stored_files()), 1)
+
+    def test_failed_read_leaves_no_partial_file(self):
+        upload = CountingFile(self.content)
+        upload.read = lambda size=-1: (_ for _ in ()).throw(OSError("conexão interrompida"))
+
+        with self.assertRaises(OSError):
+            UploadIngestor(self.storage).ingest(upload)
+        self.assertEqual(self.stored_files(), [])
+
+    def test_storage_without_local_path(self):
+        storage = RemoteStorage()
+
+        with patch.object(storage, 'save', wraps=storage.save) as mock_save:
+            first = UploadIngestor(storage).ingest(io.BytesIO(self.content))
+            second = UploadIngestor(storage).ingest(io.BytesIO(self.content))
+
+        mock_save.assert_called_once()
+        self.assertEqual(first.name, second.name)
+        self.assertEqual(first.file_hash, hashlib.sha256(self.content).hexdigest())
+        with storage.open(first.name) as f:
+            self.assertEqual(f.read(), self.content)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@patch('invoices.tasks.process_invoice_task.apply_async')
+class UploadViewIngestTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(username='analista', email='a@x.com', password='password', role='ANALISTA')
+        )
+        writer = PdfWriter()
+        writer.add_text_page(["VIVO EMPRESAS"] * 20)
+        self.content = writer.getvalue()
+
+    def upload(self):
+        upload = SimpleUploadedFile("fatura.pdf", self.content, content_type="application/pdf")
+        return self.client.post(reverse('invoice-upload'), {'file': upload}, format='multipart')
+
+    def test_upload_is_stored_under_its_hash(self, mock_async):
+        with patch('invoices.services.importer.ImportManager.get_file_hash') as mock_hash:
+            response = self.upload()
+
+        self.assertEqual(response.status_code, 202, response.data)
+        mock_hash.assert_not_called()
+        invoice = InvoiceImport.objects.get(pk=response.data['id'])
+        file_hash = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(invoice.file_hash, file_hash)
+        self.assertEqual(os.path.basename(invoice.file.name), f"{file_hash}.pdf")
+        with invoice.file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        mock_async.assert_called_once()
+
+    def test_reupload_reuses_import_and_file(self, mock_async):
+        first = self.upload()
+        second = self.upload()
+
+        self.assertEqual(first.data['id'], second.data['id'])
+        invoice = InvoiceImport.objects.get()
+        self.assertEqual(invoice.status, InvoiceImport.Status.PROCESSING)
+        self.assertEqual(os.listdir(os.path.dirname(invoice.file.path)), [os.path.basename(invoice.file.name)])
@@ -0,0 +1,126 @@
+import io
+import pdfplumber
+from datetime import date
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from unittest.mock import patch
+from .models import ExtractedText, InvoiceImport, LayoutTemplate
+from .parsers.context import ExtractionContext
+from .parsers.vivo import VivoParser
+from .services.importer import ImportManager
+from .services.layouts import LayoutTemplateRegistry
+from .services.text_store import ExtractedTextStore
+from .tests_routing import make_text_pdf
+
+
+def vivo_invoice(total, due, number, header=()):
+    return make_text_pdf(list(header) + [
+        "VIVO EMPRESAS",
+        f"Conta No. {number}",
+        f"Total a pagar R$ {total}",
+        f"Vencimento {due}",
+        "Detalhamento de ligacoes",
+    ])
+
+
+class LayoutTemplateRegistryTests(TestCase):
+    def setUp(self):
+        self.registry = LayoutTemplateRegistry()
+        self.parser = VivoParser()
+
+    def learn(self):
+        pdf = io.BytesIO(vivo_invoice("150,00", "10/12/2026", "123456"))
+        data = self.parser.parse(pdf)
+        self.assertEqual(data['confidence'], 100)
+        return self.registry.learn(pdf, self.parser, data)
+
+    def test_learns_layout_once(self):
+        template = self.learn()
+
+        self.assertEqual(template.carrier, 'VIVO')
+        self.assertEqual((template.page_width, template.page_height), (595, 842))
+        self.assertEqual(sorted(a['text'] for a in template.anchors), ['conta no.', 'total a pagar', 'vencimento'])
+        self.learn()
+        self.assertEqual(LayoutTemplate.objects.count(), 1)
+
+    def test_same_layout_is_read_by_crops(self):
+        self.learn()
+        pdf = io.BytesIO(vivo_invoice("1.234,56", "05/01/2027", "987654"))
+
+        data = self.registry.extract(pdf, self.parser)
+
+        self.assertEqual(data['total_value'], Decimal('1234.56'))
+        self.assertEqual(data['due_date'], date(2027, 1, 5))
+        self.assertEqual(data['invoice_number'], "987654")
+        self.assertEqual(LayoutTemplate.objects.get().hits, 1)
+
+    def test_other_layout_is_not_matched(self):
+        self.learn()
+        pdf = io.BytesIO(vivo_invoice("99,90", "05/01/2027", "987654", header=["Aviso importante"] * 3))
+
+        self.assertIsNone(self.registry.extract(pdf, self.parser))
+
+    def test_value_is_located_by_whole_token(self):
+        words = [
+            {'text': '110,00', 'x0': 10, 'top': 100, 'x1': 40, 'bottom': 112},
+            {'text': '10,00.', 'x0': 10, 'top': 300, 'x1': 40, 'bottom': 312},
+        ]
+        self.assertEqual(self.registry._locate_value(words, Decimal('10.00')), (10, 300, 40, 312))
+        self.assertIsNone(self.registry._locate_value(words[:1], Decimal('10.00')))
+
+    def test_value_box_margin_follows_line_height(self):
+        template = self.learn()
+        with pdfplumber.open(io.BytesIO(vivo_invoice("150,00", "10/12/2026", "123456"))) as pdf:
+            word = next(w for w in pdf.pages[0].extract_words() if w['text'] == '150,00')
+        line_height = word['bottom'] - word['top']
+
+        _, y0, _, y1 = template.fields['total_value']['box']
+        # Meia linha acima e abaixo da palavra do valor
+        self.assertAlmostEqual((y1 - y0) * template.page_height, 2 * line_height, delta=0.2)
+
+    def test_rules_version_bump_invalidates_templates(self):
+        self.learn()
+        pdf = io.BytesIO(vivo_invoice("1.234,56", "05/01/2027", "987654"))
+
+        with patch.object(VivoParser, 'rules_version', 2):
+            self.assertIsNone(self.registry.extract(pdf, VivoParser()))
+
+    def test_only_primary_reads_are_learnable(self):
+        context = ExtractionContext()
+        data = self.parser.parse(None, text="Conta No. 123456 Total a pagar R$ 150,00 Vencimento 10/12/2026", context=context)
+        self.assertTrue(self.registry.can_learn(self.parser, data, context.rule_matches))
+
+        # Vencimento só pelo fallback ("Venc."): confiança 80, mas não ensina layout
+        with patch('builtins.print'):
+            data = self.parser.parse(None, text="Conta No. 123456 Total a pagar R$ 150,00 Venc. 10/12/2026", context=context)
+        self.assertEqual(data['confidence'], 80)
+        self.assertFalse(self.registry.can_learn(self.parser, data, context.rule_matches))
+        self.assertFalse(self.registry.can_learn(self.parser, data, None))
+
+    @patch('invoices.services.layouts.pdfplumber.open')
+    def test_no_templates_does_not_open_pdf(self, mock_open):
+        self.assertIsNone(self.registry.extract(io.BytesIO(b"%PDF"), self.parser))
+        mock_open.assert_not_called()
+
+
+class LayoutImportTests(TestCase):
+    def test_second_invoice_skips_text_extraction(self):
+        importer = ImportManager()
+        metadata = {'year': 2026, 'city': 'X', 'month': 'Dez', 'carrier': 'VIVO'}
+        first = SimpleUploadedFile("a.pdf", vivo_invoice("150,00", "10/12/2026", "123456"))
+        self.assertEqual(importer.process_invoice(first, metadata=metadata)[0], 'SUCCESS')
+        self.assertEqual(LayoutTemplate.objects.count(), 1)
+
+        second = SimpleUploadedFile("b.pdf", vivo_invoice("89,90", "10/01/2027", "654321"))
+        with patch.object(VivoParser, 'extract_text') as mock_extract:
+            status, msg = importer.process_invoice(second, metadata={**metadata, 'month': 'Jan'})
+
+        self.assertEqual(status, 'SUCCESS', msg)
+        mock_extract.assert_not_called()
+        imp = InvoiceImport.objects.get(invoice_number="654321")
+        self.assertEqual(imp.total_value, Decimal('89.90'))
+        # Texto da página 1 guardado para o reparse
+        stored = ExtractedText.objects.get(file_hash=imp.file_hash)
+        self.assertIn("654321", ExtractedTextStore.decompress(stored.content)['text'])
+        self.assertTrue(stored.is_complete)
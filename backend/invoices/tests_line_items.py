@@ -0,0 +1,122 @@
+import os
+import tempfile
+from decimal import Decimal
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from unittest.mock import patch
+from .benchmarks.corpus import make_invoice
+from .models import InvoiceImport, InvoiceLineItem
+from .services.line_items import LineItemExtractor, duration_seconds
+from .tasks import process_invoice_task
+from .tests_routing import make_text_pdf
+
+
+class LineItemExtractorTests(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.invoice = InvoiceImport.objects.create(
+            file_path="x.pdf", file_hash="hash-items", year=2026, city="X", carrier="VIVO", month="Out"
+        )
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def write(self, content):
+        path = os.path.join(self.workdir.name, "fatura.pdf")
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_detail_lines_of_every_page(self):
+        path = self.write(make_text_pdf([
+            "VIVO EMPRESAS",
+            "Total a pagar R$ 150,00",
+            "11 99999-0000 Ligacao local 00:01:23 R$ 0,10",
+            "(11) 3333-4444 Assinatura mensal R$ 1.234,56",
+        ]))
+
+        self.assertEqual(LineItemExtractor().extract(self.invoice, path), 2)
+
+        call, subscription = InvoiceLineItem.objects.filter(invoice=self.invoice)
+        self.assertEqual((call.page, call.position, call.access), (1, 1, "11 99999-0000"))
+        self.assertEqual((call.description, call.duration_seconds, call.amount), ("Ligacao local", 83, Decimal('0.10')))
+        self.assertEqual((subscription.access, subscription.duration_seconds), ("(11) 3333-4444", None))
+        self.assertEqual(subscription.amount, Decimal('1234.56'))
+
+    def test_large_bill_is_written_in_batches(self):
+        content, _ = make_invoice('VIVO', 'digital', 12)
+        path = self.write(content)
+
+        with CaptureQueriesContext(connection) as queries:
+            created = LineItemExtractor(batch_size=100).extract(self.invoice, path)
+
+        # 40 linhas por página; capa e rodapé não são itens
+        self.assertEqual(created, 12 * 40)
+        inserts = [query for query in queries.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 5)
+        self.assertEqual(InvoiceLineItem.objects.filter(invoice=self.invoice, page=12).count(), 40)
+
+    def test_pages_are_read_while_writing(self):
+        content, _ = make_invoice('CLARO', 'digital', 4)
+        path = self.write(content)
+        self.invoice.carrier = 'CLARO'
+        events = []
+        extractor = LineItemExtractor(batch_size=40)
+        read_pages = extractor.iter_pages
+
+        def pages(parser, source):
+            for page_text in read_pages(parser, source):
+                events.append('page')
+                yield page_text
+
+        with patch.object(extractor, 'iter_pages', side_effect=pages), \
+                patch.object(extractor, '_write', side_effect=lambda batch: events.append('write') or len(batch)):
+            extractor.extract(self.invoice, path)
+
+        # Cada lote é gravado antes da leitura da página seguinte
+        self.assertEqual(events, ['page', 'write'] * 4)
+
+    def test_reextraction_replaces_items(self):
+        path = self.write(make_text_pdf(["11 99999-0000 00:01:00 R$ 0,50"]))
+        LineItemExtractor().extract(self.invoice, path)
+        LineItemExtractor().extract(self.invoice, path)
+        self.assertEqual(InvoiceLineItem.objects.filter(invoice=self.invoice).count(), 1)
+
+    def test_scanned_pages_and_unknown_carriers_have_no_items(self):
+        content, _ = make_invoice('VIVO', 'mixed', 2)
+        path = self.write(content)
+        self.assertEqual(LineItemExtractor().extract(self.invoice, path), 40)
+
+        self.invoice.carrier = 'OUTROS'
+        self.assertEqual(LineItemExtractor().extract(self.invoice, path), 0)
+
+    def test_duration(self):
+        self.assertEqual(duration_seconds("01:02:03"), 3723)
+        self.assertIsNone(duration_seconds(None))
+
+
+class LineItemTaskTests(TestCase):
+    def setUp(self):
+        self.invoice = InvoiceImport.objects.create(
+            file_path="x.pdf", file="invoices/x.pdf", file_hash="hash-task", year=2026, city="X", carrier="VIVO", month="Out"
+        )
+
+    @patch('invoices.tasks.extract_line_items_task.apply_async')
+    def test_imported_invoice_queues_line_items(self, mock_async):
+        with patch('invoices.tasks.ImportManager.process_invoice', return_value=(InvoiceImport.Status.SUCCESS, "ok")):
+            process_invoice_task.apply(args=[self.invoice.id]).get()
+
+        mock_async.assert_called_once()
+        self.assertEqual(mock_async.call_args.kwargs['args'], [self.invoice.id, None, False])
+        self.assertEqual(mock_async.call_args.kwargs['queue'], 'text')
+
+    @override_settings(INVOICE_LINE_ITEMS=False, INVOICE_SPLIT_BUNDLES=False)
+    @patch('invoices.tasks.extract_line_items_task.apply_async')
+    def test_disabled_or_failed_import_does_not_queue(self, mock_async):
+        with patch('invoices.tasks.ImportManager.process_invoice', return_value=(InvoiceImport.Status.SUCCESS, "ok")):
+            process_invoice_task.apply(args=[self.invoice.id]).get()
+        with self.settings(INVOICE_LINE_ITEMS=True), \
+                patch('invoices.tasks.ImportManager.process_invoice', return_value=("FAILED", "erro")):
+            process_invoice_task.apply(args=[self.invoice.id]).get()
+        mock_async.assert_not_called()
@@ -0,0 +1,402 @@
+import io
+import os
+import tempfile
+import time
+from decimal import Decimal
+import numpy as np
+from PIL import Image, ImageDraw
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from unittest.mock import patch
+from .parsers.ocr import OcrBudget, OcrExecutor, OcrRegion
+from .parsers.engines import TesserocrEngine, PytesseractEngine, get_ocr_engine
+from unittest.mock import MagicMock
+from .benchmarks.corpus import make_invoice
+from .models import ExtractedText
+from .tasks import process_invoice_task
+from celery.exceptions import SoftTimeLimitExceeded
+from .parsers.preprocessing import ImagePreprocessor
+from .parsers.context import ExtractionContext
+from .parsers.vivo import VivoParser
+from .models import InvoiceImport, Report
+from .services.importer import ImportManager
+
+
+def fake_convert(path, first_page, last_page, **kwargs):
+    return [f"img-{first_page}"]
+
+
+def slow_ocr(image, lang, **kwargs):
+    # Páginas iniciais demoram mais: terminam fora de ordem
+    number = int(image.split('-')[1])
+    time.sleep(0.02 * (5 - number))
+    return f"pagina {number}"
+
+
+@patch('invoices.parsers.engines.pytesseract.image_to_string', side_effect=slow_ocr)
+@patch('invoices.parsers.ocr.convert_from_path', side_effect=fake_convert)
+@patch('invoices.parsers.ocr.pdfinfo_from_path', return_value={'Pages': 4})
+class OcrExecutorTests(SimpleTestCase):
+    def test_pages_keep_document_order(self, mock_info, mock_convert, mock_ocr):
+        executor = OcrExecutor(max_pages=0, pool=ThreadPoolExecutor(max_workers=4))
+        self.assertEqual(executor.run("fake.pdf"), ["pagina 1", "pagina 2", "pagina 3", "pagina 4"])
+
+    @override_settings(INVOICE_OCR_MAX_PAGES=2)
+    def test_max_pages_setting(self, mock_info, mock_convert, mock_ocr):
+        self.assertEqual(OcrExecutor().run("fake.pdf"), ["pagina 1", "pagina 2"])
+        self.assertEqual(mock_convert.call_count, 2)
+
+    def test_upload_is_written_once(self, mock_info, mock_convert, mock_ocr):
+        upload = io.BytesIO(b"%PDF-1.4 fake")
+        executor = OcrExecutor(max_pages=3, pool=ThreadPoolExecutor(max_workers=2))
+        self.assertEqual(len(executor.run(upload)), 3)
+        paths = {call.args[0] for call in mock_convert.call_args_list}
+        self.assertEqual(len(paths), 1)
+        self.assertEqual(upload.tell(), 0)
+
+    @override_settings(INVOICE_OCR_MAX_PAGES=2, INVOICE_OCR_PREPROCESS=False)
+    def test_parser_joins_pages_in_order(self, mock_info, mock_convert, mock_ocr):
+        text = VivoParser().extract_text_via_ocr("fake.pdf")
+        self.assertEqual(text, "pagina 1\npagina 2\n")
+
+
+def region_data(conf):
+    return {'text': ['', '150,00', '10/12/2026', '123456789'], 'conf': [-1, conf, conf, conf]}
+
+
+@patch('invoices.parsers.backends.pdfplumber.open', side_effect=Exception("PDF escaneado"))
+@patch('invoices.parsers.ocr.pdfinfo_from_path', return_value={'Pages': 2})
+@patch('invoices.parsers.ocr.convert_from_path', return_value=[Image.new('L', (850, 1100), 255)])
+@patch('invoices.parsers.engines.pytesseract.image_to_string', return_value="VIVO pagina inteira")
+@override_settings(INVOICE_OCR_DPI_TIERS=[300])
+class RegionOcrTests(SimpleTestCase):
+    @patch('invoices.parsers.engines.pytesseract.image_to_data', return_value=region_data(92))
+    def test_known_carrier_uses_regions_only(self, mock_data, mock_string, mock_convert, mock_info, mock_open):
+        context = ExtractionContext(carrier='VIVO')
+        data = VivoParser().parse("fake.pdf", context=context)
+
+        mock_string.assert_not_called()
+        self.assertEqual(mock_data.call_count, len(VivoParser.ocr_regions))
+        self.assertEqual(context.method, ExtractionContext.METHOD_OCR_REGIONS)
+        self.assertEqual(data['total_value'], Decimal('150.00'))
+        self.assertEqual(str(data['due_date']), "2026-12-10")
+        self.assertEqual(data['invoice_number'], "123456789")
+        self.assertIn('tessedit_char_whitelist', mock_data.call_args.kwargs['config'])
+
+    @patch('invoices.parsers.engines.pytesseract.image_to_data', return_value=region_data(40))
+    def test_low_confidence_falls_back_to_full_page(self, mock_data, mock_string, mock_convert, mock_info, mock_open):
+        context = ExtractionContext(carrier='VIVO')
+        text = VivoParser().extract_text("fake.pdf", context=context)
+
+        self.assertEqual(mock_string.call_count, 2)
+        self.assertEqual(context.method, ExtractionContext.METHOD_OCR)
+        self.assertIn("pagina inteira", text)
+
+    @patch('invoices.parsers.engines.pytesseract.image_to_data', return_value={
+        'text': ['150,00', '01/12/2026', '10/12/2026', '123456789'], 'conf': [92, 92, 92, 92],
+    })
+    def test_ambiguous_zone_falls_back_to_full_page(self, mock_data, mock_string, mock_convert, mock_info, mock_open):
+        # Emissão e vencimento na mesma zona: nenhuma das datas vira "Vencimento ..."
+        context = ExtractionContext(carrier='VIVO')
+        VivoParser().extract_text("fake.pdf", context=context)
+
+        self.assertEqual(context.method, ExtractionContext.METHOD_OCR)
+        self.assertEqual(mock_string.call_count, 2)
+
+    def test_region_lines_need_a_single_value(self, mock_string, mock_convert, mock_info, mock_open):
+        region = OcrRegion('due_date', (0, 0, 1, 1), 'Vencimento', r'(\d{2}/\d{2}/\d{4})')
+        self.assertEqual(region.lines("10/12/2026 10/12/2026"), ["Vencimento 10/12/2026"])
+        self.assertEqual(region.lines("01/12/2026 10/12/2026"), [])
+        self.assertEqual(region.lines("sem data"), [])
+
+    @patch('invoices.parsers.engines.pytesseract.image_to_data', return_value=region_data(92))
+    def test_unknown_carrier_uses_full_page(self, mock_data, mock_string, mock_convert, mock_info, mock_open):
+        VivoParser().extract_text("fake.pdf", context=ExtractionContext())
+        mock_data.assert_not_called()
+        self.assertEqual(mock_string.call_count, 2)
+
+
+GOOD_SCAN = "VIVO Fatura número 555 Vencimento 10/12/2026 Total a pagar R$ 99,90"
+NOISY_SCAN = "VIV0 Fatvra n0mero ... Venc1mento l0/l2/2O26"
+
+
+def ocr_by_dpi(texts):
+    def ocr(image, lang, **kwargs):
+        return texts[image]
+    return ocr
+
+
+@patch('invoices.parsers.backends.pdfplumber.open', side_effect=Exception("PDF escaneado"))
+@patch('invoices.parsers.ocr.pdfinfo_from_path', return_value={'Pages': 1})
+@patch('invoices.parsers.ocr.convert_from_path', side_effect=lambda path, dpi, **kwargs: [dpi])
+@override_settings(INVOICE_OCR_DPI_TIERS=[150, 300], INVOICE_OCR_PREPROCESS=False)
+class AdaptiveDpiTests(TestCase):
+    def test_clean_scan_stays_on_cheapest_tier(self, mock_convert, mock_info, mock_open):
+        with patch('invoices.parsers.engines.pytesseract.image_to_string', side_effect=ocr_by_dpi({150: GOOD_SCAN})):
+            context = ExtractionContext()
+            VivoParser().extract_text("fake.pdf", context=context)
+
+        self.assertEqual(context.ocr_dpi, 150)
+        self.assertEqual([call.kwargs['dpi'] for call in mock_convert.call_args_list], [150])
+        self.assertTrue(mock_convert.call_args.kwargs['grayscale'])
+
+    def test_escalates_and_records_tier_on_import(self, mock_convert, mock_info, mock_open):
+        texts = {150: NOISY_SCAN, 300: GOOD_SCAN}
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as scan:
+            scan.write(b"%PDF-1.4 escaneado")
+            scan.flush()
+            with patch('invoices.parsers.engines.pytesseract.image_to_string', side_effect=ocr_by_dpi(texts)):
+                status, _ = ImportManager().process_invoice(scan.name)
+
+        self.assertEqual(status, InvoiceImport.Status.SUCCESS)
+        invoice = InvoiceImport.objects.get()
+        self.assertEqual(invoice.ocr_dpi, 300)
+        self.assertIsNotNone(invoice.ocr_duration_ms)
+        self.assertEqual(invoice.invoice_number, "555")
+
+    def test_reprocess_keeps_the_recorded_ocr_cost(self, mock_convert, mock_info, mock_open):
+        texts = {150: NOISY_SCAN, 300: GOOD_SCAN}
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as scan:
+            scan.write(b"%PDF-1.4 escaneado")
+            scan.flush()
+            with patch('invoices.parsers.engines.pytesseract.image_to_string', side_effect=ocr_by_dpi(texts)):
+                ImportManager().process_invoice(scan.name)
+            recorded = InvoiceImport.objects.get()
+            Report.objects.update(status=Report.Status.CANCELED)
+
+            # Reprocesso do mesmo arquivo: resultado memorizado, sem novo OCR
+            with patch('invoices.parsers.engines.pytesseract.image_to_string') as mock_ocr:
+                ImportManager().process_invoice(scan.name)
+            mock_ocr.assert_not_called()
+
+        invoice = InvoiceImport.objects.get()
+        self.assertEqual(invoice.ocr_dpi, 300)
+        self.assertEqual(invoice.ocr_duration_ms, recorded.ocr_duration_ms)
+        self.assertIsNotNone(invoice.ocr_duration_ms)
+
+
+class ImagePreprocessorTests(SimpleTestCase):
+    def make_photocopy(self, angle):
+        page = Image.new('L', (600, 800), 215)
+        draw = ImageDraw.Draw(page)
+        for index in range(12):
+            draw.rectangle((120, 120 + index * 40, 480, 132 + index * 40), fill=40)
+        return page.rotate(angle, expand=True, fillcolor=10)
+
+    @staticmethod
+    def row_profile_score(image):
+        ink_per_row = (np.asarray(image) == 0).sum(axis=1).astype(np.int64)
+        return int((np.diff(ink_per_row) ** 2).sum())
+
+    def test_output_is_binary_trimmed_and_straight(self):
+        scan = self.make_photocopy(-3)
+        straight = ImagePreprocessor(trim=False, deskew=False)(self.make_photocopy(0))
+        cleaned = ImagePreprocessor()(scan)
+
+        self.assertEqual(set(np.unique(np.asarray(cleaned))), {0, 255})
+        # Borda escura e margens cortadas
+        self.assertLess(cleaned.size[0], 420)
+        self.assertLess(cleaned.size[1], 560)
+        # Linhas de texto de volta à horizontal
+        skewed = ImagePreprocessor(deskew=False)(scan)
+        self.assertGreater(self.row_profile_score(cleaned), 5 * self.row_profile_score(skewed))
+        self.assertGreater(self.row_profile_score(cleaned), self.row_profile_score(straight) // 2)
+
+    def test_downscale_to_max_side(self):
+        cleaned = ImagePreprocessor(max_side=300, binarize=False, deskew=False, trim=False)(self.make_photocopy(0))
+        self.assertLessEqual(max(cleaned.size), 300)
+
+    @patch('invoices.parsers.ocr.pdfinfo_from_path', return_value={'Pages': 1})
+    @patch('invoices.parsers.ocr.convert_from_path', return_value=["raw"])
+    @patch('invoices.parsers.engines.pytesseract.image_to_string', return_value="texto")
+    def test_executor_applies_preprocess(self, mock_ocr, mock_convert, mock_info):
+        OcrExecutor(preprocess=lambda image: f"clean-{image}").run("fake.pdf")
+        self.assertEqual(mock_ocr.call_args.args[0], "clean-raw")
+
+
+def timeout_on_page(slow_page):
+    def ocr(image, lang, timeout=0):
+        if image == f"img-{slow_page}":
+            raise RuntimeError('Tesseract process timeout')
+        return GOOD_SCAN if image == "img-1" else "detalhe"
+    return ocr
+
+
+@patch('invoices.parsers.ocr.convert_from_path', side_effect=fake_convert)
+@patch('invoices.parsers.ocr.pdfinfo_from_path', return_value={'Pages': 3})
+class OcrBudgetTests(TestCase):
+    def test_tesseract_gets_the_remaining_budget_as_timeout(self, mock_info, mock_convert):
+        with patch('invoices.parsers.engines.pytesseract.image_to_string', return_value="texto") as mock_ocr:
+            OcrExecutor(max_pages=1, budget=OcrBudget(30)).run("fake.pdf")
+        self.assertTrue(0 < mock_ocr.call_args.kwargs['timeout'] <= 30)
+        self.assertTrue(0 < mock_convert.call_args.kwargs['timeout'] <= 30)
+
+    def test_timeout_keeps_partial_result_and_stops(self, mock_info, mock_convert):
+        budget = OcrBudget(30)
+        with patch('invoices.parsers.engines.pytesseract.image_to_string', side_effect=timeout_on_page(2)):
+            texts = OcrExecutor(max_pages=3, budget=budget, pool=ThreadPoolExecutor(max_workers=1)).run("fake.pdf")
+        self.assertEqual(texts, [GOOD_SCAN, "", ""])
+        self.assertTrue(budget.exceeded)
+
+    def test_expired_budget_skips_remaining_pages(self, mock_info, mock_convert):
+        budget = OcrBudget(30)
+        budget.deadline = 0
+        with patch('invoices.parsers.engines.pytesseract.image_to_string') as mock_ocr:
+            self.assertEqual(OcrExecutor(max_pages=3, budget=budget).run("fake.pdf"), ["", "", ""])
+        mock_ocr.assert_not_called()
+        mock_convert.assert_not_called()
+
+    @patch('invoices.parsers.backends.pdfplumber.open', side_effect=Exception("PDF escaneado"))
+    @override_settings(INVOICE_OCR_DPI_TIERS=[150, 300], INVOICE_OCR_PREPROCESS=False, INVOICE_OCR_MAX_PAGES=2)
+    def test_import_over_budget_goes_to_review(self, mock_open, mock_info, mock_convert):
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as scan:
+            scan.write(b"%PDF-1.4 escaneado")
+            scan.flush()
+            with patch('invoices.parsers.engines.pytesseract.image_to_string', side_effect=timeout_on_page(2)) as mock_ocr:
+                status, _ = ImportManager().process_invoice(scan.name)
+
+        # Sem escalar para 300 DPI depois do estouro
+        self.assertEqual(mock_ocr.call_count, 2)
+        self.assertEqual(status, InvoiceImport.Status.PENDING_REVIEW)
+        invoice = InvoiceImport.objects.get()
+        self.assertEqual(invoice.error_code, 'OCR_TIMEOUT')
+        self.assertEqual(invoice.invoice_number, "555")
+        self.assertFalse(ExtractedText.objects.exists())
+
+
+def convert_to_disk(path, first_page, last_page, output_folder=None, paths_only=False, **kwargs):
+    page = f"{output_folder}/page-{first_page}.pgm"
+    Image.new('L', (40, 20), 255).save(page)
+    return [page]
+
+
+@patch('invoices.parsers.ocr.convert_from_path', side_effect=convert_to_disk)
+@patch('invoices.parsers.ocr.pdfinfo_from_path', return_value={'Pages': 3})
+class PageRasterTests(TestCase):
+    def test_pages_are_rasterized_to_disk_and_removed_after_ocr(self, mock_info, mock_convert):
+        seen = []
+
+        def ocr(image, lang, **kwargs):
+            seen.append((image, os.path.exists(image)))
+            return "texto"
+
+        with patch('invoices.parsers.engines.pytesseract.image_to_string', side_effect=ocr):
+            OcrExecutor(max_pages=3, budget=OcrBudget(30)).run(io.BytesIO(b"%PDF-1.4 fake"))
+
+        self.assertTrue(mock_convert.call_args.kwargs['paths_only'])
+        # O tesseract recebe o caminho da página, que é apagada logo após o OCR
+        self.assertEqual(len(seen), 3)
+        self.assertTrue(all(exists for _, exists in seen))
+        self.assertFalse(any(os.path.exists(page) for page, _ in seen))
+
+    def test_preprocess_reads_page_from_disk(self, mock_info, mock_convert):
+        with patch('invoices.parsers.engines.pytesseract.image_to_string', return_value="texto") as mock_ocr:
+            OcrExecutor(max_pages=1, preprocess=ImagePreprocessor(deskew=False)).run("fake.pdf")
+        self.assertIsInstance(mock_ocr.call_args.args[0], Image.Image)
+
+    def test_memory_ceiling_stops_rasterizing(self, mock_info, mock_convert):
+        budget = OcrBudget(30, max_rss_mb=512)
+        with patch('invoices.parsers.ocr.current_rss_mb', return_value=600), \
+                patch('invoices.parsers.engines.pytesseract.image_to_string') as mock_ocr:
+            self.assertEqual(OcrExecutor(max_pages=3, budget=budget).run("fake.pdf"), ["", "", ""])
+        mock_convert.assert_not_called()
+        mock_ocr.assert_not_called()
+        self.assertEqual(budget.reason, OcrBudget.MEMORY)
+
+    @patch('invoices.parsers.backends.pdfplumber.open', side_effect=Exception("PDF escaneado"))
+    @override_settings(INVOICE_OCR_MAX_RSS_MB=512, INVOICE_OCR_PREPROCESS=False)
+    def test_import_over_memory_ceiling_goes_to_review(self, mock_open, mock_info, mock_convert):
+        with tempfile.NamedTemporaryFile(suffix='.pdf') as scan:
+            scan.write(b"%PDF-1.4 escaneado")
+            scan.flush()
+            with patch('invoices.parsers.ocr.current_rss_mb', return_value=600):
+                status, _ = ImportManager().process_invoice(scan.name)
+
+        self.assertEqual(status, InvoiceImport.Status.PENDING_REVIEW)
+        self.assertEqual(InvoiceImport.objects.get().error_code, 'OCR_MEMORY_LIMIT')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TaskTimeLimitTests(TestCase):
+    @patch('invoices.parsers.base.OcrExecutor.run_regions', return_value=[])
+    @patch('invoices.parsers.base.OcrExecutor.run', side_effect=SoftTimeLimitExceeded())
+    def test_soft_time_limit_during_ocr_sends_invoice_to_review(self, mock_run, mock_regions):
+        content, _ = make_invoice('VIVO', 'scanned', 1)
+        invoice = InvoiceImport.objects.create(
+            file_path="x.pdf", file_hash="hash-timeout", year=2026, city="X", carrier="VIVO", month="Out"
+        )
+        invoice.file.save("x.pdf", ContentFile(content))
+
+        with patch('builtins.print'):
+            result = process_invoice_task.apply(args=[invoice.id]).get()
+
+        self.assertIn("TIMEOUT", result)
+        # O estouro interrompe o OCR: nenhum outro nível de DPI é tentado
+        mock_run.assert_called_once()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, InvoiceImport.Status.PENDING_REVIEW)
+        self.assertEqual(invoice.error_code, 'TASK_TIMEOUT')
+
+
+def fake_tesserocr(recognized=True):
+    module = MagicMock()
+    module.PSM.AUTO = 3
+
+    def make_api(lang):
+        api = MagicMock()
+        api.lang = lang
+        api.Recognize.return_value = recognized
+        api.GetUTF8Text.return_value = f"texto {lang}"
+        api.MapWordConfidences.return_value = [("150,00", 91), ("10/12/2026", 88)]
+        return api
+    module.PyTessBaseAPI.side_effect = make_api
+    return module
+
+
+class OcrEngineTests(SimpleTestCase):
+    def test_warm_instances_are_reused(self):
+        module = fake_tesserocr()
+        with patch('invoices.parsers.engines.tesserocr', module):
+            engine = TesserocrEngine(size=2)
+            for _ in range(3):
+                self.assertEqual(engine.image_to_string("img", 'por'), "texto por")
+            engine.image_to_string("img", 'eng')
+
+        # Uma instância (traineddata carregado uma vez) por idioma
+        self.assertEqual([call.kwargs['lang'] for call in module.PyTessBaseAPI.call_args_list], ['por', 'eng'])
+
+    def test_pool_is_bounded_by_size(self):
+        module = fake_tesserocr()
+        with patch('invoices.parsers.engines.tesserocr', module):
+            engine = TesserocrEngine(size=2)
+            with ThreadPoolExecutor(max_workers=6) as pool:
+                list(pool.map(lambda _: engine.image_to_string("img", 'por'), range(30)))
+        self.assertLessEqual(module.PyTessBaseAPI.call_count, 2)
+
+    def test_region_config_is_applied_and_reset(self):
+        module = fake_tesserocr()
+        with patch('invoices.parsers.engines.tesserocr', module):
+            engine = TesserocrEngine(size=1)
+            data = engine.image_to_data("img", 'por', config=OcrRegion.NUMERIC_CONFIG, timeout=5)
+            api = engine._pool('por').get_nowait()
+
+        self.assertEqual(data, {'text': ["150,00", "10/12/2026"], 'conf': [91, 88]})
+        api.SetPageSegMode.assert_any_call(6)
+        api.SetVariable.assert_any_call('tessedit_char_whitelist', '0123456789.,/')
+        self.assertEqual(api.SetVariable.call_args.args, ('tessedit_char_whitelist', ''))
+        api.Recognize.assert_called_with(5000)
+
+    def test_recognize_timeout_is_reported_like_pytesseract(self):
+        budget = OcrBudget(30)
+        with patch('invoices.parsers.engines.tesserocr', fake_tesserocr(recognized=False)):
+            executor = OcrExecutor(budget=budget, engine=TesserocrEngine(size=1))
+            with patch('invoices.parsers.ocr.convert_from_path', return_value=["img"]):
+                self.assertEqual(executor.ocr_page("fake.pdf", 1), "")
+        self.assertTrue(budget.exceeded)
+
+    @override_settings(INVOICE_OCR_ENGINE='tesserocr')
+    def test_falls_back_to_pytesseract_without_tesserocr(self):
+        with patch('invoices.parsers.engines.tesserocr', None), \
+                patch('invoices.parsers.engines._engines', {}), patch('builtins.print'):
+            self.assertIsInstance(get_ocr_engine(), PytesseractEngine)
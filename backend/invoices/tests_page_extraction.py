@@ -0,0 +1,175 @@
+from django.test import TestCase, override_settings
+from unittest.mock import patch, MagicMock
+from .models import ExtractedText
+from .parsers.vivo import VivoParser
+from .parsers.claro import ClaroParser
+from .parsers.backends import TextBackend
+from .parsers.context import ExtractionContext
+
+HEADER = "VIVO EMPRESAS Fatura número 123456 Vencimento 10/12/2026 Total a pagar R$ 150,00"
+DETAIL = "Detalhamento de ligações 11 99999-0000 00:01:23 R$ 0,10 " * 5
+
+
+def fake_pdf(page_texts):
+    """PDF falso do pdfplumber: registra quais páginas tiveram o texto extraído."""
+    pages = []
+    for text in page_texts:
+        page = MagicMock()
+        page.extract_text.return_value = text
+        pages.append(page)
+    pdf = MagicMock()
+    pdf.pages = pages
+    pdf.__enter__.return_value = pdf
+    return pdf
+
+
+class FakeBackend(TextBackend):
+    """Backend de texto em memória; `fail_at` (índice) levanta ao chegar nessa página."""
+
+    def __init__(self, name, page_texts, fail_at=None):
+        self.name = name
+        self.page_texts = page_texts
+        self.fail_at = fail_at
+
+    def iter_pages(self, pdf_file, start=0):
+        for index in range(start, len(self.page_texts)):
+            if index == self.fail_at:
+                raise OSError("arquivo truncado")
+            yield self.page_texts[index]
+
+
+class PageByPageExtractionTests(TestCase):
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    def test_stops_after_page_with_required_fields(self, mock_open):
+        pdf = fake_pdf([HEADER] + [DETAIL] * 9)
+        mock_open.return_value = pdf
+
+        context = ExtractionContext("hash-early")
+        text = VivoParser().extract_text("fake.pdf", context=context)
+
+        self.assertIn("Total a pagar", text)
+        self.assertEqual(pdf.pages[0].extract_text.call_count, 1)
+        for page in pdf.pages[1:]:
+            page.extract_text.assert_not_called()
+        self.assertEqual(len(context.page_texts), 1)
+        self.assertFalse(context.complete)
+        self.assertFalse(ExtractedText.objects.get(file_hash="hash-early").is_complete)
+
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    def test_fields_split_across_pages(self, mock_open):
+        pdf = fake_pdf([
+            "VIVO EMPRESAS Fatura número 123456 " + DETAIL,
+            "Vencimento 10/12/2026 Total a pagar R$ 150,00",
+            DETAIL,
+        ])
+        mock_open.return_value = pdf
+
+        data = VivoParser().parse("fake.pdf", context=ExtractionContext())
+
+        pdf.pages[2].extract_text.assert_not_called()
+        self.assertEqual(data['invoice_number'], "123456")
+        self.assertEqual(data['confidence'], 100)
+
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    def test_full_document_reads_every_page(self, mock_open):
+        pdf = fake_pdf([HEADER] + [DETAIL] * 3)
+        mock_open.return_value = pdf
+
+        parser = VivoParser()
+        parser.full_document = True
+        context = ExtractionContext()
+        parser.extract_text("fake.pdf", context=context)
+
+        for page in pdf.pages:
+            self.assertEqual(page.extract_text.call_count, 1)
+        self.assertTrue(context.complete)
+
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    def test_other_parser_resumes_partial_extraction(self, mock_open):
+        # Página 1 atende a VIVO (usada na identificação), mas não tem o vencimento no formato da Claro
+        pdf = fake_pdf([
+            "CLARO Fatura número 99 Vence em 10/12/2026 Total a pagar R$ 89,90 " + DETAIL,
+            "VENCIMENTO 15/12/2026",
+            DETAIL,
+        ])
+        mock_open.return_value = pdf
+
+        context = ExtractionContext()
+        VivoParser().extract_text("fake.pdf", context=context)
+        pdf.pages[1].extract_text.assert_not_called()
+
+        data = ClaroParser().parse("fake.pdf", context=context)
+
+        self.assertEqual(pdf.pages[0].extract_text.call_count, 1)
+        self.assertEqual(pdf.pages[1].extract_text.call_count, 1)
+        pdf.pages[2].extract_text.assert_not_called()
+        self.assertEqual(str(data['due_date']), "2026-12-15")
+
+    def test_backend_failing_midway_is_not_a_complete_read(self):
+        pages = ["VIVO EMPRESAS Fatura número 123456 " + DETAIL, DETAIL, DETAIL, "Vencimento 10/12/2026 Total a pagar R$ 150,00"]
+        parser = VivoParser()
+
+        # Único backend: o texto parcial fica guardado como incompleto (o reparse relê o PDF)
+        with patch.object(parser, 'get_text_backends', return_value=[FakeBackend('a', pages, fail_at=2)]), \
+                patch('builtins.print'):
+            context = ExtractionContext("hash-truncated")
+            parser.extract_text("fake.pdf", context=context)
+        self.assertEqual(len(context.page_texts), 2)
+        self.assertFalse(context.complete)
+        self.assertFalse(ExtractedText.objects.get(file_hash="hash-truncated").is_complete)
+
+        # Com outro backend, ele relê o documento
+        backends = [FakeBackend('a', pages, fail_at=2), FakeBackend('b', pages)]
+        with patch.object(parser, 'get_text_backends', return_value=backends), patch('builtins.print'):
+            context = ExtractionContext("hash-fallback")
+            text = parser.extract_text("fake.pdf", context=context)
+        self.assertIn("Total a pagar R$ 150,00", text)
+        self.assertEqual(context.failed_backends, {'a'})
+        self.assertEqual(context.engine_version, 'b')
+
+
+def ocr_pages(texts):
+    """OCR falso: a "imagem" é o número da página rasterizada."""
+    return {
+        'convert': lambda path, first_page, last_page, **kwargs: [first_page],
+        'ocr': lambda image, lang, **kwargs: texts[image],
+    }
+
+
+@override_settings(INVOICE_TEXT_BACKENDS=['pdfplumber'], INVOICE_OCR_PREPROCESS=False, INVOICE_OCR_DPI_TIERS=[300])
+class HybridExtractionTests(TestCase):
+    def run_extraction(self, plumber_pages, ocr_texts):
+        fake = ocr_pages(ocr_texts)
+        with patch('invoices.parsers.backends.pdfplumber.open', return_value=fake_pdf(plumber_pages)), \
+                patch('invoices.parsers.ocr.convert_from_path', side_effect=fake['convert']) as mock_convert, \
+                patch('invoices.parsers.engines.pytesseract.image_to_string', side_effect=fake['ocr']):
+            context = ExtractionContext("hash-hybrid")
+            text = VivoParser().extract_text("fake.pdf", context=context)
+        return context, text, [call.kwargs['first_page'] for call in mock_convert.call_args_list]
+
+    def test_scanned_cover_page_is_ocrd_alone(self):
+        context, text, rasterized = self.run_extraction(["", DETAIL, DETAIL], {1: HEADER})
+
+        self.assertEqual(rasterized, [1])
+        self.assertEqual(context.page_methods, ['OCR', 'TEXT', 'TEXT'])
+        self.assertEqual(context.method, ExtractionContext.METHOD_HYBRID)
+        self.assertTrue(text.startswith(HEADER))
+        stored = ExtractedText.objects.get(file_hash="hash-hybrid")
+        self.assertEqual(stored.method, ExtractedText.Method.HYBRID)
+        self.assertEqual(stored.page_count, 3)
+
+    def test_scanned_annex_is_skipped_when_text_has_the_fields(self):
+        context, _, rasterized = self.run_extraction([HEADER + " " + DETAIL, ""], {})
+
+        self.assertEqual(rasterized, [])
+        self.assertEqual(context.method, ExtractionContext.METHOD_TEXT)
+
+    def test_scanned_annex_is_ocrd_when_fields_are_missing(self):
+        cover = "VIVO EMPRESAS Fatura número 123456 " + DETAIL
+        context, text, rasterized = self.run_extraction(
+            [cover, "", DETAIL], {2: "Vencimento 10/12/2026 Total a pagar R$ 150,00"}
+        )
+
+        self.assertEqual(rasterized, [2])
+        self.assertEqual(context.page_methods, ['TEXT', 'OCR', 'TEXT'])
+        self.assertEqual(VivoParser().parse(None, text=text)['confidence'], 100)
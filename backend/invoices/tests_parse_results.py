@@ -0,0 +1,136 @@
+from datetime import date
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from .models import InvoiceImport, ParseResult, ParserRuleStat
+from .parsers.claro import ClaroParser
+from .parsers.context import ExtractionContext
+from .parsers.ocr import OcrBudget
+from .parsers.vivo import VivoParser
+from .services.importer import ImportManager
+from .services.parse_results import ParseResultStore
+from .services.reparser import InvoiceReparser
+from .services.text_store import ExtractedTextStore
+from .tests_layouts import vivo_invoice
+from reports.models import Report
+
+METADATA = {'year': 2026, 'city': 'X', 'month': 'Dez', 'carrier': 'VIVO'}
+
+
+@override_settings(INVOICE_LAYOUT_TEMPLATES=False)
+class ParseResultImportTests(TestCase):
+    def setUp(self):
+        self.importer = ImportManager()
+        self.content = vivo_invoice("150,00", "10/12/2026", "123456")
+
+    def import_again(self):
+        """Reimporta o mesmo PDF (relatório anterior cancelado, como no reprocessamento)."""
+        Report.objects.update(status=Report.Status.CANCELED)
+        return self.importer.process_invoice(SimpleUploadedFile("a.pdf", self.content), metadata=METADATA)
+
+    def test_unchanged_invoice_is_a_lookup(self):
+        status, _ = self.importer.process_invoice(SimpleUploadedFile("a.pdf", self.content), metadata=METADATA)
+        self.assertEqual(status, 'SUCCESS')
+        result = ParseResult.objects.get()
+        self.assertEqual((result.parser, result.rules_version), ('VivoParser', 1))
+
+        with patch.object(VivoParser, 'parse') as mock_parse, patch.object(VivoParser, 'extract_text') as mock_extract:
+            status, msg = self.import_again()
+
+        self.assertEqual(status, 'SUCCESS', msg)
+        mock_parse.assert_not_called()
+        mock_extract.assert_not_called()
+        invoice = InvoiceImport.objects.get()
+        self.assertEqual(invoice.total_value, Decimal('150.00'))
+        self.assertEqual(invoice.due_date, date(2026, 12, 10))
+        self.assertEqual(ParseResult.objects.get().hits, 1)
+
+    def test_version_bump_invalidates_only_that_parser(self):
+        self.importer.process_invoice(SimpleUploadedFile("a.pdf", self.content), metadata=METADATA)
+        claro = ParseResultStore.save("hash-claro", ClaroParser(), {
+            'total_value': Decimal('89.90'), 'due_date': date(2025, 12, 15), 'carrier': 'CLARO', 'confidence': 100,
+        })
+
+        with patch.object(VivoParser, 'rules_version', 2), \
+                patch.object(VivoParser, 'parse', wraps=self.importer.parsers['VIVO'].parse) as mock_parse:
+            self.import_again()
+
+        mock_parse.assert_called_once()
+        self.assertEqual(
+            list(ParseResult.objects.filter(parser='VivoParser').values_list('rules_version', flat=True)), [2]
+        )
+        self.assertTrue(ParseResult.objects.filter(pk=claro.pk).exists())
+
+    def test_timed_out_ocr_is_not_memoized(self):
+        def timed_out(parser, pdf_file, context=None):
+            context.ocr_budget = OcrBudget(1)
+            context.ocr_budget.expire(OcrBudget.TIME)
+            return ""
+
+        with patch.object(VivoParser, 'extract_text', autospec=True, side_effect=timed_out):
+            self.importer.process_invoice(SimpleUploadedFile("a.pdf", self.content), metadata=METADATA)
+        self.assertFalse(ParseResult.objects.exists())
+
+    def test_read_cut_by_the_rule_budget_is_not_memoized(self):
+        with self.settings(INVOICE_RULE_MAX_ATTEMPTS=1), patch('builtins.print'):
+            status, msg = self.importer.process_invoice(SimpleUploadedFile("a.pdf", self.content), metadata=METADATA)
+        self.assertEqual(status, 'SUCCESS', msg)
+        self.assertFalse(ParseResult.objects.exists())
+        self.assertTrue(ParserRuleStat.objects.filter(carrier='VIVO', exhausted__gt=0).exists())
+
+        status, msg = self.import_again()
+        self.assertEqual(status, 'SUCCESS', msg)
+        self.assertTrue(ParseResult.objects.exists())
+
+    def test_failed_extraction_is_not_memoized(self):
+        # pdfplumber falhou e o OCR não leu nada: leitura vazia, confiança 0
+        with patch.object(VivoParser, 'extract_text', return_value=""), patch('builtins.print'):
+            status, _ = self.importer.process_invoice(SimpleUploadedFile("a.pdf", self.content), metadata=METADATA)
+        self.assertEqual(status, InvoiceImport.Status.PENDING_REVIEW)
+        self.assertFalse(ParseResult.objects.exists())
+
+        status, msg = self.import_again()
+
+        self.assertEqual(status, 'SUCCESS', msg)
+        invoice = InvoiceImport.objects.get()
+        self.assertEqual(invoice.status, InvoiceImport.Status.SUCCESS)
+        self.assertEqual(invoice.total_value, Decimal('150.00'))
+        self.assertTrue(ParseResult.objects.exists())
+
+    def test_partial_reads_are_not_memoized(self):
+        parser = ClaroParser()
+        self.assertIsNone(ParseResultStore.save("hash-partial", parser, {'total_value': Decimal('1.00'), 'confidence': 50}))
+        self.assertIsNone(ParseResultStore.save("hash-empty", parser, {'total_value': None, 'confidence': 0}))
+        self.assertIsNotNone(ParseResultStore.save("hash-ok", parser, {
+            'total_value': Decimal('1.00'), 'due_date': date(2026, 1, 1), 'confidence': 100,
+        }))
+
+
+class ParseResultReparseTests(TestCase):
+    def setUp(self):
+        context = ExtractionContext("hash-reparse")
+        context.text = "Total a pagar R$ 300,00 Vencimento 10/03/2026 Fatura número 42"
+        context.method = ExtractionContext.METHOD_TEXT
+        context.complete = True
+        ExtractedTextStore.save(context)
+        self.invoice = InvoiceImport.objects.create(
+            file_hash="hash-reparse", year=2026, city='X', carrier='VIVO', month='Jan', total_value=Decimal('0.00')
+        )
+
+    def test_reparse_memoizes_and_then_looks_up(self):
+        InvoiceReparser().reparse([self.invoice.pk])
+        self.assertEqual(ParseResult.objects.get().data['total_value'], '300.00')
+
+        InvoiceImport.objects.filter(pk=self.invoice.pk).update(total_value=Decimal('0.00'))
+        with patch.object(VivoParser, 'parse') as mock_parse:
+            summary = InvoiceReparser().reparse([self.invoice.pk])
+
+        mock_parse.assert_not_called()
+        self.assertEqual(summary['changed'], 1)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.total_value, Decimal('300.00'))
+
+    def test_dry_run_does_not_memoize(self):
+        InvoiceReparser().reparse([self.invoice.pk], dry_run=True)
+        self.assertFalse(ParseResult.objects.exists())
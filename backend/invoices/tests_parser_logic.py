@@ -134,3 +134,32 @@ class ImportReprocessTests(TestCase):
         self.assertEqual(imp.total_value, Decimal('500.00'))
         self.assertEqual(imp.report.total_value, Decimal('500.00'))
         self.assertEqual(imp.report.status, Report.Status.PENDING)
+
+class ExtractionContextTests(TestCase):
+    def setUp(self):
+        self.importer = ImportManager()
+
+    @patch('invoices.parsers.backends.pdfplumber.open', side_effect=Exception("PDF sem camada de texto"))
+    def test_scanned_pdf_runs_ocr_once(self, mock_open):
+        ocr_text = "VIVO EMPRESAS Total a pagar R$ 120,00 Vencimento 10/10/2026 Fatura número 555"
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        pdf = SimpleUploadedFile("fatura.pdf", b"pdf escaneado")
+
+        with patch.object(VivoParser, 'extract_text_via_ocr', return_value=ocr_text) as mock_ocr:
+            status, msg = self.importer.process_invoice(pdf, metadata={'year': 2026, 'city': 'X', 'month': 'Out'})
+
+        self.assertEqual(status, 'SUCCESS', msg)
+        # Identificação da operadora e parsing compartilham a mesma extração
+        self.assertEqual(mock_ocr.call_count, 1)
+        self.assertEqual(mock_open.call_count, 1)
+        imp = InvoiceImport.objects.first()
+        self.assertEqual(imp.carrier, 'VIVO')
+        self.assertEqual(imp.total_value, Decimal('120.00'))
+
+    def test_parse_accepts_pre_extracted_text(self):
+        parser = VivoParser()
+        with patch.object(VivoParser, 'extract_text') as mock_extract:
+            data = parser.parse("fake.pdf", text="Total a pagar R$ 10,00 Vencimento 01/02/2026")
+        mock_extract.assert_not_called()
+        self.assertEqual(data['total_value'], Decimal('10.00'))
+        self.assertEqual(data['due_date'], date(2026, 2, 1))
@@ -0,0 +1,104 @@
+from django.test import SimpleTestCase
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+from .parsers.vivo import VivoParser
+from .parsers.claro import ClaroParser
+from .parsers.rules import (
+    decode_date, decode_currency, RuleBudget, PRIMARY, FALLBACK, BUDGET_ATTEMPTS,
+)
+import time
+from .benchmarks.parser_rules import legacy_vivo_parse, legacy_claro_parse, make_document
+
+PARITY_TEXTS = [
+    "",
+    "Data de vencimento 01/01/2026 ... Vencimento 05/05/2026 Total a pagar R$ 10,00",
+    "VALOR TOTAL a pagar 10,00 Total a pagar 20,00 Valor a pagar R$ 1.500,00",
+    "VENCIMENTO 31/02/2026 Data de vencimento 10/02/2026 Fatura número 12",
+    "TOTAL GERAL A PAGAR R$ 2.895,14\nTotal Geral 3.000,00\nVenc. 10/01/2026\nFatura 2008843401",
+    "Resumo\nVALOR (R$)\nConsumo 900,00\nvalor x 1.234,56 e valor 99,99\n12/12/2012/12/2026",
+    "Nº da fatura 000123 Conta No. 555 Pagamento até 05/05/2026 Data limite 06/05/2026",
+    "Fatura 12 ... Fatura ref 1234567890 sem total",
+    "TOTAL A PAGAR\nR$ 929,30\nVENCIMENTO\n03/01/2026\n00/13/2026 99/99/9999",
+]
+
+class RuleEngineParityTests(SimpleTestCase):
+    """O motor compilado deve produzir exatamente o resultado das regex por padrão."""
+
+    def test_vivo_parity(self):
+        parser = VivoParser()
+        for text in PARITY_TEXTS + [make_document('VIVO', 5), make_document('VIVO_FALLBACK', 5)]:
+            with self.subTest(text=text[:40]), patch('builtins.print'):
+                self.assertEqual(parser.parse(None, text=text), legacy_vivo_parse(text))
+
+    def test_claro_parity(self):
+        parser = ClaroParser()
+        for text in PARITY_TEXTS + [make_document('CLARO', 5)]:
+            with self.subTest(text=text[:40]):
+                self.assertEqual(parser.parse(None, text=text), legacy_claro_parse(text))
+
+    def test_single_rule_stage_is_a_direct_search(self):
+        rules = ClaroParser.rules
+        self.assertTrue(rules.plan(PRIMARY).direct)
+        self.assertFalse(VivoParser.rules.plan(PRIMARY).direct)
+        with patch.object(rules.plan(PRIMARY), 'scanner', None):
+            matches = rules.scan("VENCIMENTO 15/12/2025\nTOTAL A PAGAR R$ 89,90\nTOTAL A PAGAR 1,00")
+            self.assertEqual(matches.pick(rules.select('total_value', PRIMARY), decode_currency), Decimal('89.90'))
+        self.assertEqual(matches.winners, {'total_value': 'total_a_pagar'})
+
+    def test_decoders(self):
+        self.assertEqual(decode_date('17/01/2026'), date(2026, 1, 17))
+        self.assertIsNone(decode_date('31/02/2026'))
+        self.assertIsNone(decode_date('00/01/0000'))
+        self.assertEqual(decode_currency('1.234,56'), Decimal('1234.56'))
+
+
+GARBAGE = ("valor " + "x" * 40 + " ") * 25000
+
+
+class RuleBudgetTests(SimpleTestCase):
+    """Texto patológico (lixo de OCR) não pode prender o worker nas regras."""
+
+    def test_pathological_text_is_bounded(self):
+        started = time.perf_counter()
+        with patch('builtins.print'):
+            data = VivoParser().parse(None, text=GARBAGE)
+        self.assertLess(time.perf_counter() - started, 2)
+        self.assertIsNone(data['total_value'])
+
+    def test_match_is_limited_to_the_window_after_the_anchor(self):
+        rules = VivoParser.rules
+        near = rules.scan("valor " + "x" * 100 + " 12,34")
+        far = rules.scan("valor " + "x" * 300 + " 12,34")
+        fb_valor = [rule for rule in rules.select('total_value', FALLBACK) if rule.name == 'fb_valor']
+        self.assertEqual(near.all(fb_valor), ['12,34'])
+        self.assertEqual(far.all(fb_valor), [])
+
+    def test_rule_over_attempt_budget_is_stopped_and_counted(self):
+        text = "valor 1,00 " * 10
+        with patch('builtins.print'):
+            matches = VivoParser.rules.scan(text, RuleBudget(max_attempts=3))
+            values = matches.all(VivoParser.rules.select('total_value', FALLBACK))
+        self.assertEqual(matches.exhausted['fb_valor'], BUDGET_ATTEMPTS)
+        self.assertEqual(values.count('1,00'), 3)
+        self.assertTrue(matches.budget_hit)
+        stats = {stat['rule']: stat for stat in matches.stats()}
+        self.assertTrue(stats['fb_valor']['exhausted'])
+        self.assertFalse(stats['fb_venc']['exhausted'])
+
+    def test_text_over_limit_is_truncated(self):
+        with patch('builtins.print'):
+            matches = VivoParser.rules.scan("x" * 100 + " Total a pagar R$ 10,00", RuleBudget(max_text=50))
+            matches.all(VivoParser.rules.select('total_value', FALLBACK))
+        self.assertEqual(len(matches.text), 50)
+        self.assertTrue(matches.budget_hit)
+        self.assertTrue(all(stat['exhausted'] for stat in matches.stats()))
+
+    def test_budget_is_deterministic(self):
+        # Mesmo texto, mesmo resultado: o relógio (carga do worker) não corta regras
+        text = "valor 1,00 " * 2000 + "01/02/2026 " * 2000
+        with patch('invoices.parsers.rules.time.perf_counter', side_effect=lambda c=iter(range(10 ** 7)): next(c)):
+            slow = VivoParser.rules.scan(text)
+            values = slow.all(VivoParser.rules.select('total_value', FALLBACK))
+        self.assertFalse(slow.budget_hit)
+        self.assertEqual(values, VivoParser.rules.scan(text).all(VivoParser.rules.select('total_value', FALLBACK)))
@@ -0,0 +1,160 @@
+import json
+import tempfile
+from io import StringIO
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from unittest.mock import patch, MagicMock
+from decimal import Decimal
+from datetime import date
+from .benchmarks.corpus import PdfWriter
+from .models import ExtractedText, InvoiceImport
+from .parsers.context import ExtractionContext
+from .services.reparser import InvoiceReparser
+from .services.text_store import ExtractedTextStore
+from audit.models import AuditLog
+from django.contrib.auth import get_user_model
+User = get_user_model()
+
+class InvoiceReparseTests(TestCase):
+    def setUp(self):
+        self.stale = self._create_invoice("hash-stale", "Total a pagar R$ 300,00 Vencimento 10/03/2026 Fatura número 42")
+        self.current = self._create_invoice("hash-current", "Total a pagar R$ 100,00 Vencimento 10/01/2026 Fatura número 41")
+        self.current.total_value = Decimal('100.00')
+        self.current.due_date = date(2026, 1, 10)
+        self.current.invoice_number = '41'
+        self.current.confidence_score = 100
+        self.current.save()
+        self.no_text = InvoiceImport.objects.create(file_hash="hash-no-text", year=2026, city='X', carrier='VIVO', month='Jan')
+
+    def _create_invoice(self, file_hash, text):
+        context = ExtractionContext(file_hash)
+        context.text = text
+        context.method = ExtractionContext.METHOD_TEXT
+        context.complete = True
+        ExtractedTextStore.save(context)
+        return InvoiceImport.objects.create(
+            file_hash=file_hash, year=2026, city='X', carrier='VIVO', month='Jan',
+            status=InvoiceImport.Status.PENDING_REVIEW, total_value=Decimal('0.00')
+        )
+
+    def test_reparse_updates_only_changed_invoices(self):
+        ids = InvoiceReparser.select().values_list('pk', flat=True)
+        with patch('invoices.parsers.base.BaseInvoiceParser.extract_text') as mock_extract:
+            summary = InvoiceReparser().reparse(list(ids))
+        mock_extract.assert_not_called()
+
+        self.assertEqual(summary['processed'], 2)
+        self.assertEqual(summary['changed'], 1)
+        self.assertEqual(summary['missing_text'], 1)
+        self.assertEqual(summary['fields_changed']['total_value'], 1)
+
+        self.stale.refresh_from_db()
+        self.assertEqual(self.stale.total_value, Decimal('300.00'))
+        self.assertEqual(self.stale.due_date, date(2026, 3, 10))
+        self.assertEqual(self.stale.invoice_number, '42')
+        self.assertEqual(AuditLog.objects.filter(action=AuditLog.Action.REPROCESS).count(), 1)
+
+    def test_region_ocr_text_is_not_reparsed(self):
+        context = ExtractionContext("hash-roi")
+        context.text = "VIVO\nTotal a pagar R$ 150,00\nVencimento 10/12/2026\nFatura número 123456\n"
+        context.method = ExtractionContext.METHOD_OCR_REGIONS
+        ExtractedTextStore.save(context)
+        invoice = InvoiceImport.objects.create(
+            file_hash="hash-roi", year=2026, city='X', carrier='VIVO', month='Jan', total_value=Decimal('0.00')
+        )
+
+        summary = InvoiceReparser().reparse([invoice.pk])
+
+        self.assertEqual((summary['processed'], summary['region_text']), (0, 1))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_value, Decimal('0.00'))
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_incomplete_text_is_completed_from_the_pdf(self):
+        # Parada antecipada na página 1; o total da página 2 só aparece no texto completo
+        page_1 = "Vencimento 10/03/2026 Fatura número 42 Total a pagar R$ 300,00"
+        context = ExtractionContext("hash-partial")
+        context.text = page_1
+        context.method = ExtractionContext.METHOD_TEXT
+        ExtractedTextStore.save(context)
+        writer = PdfWriter()
+        writer.add_text_page([page_1])
+        writer.add_text_page(["Total a pagar R$ 350,00"])
+        invoice = InvoiceImport.objects.create(
+            file_hash="hash-partial", year=2026, city='X', carrier='VIVO', month='Jan', total_value=Decimal('0.00')
+        )
+        invoice.file.save("hash-partial.pdf", ContentFile(writer.getvalue()))
+
+        summary = InvoiceReparser().reparse([invoice.pk, self.stale.pk], dry_run=True)
+        self.assertEqual((summary['processed'], summary['incomplete_text']), (2, 0))
+        self.assertFalse(ExtractedText.objects.get(file_hash="hash-partial").is_complete)
+
+        summary = InvoiceReparser().reparse([invoice.pk])
+        self.assertEqual(summary['processed'], 1)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_value, Decimal('350.00'))
+        stored = ExtractedText.objects.get(file_hash="hash-partial")
+        self.assertTrue(stored.is_complete)
+        self.assertIn("R$ 350,00", ExtractedTextStore.decompress(stored.content)['text'])
+
+    def test_incomplete_text_without_pdf_is_skipped(self):
+        context = ExtractionContext("hash-partial")
+        context.text = "Vencimento 10/03/2026 Fatura número 42 Total a pagar R$ 300,00"
+        context.method = ExtractionContext.METHOD_TEXT
+        ExtractedTextStore.save(context)
+        invoice = InvoiceImport.objects.create(
+            file_hash="hash-partial", year=2026, city='X', carrier='VIVO', month='Jan', total_value=Decimal('0.00')
+        )
+
+        summary = InvoiceReparser().reparse([invoice.pk])
+
+        self.assertEqual((summary['processed'], summary['incomplete_text']), (0, 1))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_value, Decimal('0.00'))
+
+    def test_dry_run_does_not_persist(self):
+        summary = InvoiceReparser().reparse([self.stale.pk], dry_run=True)
+        self.assertEqual(summary['changed'], 1)
+        self.stale.refresh_from_db()
+        self.assertEqual(self.stale.total_value, Decimal('0.00'))
+
+    def test_select_filters(self):
+        self.assertEqual(InvoiceReparser.select(statuses=['PENDING_REVIEW']).count(), 2)
+        self.assertEqual(InvoiceReparser.select(carrier='claro').count(), 0)
+        self.assertEqual(InvoiceReparser.select(date_from=date(2000, 1, 1)).count(), 3)
+
+    def test_management_command_reports_changes(self):
+        out = StringIO()
+        call_command('reparse_invoices', '--status', 'PENDING_REVIEW', '--chunk-size', '1', stdout=out)
+        summary = json.loads(out.getvalue())
+        self.assertEqual(summary['processed'], 2)
+        self.assertEqual(summary['changed'], 1)
+
+    @patch('invoices.services.reparser.InvoiceReparser.dispatch')
+    def test_endpoint_dispatches_chunks(self, mock_dispatch):
+        mock_dispatch.return_value = (MagicMock(id='job-1'), [[1, 2], [3]])
+        client = APIClient()
+        user = User.objects.create_user(username='gestor', email='g@x.com', password='password', role='GESTOR')
+        client.force_authenticate(user=user)
+
+        resp = client.post(reverse('invoice-reparse'), {'status': ['PENDING_REVIEW'], 'carrier': 'VIVO'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(resp.data['job_id'], 'job-1')
+        self.assertEqual(resp.data['invoices_selected'], 3)
+
+        resp = client.post(reverse('invoice-reparse'), {'status': ['NOPE']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch('invoices.services.reparser.InvoiceReparser.job_status', return_value=None)
+    def test_job_status_routes(self, mock_status):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='gestor', email='g@x.com', password='password', role='GESTOR'))
+
+        self.assertEqual(client.get(reverse('invoice-reparse')).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        resp = client.get(reverse('invoice-reparse-status', args=['job-inexistente']))
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        mock_status.assert_called_once_with('job-inexistente')
@@ -0,0 +1,91 @@
+import io
+import tempfile
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from unittest.mock import patch
+from PIL import Image
+from rest_framework.test import APIClient
+from .models import InvoiceImport
+from .services.routing import PdfClassifier, InvoiceRouter
+
+
+def make_text_pdf(lines):
+    """PDF digital mínimo (Helvetica, uma linha por Tj) com xref válido."""
+    content = b"BT /F1 12 Tf 72 760 Td 14 TL " + b" ".join(
+        b"(" + line.encode('latin-1') + b") Tj T*" for line in lines
+    ) + b" ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    output = io.BytesIO(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(output.tell())
+        output.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = output.tell()
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    output.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+    output.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return output.getvalue()
+
+
+def make_scanned_pdf():
+    buffer = io.BytesIO()
+    Image.new('L', (850, 1100), 230).save(buffer, format='PDF', resolution=100)
+    return buffer.getvalue()
+
+
+class PdfClassifierTests(TestCase):
+    def test_digital_pdf(self):
+        stats = PdfClassifier().classify(io.BytesIO(make_text_pdf(["VIVO EMPRESAS"] * 20)))
+        self.assertEqual(stats['kind'], InvoiceImport.PdfKind.TEXT)
+        self.assertEqual(stats['fonts'], 1)
+        self.assertEqual(stats['text_operators'], 20)
+
+    def test_scanned_pdf(self):
+        stats = PdfClassifier().classify(io.BytesIO(make_scanned_pdf()))
+        self.assertEqual(stats['kind'], InvoiceImport.PdfKind.SCANNED)
+        self.assertGreater(stats['image_coverage'], 0.95)
+
+    def test_unreadable_file(self):
+        stats = PdfClassifier().classify(io.BytesIO(b"nao e um pdf"))
+        self.assertEqual(stats['kind'], InvoiceImport.PdfKind.UNKNOWN)
+        self.assertEqual(InvoiceRouter.queue_for(stats['kind']), 'ocr')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@patch('invoices.tasks.process_invoice_task.apply_async')
+class InvoiceRoutingViewTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='analista', email='a@x.com', password='password', role='ANALISTA')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_manual_upload_goes_to_queue_by_kind_with_priority(self, mock_async):
+        upload = SimpleUploadedFile("fatura.pdf", make_scanned_pdf(), content_type="application/pdf")
+        response = self.client.post(reverse('invoice-upload'), {'file': upload}, format='multipart')
+
+        self.assertEqual(response.status_code, 202, response.data)
+        invoice = InvoiceImport.objects.get(pk=response.data['id'])
+        self.assertEqual(invoice.pdf_kind, InvoiceImport.PdfKind.SCANNED)
+        mock_async.assert_called_once_with(args=[invoice.id, self.user.id], queue='ocr', priority=0)
+
+    def test_folder_scan_is_bulk_priority(self, mock_async):
+        with tempfile.TemporaryDirectory() as folder:
+            with open(f"{folder}/fatura.pdf", 'wb') as f:
+                f.write(make_text_pdf(["VIVO EMPRESAS"] * 20))
+            with patch('invoices.views.DirectoryScanner.scan', return_value=[{'path': f"{folder}/fatura.pdf", 'carrier': 'VIVO'}]):
+                response = self.client.post(reverse('invoice-import-trigger'), {'base_path': folder}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        invoice = InvoiceImport.objects.get()
+        self.assertEqual(invoice.pdf_kind, InvoiceImport.PdfKind.TEXT)
+        self.assertEqual(mock_async.call_args.kwargs['queue'], 'text')
+        self.assertEqual(mock_async.call_args.kwargs['priority'], 6)
@@ -0,0 +1,144 @@
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from unittest.mock import patch
+from .models import InvoiceImport, ParserRuleStat
+from .parsers.context import ExtractionContext
+from .parsers.claro import ClaroParser
+from .parsers.rules import RULE_TIME_BUCKETS_MS, rule_metrics
+from .parsers.vivo import VivoParser
+from .services.importer import ImportManager
+from .services.reparser import InvoiceReparser
+from .services.rule_stats import RuleStatsStore
+from .services.text_store import ExtractedTextStore
+from .tests_layouts import vivo_invoice
+
+User = get_user_model()
+
+METADATA = {'year': 2026, 'city': 'X', 'month': 'Dez', 'carrier': 'VIVO'}
+
+PRIMARY_TEXT = "VIVO Total a pagar R$ 150,00 VALOR TOTAL R$ 90,00 Vencimento 10/12/2026 Fatura número 123"
+# Sem rótulo de vencimento nem número: o fallback decide os dois
+FALLBACK_TEXT = "VIVO Total a pagar R$ 80,00 emitida em 01/11/2026 pagar em 20/11/2026"
+
+
+def read(parser, text):
+    """Leitura final de uma importação: parse e registro do uso das regras, como no ImportManager."""
+    context = ExtractionContext()
+    data = parser.parse(None, text=text, context=context)
+    rule_metrics.record(parser.rules.carrier, context.rule_matches)
+    return data
+
+
+class RuleMetricsTests(TestCase):
+    def setUp(self):
+        rule_metrics.drain()
+        self.parser = VivoParser()
+
+    def stat(self, rule, carrier='VIVO'):
+        return ParserRuleStat.objects.get(carrier=carrier, rule=rule)
+
+    def test_matched_and_won_per_rule(self):
+        with patch('builtins.print'):
+            read(self.parser, PRIMARY_TEXT)
+        self.assertEqual(RuleStatsStore.flush(), 9)
+
+        # As duas regras de total casam; vence a do maior valor
+        self.assertEqual((self.stat('total_a_pagar').matched, self.stat('total_a_pagar').won), (1, 1))
+        self.assertEqual((self.stat('valor_total').matched, self.stat('valor_total').won), (1, 0))
+        self.assertEqual((self.stat('vence_em').matched, self.stat('vence_em').evaluations), (0, 1))
+        # O fallback não foi avaliado
+        self.assertFalse(ParserRuleStat.objects.filter(stage='fallback').exists())
+        histogram = self.stat('vencimento').time_histogram
+        self.assertEqual((len(histogram), sum(histogram)), (len(RULE_TIME_BUCKETS_MS) + 1, 1))
+
+    def test_flushes_accumulate(self):
+        with patch('builtins.print'):
+            read(self.parser, PRIMARY_TEXT)
+            RuleStatsStore.flush()
+            read(self.parser, PRIMARY_TEXT)
+            RuleStatsStore.flush()
+        self.assertEqual(self.stat('total_a_pagar').evaluations, 2)
+        self.assertEqual(self.stat('total_a_pagar').won, 2)
+        self.assertEqual(RuleStatsStore.flush(), 0)
+
+    def test_flush_adds_to_rows_written_by_other_workers(self):
+        ParserRuleStat.objects.create(
+            carrier='VIVO', rule='total_a_pagar', field='total_value', stage='primary',
+            evaluations=5, won=4, time_histogram=[2, 3],
+        )
+        with patch('builtins.print'):
+            read(self.parser, PRIMARY_TEXT)
+        with patch('django.db.models.QuerySet.select_for_update') as mock_lock:
+            RuleStatsStore.flush()
+        mock_lock.assert_not_called()
+
+        stat = self.stat('total_a_pagar')
+        self.assertEqual((stat.evaluations, stat.won), (6, 5))
+        self.assertEqual(len(stat.time_histogram), len(RULE_TIME_BUCKETS_MS) + 1)
+        self.assertEqual(sum(stat.time_histogram), 6)
+
+    def test_summary_reports_fallback_rate_per_carrier(self):
+        with patch('builtins.print'):
+            data = read(self.parser, FALLBACK_TEXT)
+            read(self.parser, PRIMARY_TEXT)
+            read(ClaroParser(), "CLARO TOTAL A PAGAR R$ 89,90 VENCIMENTO 15/12/2025")
+        RuleStatsStore.flush()
+
+        self.assertEqual(str(data['due_date']), '2026-11-20')
+        self.assertEqual(self.stat('fb_qualquer_data').won, 1)
+        summary = {carrier['carrier']: carrier for carrier in RuleStatsStore.summary()}
+        self.assertEqual(summary['VIVO']['parses'], 2)
+        self.assertEqual(summary['VIVO']['fallback_rate'], 0.5)
+        self.assertEqual(summary['CLARO']['fallback_rate'], 0.0)
+        rules = {rule['rule']: rule for rule in summary['VIVO']['rules']}
+        self.assertEqual(rules['total_a_pagar']['win_rate'], 1.0)
+        self.assertEqual(rules['fb_numero_fatura']['match_rate'], 0.0)
+
+    def test_parse_and_ocr_probes_are_not_counted(self):
+        with patch('builtins.print'):
+            self.parser.parse(None, text=PRIMARY_TEXT)
+            self.assertTrue(self.parser.is_reliable_ocr(PRIMARY_TEXT))
+        self.assertEqual(RuleStatsStore.flush(), 0)
+
+    def test_import_counts_the_final_read_once(self):
+        content = vivo_invoice("150,00", "10/12/2026", "123456")
+        with self.settings(INVOICE_LAYOUT_TEMPLATES=False), patch('builtins.print'):
+            ImportManager().process_invoice(SimpleUploadedFile("a.pdf", content), metadata=METADATA)
+        self.assertEqual(self.stat('total_a_pagar').evaluations, 1)
+
+    def test_reparse_counts_only_when_not_dry_run(self):
+        context = ExtractionContext("hash-stats")
+        context.text = PRIMARY_TEXT
+        context.method = ExtractionContext.METHOD_TEXT
+        context.complete = True
+        ExtractedTextStore.save(context)
+        invoice = InvoiceImport.objects.create(file_hash="hash-stats", year=2026, city='X', carrier='VIVO', month='Jan')
+
+        InvoiceReparser().reparse([invoice.pk], dry_run=True)
+        self.assertFalse(ParserRuleStat.objects.exists())
+        InvoiceReparser().reparse([invoice.pk])
+        self.assertEqual(self.stat('total_a_pagar').evaluations, 1)
+
+    @override_settings(INVOICE_RULE_METRICS=False)
+    def test_disabled_metrics_are_not_stored(self):
+        with patch('builtins.print'):
+            read(self.parser, PRIMARY_TEXT)
+        RuleStatsStore.flush()
+        self.assertFalse(ParserRuleStat.objects.exists())
+
+    def test_endpoint_summarises_by_carrier(self):
+        with patch('builtins.print'):
+            read(self.parser, PRIMARY_TEXT)
+            read(ClaroParser(), "CLARO TOTAL A PAGAR R$ 89,90 VENCIMENTO 15/12/2025")
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='gestor', email='g@x.com', password='password', role='GESTOR'))
+
+        resp = client.get(reverse('invoice-parser-stats'), {'carrier': 'claro'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([carrier['carrier'] for carrier in resp.data['carriers']], ['CLARO'])
+        self.assertEqual(resp.data['carriers'][0]['parses'], 1)
@@ -0,0 +1,209 @@
+import os
+import tempfile
+import pypdfium2 as pdfium
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from unittest.mock import patch
+from .benchmarks.corpus import PdfWriter, cover_lines, invoice_fields, make_bundle, make_invoice
+from .models import ExtractedText, InvoiceImport, InvoiceLineItem
+from .services.importer import ImportManager
+from .services.line_items import LineItemExtractor
+from .services.splitter import InvoiceSplitter, segment_hash
+from .tasks import extract_line_items_task, process_invoice_task
+from reports.models import Report
+
+BUNDLE = [('VIVO', 3, 1), ('VIVO', 2, 2), ('CLARO', 2, 3)]
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class InvoiceSplitterTests(TestCase):
+    def setUp(self):
+        self.splitter = InvoiceSplitter()
+
+    def create(self, content, file_hash="hash-bundle", carrier="VIVO"):
+        invoice = InvoiceImport.objects.create(
+            file_path="lote.pdf", file_hash=file_hash, year=2026, city="X", carrier=carrier, month="Out",
+            status=InvoiceImport.Status.PROCESSING,
+        )
+        invoice.file.save(f"{file_hash}.pdf", ContentFile(content))
+        return invoice
+
+    def test_segments_start_at_each_new_header(self):
+        content, expected = make_bundle(BUNDLE)
+        invoice = self.create(content)
+
+        segments = self.splitter.find_segments(invoice.file.path, 'VIVO')
+
+        self.assertEqual(
+            [(s['page_start'], s['page_end'], s['carrier']) for s in segments],
+            [(start, end, carrier) for start, end, carrier, _ in expected],
+        )
+
+    def test_repeated_header_of_the_same_invoice_does_not_split(self):
+        expected = invoice_fields('VIVO', 7)
+        writer = PdfWriter()
+        writer.add_text_page(cover_lines('VIVO', expected))
+        writer.add_text_page(["11 99999-0000 00:01:00 R$ 0,50"])
+        # Boleto no fim repetindo o cabeçalho
+        writer.add_text_page(cover_lines('VIVO', expected))
+        invoice = self.create(writer.getvalue())
+
+        self.assertEqual(len(self.splitter.find_segments(invoice.file.path)), 1)
+        self.assertEqual(self.splitter.split(invoice), [])
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, InvoiceImport.Status.PROCESSING)
+
+    def test_section_subtotal_next_to_repeated_header_does_not_split(self):
+        expected = invoice_fields('VIVO', 8)
+        writer = PdfWriter()
+        writer.add_text_page(cover_lines('VIVO', expected))
+        # Seção do detalhamento com o cabeçalho da conta e um subtotal
+        writer.add_text_page([
+            f"Conta No. {expected['invoice_number']}",
+            f"Vencimento {expected['due_date'].strftime('%d/%m/%Y')}",
+            "VALOR TOTAL R$ 12,34",
+        ])
+        invoice = self.create(writer.getvalue())
+
+        self.assertEqual(len(self.splitter.find_segments(invoice.file.path)), 1)
+
+    def test_pages_before_the_first_header_stay_with_the_first_invoice(self):
+        # Capa sem cabeçalho de fatura (ex: carta de encaminhamento)
+        writer = PdfWriter()
+        writer.add_text_page(["Segue o lote de faturas do mês."])
+        for carrier, pages, seed in BUNDLE[:2]:
+            expected = invoice_fields(carrier, seed)
+            writer.add_text_page(cover_lines(carrier, expected))
+            for _ in range(pages - 1):
+                writer.add_text_page(["11 99999-0000 00:01:00 R$ 0,50"])
+        children = self.splitter.split(self.create(writer.getvalue(), file_hash="hash-cover"))
+        self.assertEqual([(child.page_start, child.page_end) for child in children], [(1, 4), (5, 6)])
+
+    def test_tracker_follows_the_line_items_read(self):
+        content, expected = make_bundle(BUNDLE)
+        invoice = self.create(content)
+        tracker = self.splitter.tracker(invoice)
+
+        with patch.object(LineItemExtractor, 'iter_pages', wraps=LineItemExtractor.iter_pages) as mock_pages:
+            LineItemExtractor().extract(invoice, tracker=tracker)
+
+        mock_pages.assert_called_once()
+        self.assertEqual(
+            [(s['page_start'], s['page_end'], s['carrier']) for s in tracker.finish()],
+            [(start, end, carrier) for start, end, carrier, _ in expected],
+        )
+        with self.settings(INVOICE_SPLIT_BUNDLES=False):
+            self.assertIsNone(self.splitter.tracker(invoice))
+
+    def test_split_creates_one_import_per_invoice(self):
+        content, expected = make_bundle(BUNDLE)
+        invoice = self.create(content)
+
+        children = self.splitter.split(invoice)
+
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, InvoiceImport.Status.SPLIT)
+        self.assertEqual(list(invoice.segments.order_by('page_start')), children)
+        for child, (start, end, carrier, _) in zip(children, expected):
+            self.assertEqual((child.page_start, child.page_end, child.carrier), (start, end, carrier))
+            self.assertEqual(child.file_hash, segment_hash("hash-bundle", start, end))
+            part = pdfium.PdfDocument(child.file.path)
+            self.assertEqual(len(part), end - start + 1)
+            part.close()
+
+        # Reprocessar o lote reaproveita as filhas
+        self.assertEqual([child.pk for child in self.splitter.split(invoice)], [child.pk for child in children])
+        self.assertEqual(InvoiceImport.objects.filter(parent=invoice).count(), 3)
+
+    def test_segment_is_imported_with_its_own_fields(self):
+        content, expected = make_bundle(BUNDLE)
+        child = self.splitter.split(self.create(content))[1]
+
+        with patch('builtins.print'):
+            status, msg = ImportManager().process_invoice(child.file.path, invoice_instance=child)
+
+        self.assertEqual(status, 'SUCCESS', msg)
+        child.refresh_from_db()
+        self.assertEqual(child.total_value, expected[1][3]['total_value'])
+        self.assertEqual(child.invoice_number, expected[1][3]['invoice_number'])
+
+    def test_single_invoices_segments_and_scans_are_not_split(self):
+        content, _ = make_invoice('VIVO', 'digital', 3)
+        self.assertEqual(self.splitter.split(self.create(content)), [])
+
+        bundle, _ = make_bundle(BUNDLE)
+        scanned = self.create(bundle, file_hash="hash-scanned")
+        scanned.pdf_kind = InvoiceImport.PdfKind.SCANNED
+        self.assertEqual(self.splitter.split(scanned), [])
+
+        with self.settings(INVOICE_SPLIT_BUNDLES=False):
+            self.assertEqual(self.splitter.split(self.create(bundle, file_hash="hash-disabled")), [])
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@patch('invoices.tasks.process_invoice_task.apply_async')
+@patch('invoices.tasks.extract_line_items_task.apply_async')
+class SplitTaskTests(TestCase):
+    def create(self, content, file_hash):
+        invoice = InvoiceImport.objects.create(
+            file_path="lote.pdf", file_hash=file_hash, year=2026, city="X", carrier="VIVO", month="Out"
+        )
+        invoice.file.save(f"{file_hash}.pdf", ContentFile(content))
+        return invoice
+
+    def test_import_keeps_the_early_exit(self, mock_items, mock_process):
+        content, _ = make_invoice('VIVO', 'digital', 30)
+        invoice = self.create(content, "hash-long")
+
+        with patch.object(LineItemExtractor, 'iter_pages') as mock_pages, patch('builtins.print'):
+            process_invoice_task.apply(args=[invoice.id]).get()
+
+        # Nenhuma leitura do PDF inteiro na task de importação
+        mock_pages.assert_not_called()
+        self.assertFalse(ExtractedText.objects.get(file_hash="hash-long").is_complete)
+        self.assertEqual(mock_items.call_args.kwargs['args'], [invoice.id, None, False])
+
+        with patch('builtins.print'):
+            result = extract_line_items_task.apply(args=[invoice.id]).get()
+        self.assertNotIn(InvoiceImport.Status.SPLIT, result)
+        mock_process.assert_not_called()
+
+    def test_bundle_dispatches_one_task_per_invoice(self, mock_items, mock_process):
+        content, expected = make_bundle(BUNDLE)
+        invoice = self.create(content, "hash-task-bundle")
+
+        with patch('builtins.print'):
+            process_invoice_task.apply(args=[invoice.id]).get()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.report.status, Report.Status.PENDING)
+        mock_items.assert_called_once()
+
+        with patch('builtins.print'):
+            result = extract_line_items_task.apply(args=[invoice.id]).get()
+
+        self.assertEqual(result, f"Line items {invoice.id}: SPLIT (3)")
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.status, InvoiceImport.Status.SPLIT)
+        self.assertEqual(invoice.report.status, Report.Status.CANCELED)
+        self.assertFalse(InvoiceLineItem.objects.filter(invoice=invoice).exists())
+        children = list(invoice.segments.order_by('page_start'))
+        self.assertEqual([(c.page_start, c.page_end) for c in children], [(start, end) for start, end, _, _ in expected])
+        self.assertEqual([call.kwargs['args'][0] for call in mock_process.call_args_list], [child.id for child in children])
+        self.assertTrue(all(call.kwargs['queue'] == 'text' for call in mock_process.call_args_list))
+        self.assertTrue(all(os.path.exists(child.file.path) for child in children))
+
+    def test_approved_bundle_is_not_split(self, mock_items, mock_process):
+        content, _ = make_bundle(BUNDLE)
+        invoice = self.create(content, "hash-approved")
+        with patch('builtins.print'):
+            process_invoice_task.apply(args=[invoice.id]).get()
+        invoice.refresh_from_db()
+        invoice.report.status = Report.Status.APPROVED
+        invoice.report.save()
+
+        with patch('builtins.print'):
+            extract_line_items_task.apply(args=[invoice.id]).get()
+
+        invoice.refresh_from_db()
+        self.assertNotEqual(invoice.status, InvoiceImport.Status.SPLIT)
+        mock_process.assert_not_called()
@@ -0,0 +1,87 @@
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch, MagicMock
+from .parsers.backends import PdftotextBackend, PdfPlumberBackend, get_text_backends
+from .parsers.context import ExtractionContext
+from .parsers.vivo import VivoParser
+
+HEADER = "VIVO EMPRESAS Fatura número 123456 Vencimento 10/12/2026 Total a pagar R$ 150,00"
+DETAIL = "Detalhamento de ligações 11 99999-0000 00:01:23 R$ 0,10"
+
+
+def pdftotext_output(pages):
+    """Simula o subprocess.run do pdftotext devolvendo as páginas pedidas em -f/-l."""
+    def run(args, **kwargs):
+        first, last = int(args[args.index('-f') + 1]), int(args[args.index('-l') + 1])
+        result = MagicMock()
+        result.stdout = "".join(page + "\n\f" for page in pages[first - 1:last]).encode('utf-8')
+        return result
+    return run
+
+
+def plumber_pdf(page_texts):
+    pages = []
+    for text in page_texts:
+        page = MagicMock()
+        page.extract_text.return_value = text
+        pages.append(page)
+    pdf = MagicMock()
+    pdf.pages = pages
+    pdf.__enter__.return_value = pdf
+    return pdf
+
+
+@patch.object(PdftotextBackend, 'is_available', return_value=True)
+@patch.object(PdftotextBackend, 'version', return_value="pdftotext 22.02.0")
+class TextBackendTests(SimpleTestCase):
+    @patch('invoices.parsers.backends.pdfinfo_from_path', return_value={'Pages': 10})
+    def test_pdftotext_reads_in_chunks_and_stops_early(self, mock_info, mock_version, mock_available):
+        pages = [DETAIL] * 5 + [HEADER] + [DETAIL] * 4
+        with patch('invoices.parsers.backends.subprocess.run', side_effect=pdftotext_output(pages)) as mock_run:
+            with override_settings(INVOICE_TEXT_BACKENDS=['pdftotext']):
+                context = ExtractionContext()
+                VivoParser().extract_text("fake.pdf", context=context)
+
+        # Páginas 1-4 e 5-8; o cabeçalho na página 6 encerra a leitura
+        self.assertEqual(mock_run.call_count, 2)
+        self.assertEqual(len(context.page_texts), 6)
+        self.assertEqual(context.engine_version, "pdftotext 22.02.0")
+        self.assertFalse(context.complete)
+
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    @patch('invoices.parsers.backends.pdfinfo_from_path', return_value={'Pages': 2})
+    def test_falls_back_when_backend_returns_too_little_text(self, mock_info, mock_open, mock_version, mock_available):
+        mock_open.return_value = plumber_pdf([HEADER, DETAIL])
+        with patch('invoices.parsers.backends.subprocess.run', side_effect=pdftotext_output(["", " "])):
+            with override_settings(INVOICE_TEXT_BACKENDS=['pdftotext', 'pdfplumber']):
+                context = ExtractionContext()
+                text = VivoParser().extract_text("fake.pdf", context=context)
+
+        self.assertIn("Total a pagar", text)
+        self.assertTrue(context.engine_version.startswith("pdfplumber"))
+        self.assertEqual(context.method, ExtractionContext.METHOD_TEXT)
+
+    @patch('invoices.parsers.backends.pdfplumber.open')
+    def test_parser_can_override_backends(self, mock_open, mock_version, mock_available):
+        mock_open.return_value = plumber_pdf([HEADER])
+        parser = VivoParser()
+        parser.text_backends = ['pdfplumber']
+        with patch('invoices.parsers.backends.subprocess.run') as mock_run:
+            with override_settings(INVOICE_TEXT_BACKENDS=['pdftotext']):
+                parser.extract_text("fake.pdf", context=ExtractionContext())
+        mock_run.assert_not_called()
+
+    def test_unavailable_and_unknown_backends_are_skipped(self, mock_version, mock_available):
+        mock_available.return_value = False
+        backends = get_text_backends(['pdftotext', 'inexistente', 'pdfplumber'])
+        self.assertEqual([type(backend) for backend in backends], [PdfPlumberBackend])
+
+    def test_pdfplumber_releases_each_page_after_reading(self, mock_version, mock_available):
+        pdf = plumber_pdf([HEADER, DETAIL, DETAIL])
+        with patch('invoices.parsers.backends.pdfplumber.open', return_value=pdf):
+            pages = PdfPlumberBackend().iter_pages("fake.pdf")
+            self.assertEqual(next(pages), HEADER)
+            pdf.pages[0].close.assert_called_once()
+            pdf.pages[1].close.assert_not_called()
+            # Parada antecipada: o gerador fechado libera o PDF
+            pages.close()
+        pdf.__exit__.assert_called_once()
@@ -0,0 +1,62 @@
+from django.test import TestCase
+from unittest.mock import patch
+from decimal import Decimal
+from .models import InvoiceImport, ExtractedText
+from .parsers.vivo import VivoParser
+from .parsers.context import ExtractionContext
+from .services.importer import ImportManager
+from .services.text_store import ExtractedTextStore
+
+OCR_TEXT = "VIVO EMPRESAS Total a pagar R$ 80,00 Vencimento 05/11/2026 Fatura número 777"
+
+class ExtractedTextStoreTests(TestCase):
+    def test_roundtrip_is_compressed(self):
+        context = ExtractionContext("hash-roundtrip")
+        context.text = "Total a pagar R$ 10,00\n" * 200
+        context.page_texts = ["Total a pagar R$ 10,00"] * 200
+        context.method = ExtractionContext.METHOD_TEXT
+        context.engine_version = "pdfplumber test"
+        ExtractedTextStore.save(context)
+
+        stored = ExtractedText.objects.get(file_hash="hash-roundtrip")
+        self.assertLess(len(bytes(stored.content)), len(context.text))
+        self.assertEqual(stored.page_count, 200)
+
+        loaded = ExtractionContext("hash-roundtrip")
+        self.assertTrue(ExtractedTextStore.load(loaded))
+        self.assertEqual(loaded.text, context.text)
+        self.assertEqual(loaded.page_texts, context.page_texts)
+        self.assertEqual(loaded.engine_version, "pdfplumber test")
+        self.assertTrue(loaded.from_store)
+
+    def test_empty_text_not_stored(self):
+        context = ExtractionContext("hash-empty")
+        context.text = "   "
+        ExtractedTextStore.save(context)
+        self.assertFalse(ExtractedText.objects.filter(file_hash="hash-empty").exists())
+
+    @patch('invoices.parsers.backends.pdfplumber.open', side_effect=Exception("sem camada de texto"))
+    def test_reprocess_reads_stored_text_without_ocr(self, mock_open):
+        importer = ImportManager()
+        with patch.object(VivoParser, 'extract_text_via_ocr', return_value=OCR_TEXT) as mock_ocr:
+            invoice = InvoiceImport.objects.create(
+                file_hash="hash-reprocess", year=2026, city='X', carrier='VIVO', month='Nov',
+                status=InvoiceImport.Status.PROCESSING
+            )
+            status, msg = importer.process_invoice("fatura.pdf", metadata={'carrier': 'VIVO'}, invoice_instance=invoice)
+            self.assertEqual(status, 'SUCCESS', msg)
+            self.assertEqual(mock_ocr.call_count, 1)
+
+            # Reprocessamento: report removido, mesmo hash -> texto vem do store
+            invoice.refresh_from_db()
+            invoice.report.delete()
+            invoice.refresh_from_db()
+            status, msg = importer.process_invoice("fatura.pdf", metadata={'carrier': 'VIVO'}, invoice_instance=invoice)
+
+        self.assertEqual(status, 'SUCCESS', msg)
+        self.assertEqual(mock_ocr.call_count, 1)
+        self.assertEqual(mock_open.call_count, 1)
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_value, Decimal('80.00'))
+        stored = ExtractedText.objects.get(file_hash="hash-reprocess")
+        self.assertEqual(stored.method, ExtractedText.Method.OCR)
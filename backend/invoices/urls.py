@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import TriggerInvoiceImportView, InvoiceUploadView, InvoiceDownloadView, InvoiceInboxView, InvoiceConfirmView
+from .views import TriggerInvoiceImportView, InvoiceUploadView, InvoiceDownloadView, InvoiceInboxView, InvoiceConfirmView, ReparseInvoicesView, ReparseJobView, ParserRuleStatsView
 
 urlpatterns = [
     path('import/trigger/', TriggerInvoiceImportView.as_view(), name='invoice-import-trigger'),
@@ -7,4 +7,7 @@ urlpatterns = [
     path('invoices/<int:pk>/download/', InvoiceDownloadView.as_view(), name='invoice-download'),
     path('invoices/inbox/', InvoiceInboxView.as_view(), name='invoice-inbox'),
     path('invoices/<int:pk>/confirm/', InvoiceConfirmView.as_view(), name='invoice-confirm'),
+    path('invoices/reparse/', ReparseInvoicesView.as_view(), name='invoice-reparse'),
+    path('invoices/reparse/<str:job_id>/', ReparseJobView.as_view(), name='invoice-reparse-status'),
+    path('invoices/parser-stats/', ParserRuleStatsView.as_view(), name='invoice-parser-stats'),
 ]
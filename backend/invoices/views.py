@@ -4,7 +4,8 @@ from .services.importer import ImportManager
 import os
 from django.db import IntegrityError, transaction
 
-from .tasks import process_invoice_task
+from .services.ingest import UploadIngestor
+from .services.routing import InvoiceRouter
 from .models import InvoiceImport
 from datetime import date
 
@@ -52,8 +53,8 @@ class TriggerInvoiceImportView(views.APIView):
                     invoice.status = InvoiceImport.Status.PROCESSING
                     invoice.save()
                 
-                # Dispatch Task
-                process_invoice_task.delay(invoice.id, request.user.id)
+                # Dispatch Task (fila conforme o tipo do PDF; varredura de pasta tem prioridade menor)
+                InvoiceRouter.dispatch(invoice, request.user.id, source=file_meta['path'])
                 dispatched_count += 1
             except Exception as e:
                 print(f"Error preparing task for {file_meta['path']}: {e}")
@@ -78,11 +79,10 @@ class InvoiceUploadView(views.APIView):
         if not file_obj.name.lower().endswith('.pdf'):
             return response.Response({"error": "Apenas arquivos PDF são permitidos."}, status=status.HTTP_400_BAD_REQUEST)
 
-        importer = ImportManager()
         try:
-            # Hash
-            if hasattr(file_obj, 'seek'): file_obj.seek(0)
-            file_hash = importer.get_file_hash(file_obj)
+            # Uma leitura: hash calculado enquanto o arquivo é gravado, já com o nome <hash>.pdf
+            ingested = UploadIngestor().ingest(file_obj)
+            file_hash = ingested.file_hash
             
             # Atomic Get OR Init (Can't use get_or_create easily with file save logic effectively, 
             # but we can try lock or handling integrity error)
@@ -94,6 +94,7 @@ class InvoiceUploadView(views.APIView):
                 try:
                     invoice = InvoiceImport.objects.create(
                         file_path=file_obj.name,
+                        file=ingested.name,
                         file_hash=file_hash,
                         year=date.today().year,
                         city='Upload Manual',
@@ -108,20 +109,13 @@ class InvoiceUploadView(views.APIView):
                     created = False
 
             if not created:
+                # Mesmo hash, mesmo conteúdo: o arquivo recém-gravado substitui o anterior
                 invoice.status = InvoiceImport.Status.PROCESSING
+                invoice.file.name = ingested.name
                 invoice.save()
-
-            # Always save/refresh the file content if it's an upload
-            # But wait, if we overwrite, we might break history if hashes collide but content differs?
-            # Hash implies content is same. So overwriting is redundant but safe.
-            
-            from django.core.files.base import ContentFile
-            if hasattr(file_obj, 'seek'): file_obj.seek(0)
-            content = file_obj.read()
-            invoice.file.save(f"{file_hash}.pdf", ContentFile(content), save=True)
             
-            # Dispatch
-            process_invoice_task.delay(invoice.id, request.user.id)
+            # Dispatch (fila conforme o tipo do PDF; upload manual tem prioridade)
+            InvoiceRouter.dispatch(invoice, request.user.id, manual=True)
             
             return response.Response({
                 "status": "PROCESSING",
@@ -249,3 +243,67 @@ class InvoiceConfirmView(views.APIView):
             import traceback
             traceback.print_exc()
             return response.Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+class ReparseInvoicesView(views.APIView):
+    """
+    Re-parse em lote a partir do texto armazenado (após correção de regras dos parsers).
+    POST dispara lotes no Celery; o resumo do job fica em ReparseJobView.
+    """
+    permission_classes = [IsGestor]
+
+    def post(self, request):
+        from django.utils.dateparse import parse_date
+        from .services.reparser import InvoiceReparser
+
+        statuses = request.data.get('status') or []
+        if isinstance(statuses, str):
+            statuses = [statuses]
+        invalid = [s for s in statuses if s not in InvoiceImport.Status.values]
+        if invalid:
+            return response.Response({"error": f"Status inválido: {', '.join(invalid)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        dates = {}
+        for key in ('date_from', 'date_to'):
+            value = request.data.get(key)
+            dates[key] = parse_date(value) if value else None
+            if value and not dates[key]:
+                return response.Response({"error": f"Data inválida em {key}: {value}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = InvoiceReparser.select(statuses, request.data.get('carrier'), dates['date_from'], dates['date_to'])
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+
+        job, chunks = InvoiceReparser.dispatch(queryset, user_id=request.user.id, dry_run=dry_run)
+        return response.Response({
+            "job_id": job.id,
+            "invoices_selected": sum(len(chunk) for chunk in chunks),
+            "chunks_dispatched": len(chunks),
+            "dry_run": dry_run
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class ReparseJobView(views.APIView):
+    """Resumo de um job de re-parse (somado dos lotes já concluídos)."""
+    permission_classes = [IsGestor]
+
+    def get(self, request, job_id):
+        from .services.reparser import InvoiceReparser
+
+        summary = InvoiceReparser.job_status(job_id)
+        if summary is None:
+            return response.Response({"error": "Job não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+        return response.Response(summary)
+
+class ParserRuleStatsView(views.APIView):
+    """
+    Taxa de acerto das regras dos parsers por operadora (ParserRuleStat): quantas vezes cada
+    regra casou e venceu, tempo médio/histograma e a fração das leituras que caiu no fallback.
+    Filtro opcional: ?carrier=VIVO
+    """
+    permission_classes = [IsGestor]
+
+    def get(self, request):
+        from .services.rule_stats import RuleStatsStore
+
+        # Inclui o que este processo ainda não gravou (ex: reparse síncrono pelo comando)
+        RuleStatsStore.flush()
+        return response.Response({"carriers": RuleStatsStore.summary(request.query_params.get('carrier'))})